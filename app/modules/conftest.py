@@ -3,6 +3,9 @@ import pytest
 from app import create_app, db
 from app.modules.auth.models import User
 
+# Locust scenarios are run by locust, and importing locust monkey-patches the whole test process with gevent
+collect_ignore_glob = ['*locust*']
+
 
 @pytest.fixture(scope='session')
 def test_app():
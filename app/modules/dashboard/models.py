@@ -0,0 +1,66 @@
+from app import db
+
+
+class DataSetDailyStats(db.Model):
+    """
+    Number of views and downloads of a dataset in a day, rolled up from the dataset view and download records.
+    The owner of the dataset is copied so the statistics of a user are read without joins.
+    """
+    __tablename__ = 'dataset_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('dataset_id', 'day', name='uq_dataset_daily_stats_dataset_day'),
+        db.Index('ix_dataset_daily_stats_owner_day', 'owner_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id', ondelete='CASCADE'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    downloads = db.Column(db.Integer, nullable=False, default=0)
+
+    dataset = db.relationship(
+        'DataSet', backref=db.backref('daily_stats', lazy=True, cascade="all, delete-orphan")
+    )
+
+    def __repr__(self):
+        return f'DataSetDailyStats<{self.dataset_id}, {self.day}, views={self.views}, downloads={self.downloads}>'
+
+
+class HubfileDailyStats(db.Model):
+    """
+    Number of views and downloads of a file in a day, rolled up from the file view and download records.
+    """
+    __tablename__ = 'file_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('file_id', 'day', name='uq_file_daily_stats_file_day'),
+        db.Index('ix_file_daily_stats_owner_day', 'owner_id', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('file.id', ondelete='CASCADE'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    downloads = db.Column(db.Integer, nullable=False, default=0)
+
+    file = db.relationship(
+        'Hubfile', backref=db.backref('daily_stats', lazy=True, cascade="all, delete-orphan")
+    )
+
+    def __repr__(self):
+        return f'HubfileDailyStats<{self.file_id}, {self.day}, views={self.views}, downloads={self.downloads}>'
+
+
+class StatsRollupState(db.Model):
+    """
+    High-water mark of a record table: the records up to ``last_record_id`` are already counted in the rollups.
+    """
+    __tablename__ = 'stats_rollup_state'
+
+    source = db.Column(db.String(64), primary_key=True)
+    last_record_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'StatsRollupState<{self.source}, {self.last_record_id}>'
@@ -1,14 +1,22 @@
-from core.repositories.BaseRepository import BaseRepository
+from datetime import date, datetime, timezone
+from typing import NamedTuple
+
+from dateutil.relativedelta import relativedelta
+from flask_login import current_user
+from sqlalchemy import extract, func
+
+from app import db
+from app.modules.dashboard.models import DataSetDailyStats, HubfileDailyStats, StatsRollupState
 from app.modules.dataset.models import (
     DSMetaData,
     DataSet,
     DSViewRecord,
     DSDownloadRecord
 )
-from sqlalchemy import func
-from datetime import datetime, timedelta
-from flask_login import current_user
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile, HubfileDownloadRecord, HubfileViewRecord
 from app.modules.profile.models import UserProfile
+from core.repositories.BaseRepository import BaseRepository
 
 
 class DashboardRepository(BaseRepository):
@@ -16,186 +24,229 @@ class DashboardRepository(BaseRepository):
         super().__init__(DataSet)
 
     def total_number_dataset_downloads(self):
-        total_downloads = DSDownloadRecord.query.count()
-        return total_downloads
+        return db.session.query(func.coalesce(func.sum(DataSetDailyStats.downloads), 0)).scalar()
 
     def total_number_dataset_views(self):
-        total_views = DSViewRecord.query.count()
-        return total_views
-
-    def get_user_profile_and_dataset_counts(self):
-        profiles = UserProfile.query.all()
-
-        user_info = []
-        for profile in profiles:
-            user = profile.user
-            dataset_count = DataSet.query.filter_by(user_id=user.id).count()
+        return db.session.query(func.coalesce(func.sum(DataSetDailyStats.views), 0)).scalar()
+
+    def get_user_profile_and_dataset_counts(self, limit=None, offset=0):
+        """
+        Names of the authors and their number of datasets, most prolific first, counted in one grouped query.
+
+        Authors without datasets are included with a count of zero. ``limit`` and ``offset`` select a page of the
+        ranking.
+        """
+        dataset_count = func.count(DataSet.id)
+        query = (
+            db.session.query(UserProfile.name, UserProfile.surname, dataset_count)
+            .outerjoin(DataSet, DataSet.user_id == UserProfile.user_id)
+            .group_by(UserProfile.id, UserProfile.name, UserProfile.surname)
+            .order_by(dataset_count.desc(), UserProfile.id)
+        )
+        if limit is not None:
+            query = query.limit(limit).offset(offset)
+        return [(f'{name} {surname}', count) for name, surname, count in query.all()]
 
-            user_info.append((f'{profile.name} {profile.surname}', dataset_count)
-                             )
-        print(user_info)
-        return user_info
+    def count_authors(self):
+        return db.session.query(func.count(UserProfile.id)).scalar()
 
-    def get_views_per_dataset(self):
-        result = (
+    @staticmethod
+    def top_datasets(counter, user_id=None):
+        total = func.coalesce(func.sum(counter), 0)
+        query = (
             DataSet.query
             .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
-            .outerjoin(DSViewRecord, DataSet.id == DSViewRecord.dataset_id)
-            .with_entities(DSMetaData.title, func.count(DSViewRecord.id).label('view_count'))
-            .group_by(DSMetaData.id)
-            .order_by(func.count(DSViewRecord.id).desc())
+            .outerjoin(DataSetDailyStats, DataSet.id == DataSetDailyStats.dataset_id)
+        )
+        if user_id is not None:
+            query = query.filter(DataSet.user_id == user_id)
+        return (
+            query
+            .with_entities(DSMetaData.title, total.label('count'))
+            .group_by(DSMetaData.id, DSMetaData.title)
+            .order_by(total.desc())
             .limit(10)
             .all()
         )
-        return result
+
+    def get_views_per_dataset(self):
+        return DashboardRepository.top_datasets(DataSetDailyStats.views)
 
     def get_downloads_per_dataset(self):
+        return DashboardRepository.top_datasets(DataSetDailyStats.downloads)
+
+    @staticmethod
+    def sum_per_month(query, day_column, value_column, number_of_months=12):
+        """
+        Add up a column of the daily rollups in each of the last calendar months, the current one included, in one
+        query.
+
+        The day column is only compared against the range bounds, so an index on it can be used, and the months
+        without statistics are filled with zeros.
+
+        Returns:
+            tuple: The months as 'YYYY-MM' strings, oldest first, and their counts.
+        """
+        current_month = datetime.today().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        months = [current_month - relativedelta(months=i) for i in reversed(range(number_of_months))]
+
+        year = extract('year', day_column)
+        month = extract('month', day_column)
         result = (
-            DataSet.query
-            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
-            .outerjoin(DSDownloadRecord, DataSet.id == DSDownloadRecord.dataset_id)
-            .with_entities(DSMetaData.title, func.count(DSDownloadRecord.id).label('view_count'))
-            .group_by(DSMetaData.id)
-            .order_by(func.count(DSDownloadRecord.id).desc())
-            .limit(10)
+            query
+            .filter(day_column >= months[0].date(), day_column < (current_month + relativedelta(months=1)).date())
+            .with_entities(year, month, func.sum(value_column))
+            .group_by(year, month)
             .all()
         )
-        return result
+
+        counts = {(int(row_year), int(row_month)): int(count or 0) for row_year, row_month, count in result}
+        return (
+            [first_day.strftime('%Y-%m') for first_day in months],
+            [counts.get((first_day.year, first_day.month), 0) for first_day in months],
+        )
 
     def get_last_12_months_downloads(self):
-        today = datetime.today()
-        months = []
-        download_counts = []
-        for i in range(12):
-            first_day_of_month = today.replace(day=1) - timedelta(days=i * 30)
-            first_day_of_month_str = first_day_of_month.strftime('%Y-%m-01')
-            result = (
-                DSDownloadRecord.query .filter(
-                    func.date(
-                        DSDownloadRecord.download_date) >= first_day_of_month_str) .filter(
-                    func.date(
-                        DSDownloadRecord.download_date) < (
-                        first_day_of_month +
-                        timedelta(
-                            days=32)).strftime('%Y-%m-01')) .count())
-            months.append(first_day_of_month.strftime('%Y-%m'))
-            download_counts.append(result)
-
-        months.reverse()
-        download_counts.reverse()
-
-        return months, download_counts
+        return DashboardRepository.sum_per_month(
+            DataSetDailyStats.query, DataSetDailyStats.day, DataSetDailyStats.downloads
+        )
 
     def get_last_12_months_views(self):
-        today = datetime.today()
-        months = []
-        view_counts = []
-
-        for i in range(12):
-            first_day_of_month = today.replace(day=1) - timedelta(days=i * 30)
-            first_day_of_month_str = first_day_of_month.strftime('%Y-%m-01')
-
-            result = (
-                DSViewRecord.query .filter(
-                    func.date(
-                        DSViewRecord.view_date) >= first_day_of_month_str) .filter(
-                    func.date(
-                        DSViewRecord.view_date) < (
-                        first_day_of_month +
-                        timedelta(
-                            days=32)).strftime('%Y-%m-01')) .count())
-            months.append(first_day_of_month.strftime('%Y-%m'))
-            view_counts.append(result)
-
-        months.reverse()
-        view_counts.reverse()
-
-        return months, view_counts
+        return DashboardRepository.sum_per_month(
+            DataSetDailyStats.query, DataSetDailyStats.day, DataSetDailyStats.views
+        )
 
     def get_views_per_dataset_user_logued(self):
-        result = (
-            DataSet.query
-            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
-            .outerjoin(DSViewRecord, DataSet.id == DSViewRecord.dataset_id)
-            .filter(DataSet.user_id == current_user.id)
-            .with_entities(DSMetaData.title, func.count(DSViewRecord.id).label('view_count'))
-            .group_by(DSMetaData.id)
-            .order_by(func.count(DSViewRecord.id).desc())
-            .limit(10)
-            .all()
-        )
-        return result
+        return DashboardRepository.top_datasets(DataSetDailyStats.views, user_id=current_user.id)
 
     def get_downloads_per_dataset_user_logued(self):
-        result = (
-            DataSet.query
-            .join(DSMetaData, DataSet.ds_meta_data_id == DSMetaData.id)
-            .outerjoin(DSDownloadRecord, DataSet.id == DSDownloadRecord.dataset_id)
-            .filter(DataSet.user_id == current_user.id)
-            .with_entities(DSMetaData.title, func.count(DSDownloadRecord.id).label('view_count'))
-            .group_by(DSMetaData.id)
-            .order_by(func.count(DSDownloadRecord.id).desc())
-            .limit(10)
-            .all()
-        )
-        return result
+        return DashboardRepository.top_datasets(DataSetDailyStats.downloads, user_id=current_user.id)
 
     def get_last_12_months_views_for_user(self):
-        today = datetime.today()
-        months = []
-        view_counts = []
-
-        for i in range(12):
-            first_day_of_month = today.replace(day=1) - timedelta(days=i * 30)
-            first_day_of_month_str = first_day_of_month.strftime('%Y-%m-01')
-
-            result = (
-                DSViewRecord.query .join(
-                    DataSet,
-                    DataSet.id == DSViewRecord.dataset_id) .filter(
-                    DataSet.user_id == current_user.id) .filter(
-                    func.date(
-                        DSViewRecord.view_date) >= first_day_of_month_str) .filter(
-                        func.date(
-                            DSViewRecord.view_date) < (
-                                first_day_of_month +
-                                timedelta(
-                                    days=32)).strftime('%Y-%m-01')) .count())
-
-            months.append(first_day_of_month.strftime('%Y-%m'))
-            view_counts.append(result)
-
-        months.reverse()
-        view_counts.reverse()
-
-        return months, view_counts
+        return DashboardRepository.sum_per_month(
+            DataSetDailyStats.query.filter(DataSetDailyStats.owner_id == current_user.id),
+            DataSetDailyStats.day,
+            DataSetDailyStats.views,
+        )
 
     def get_last_12_months_downloads_user_logued(self):
-        today = datetime.today()
-        months = []
-        download_counts = []
-
-        for i in range(12):
-            first_day_of_month = today.replace(day=1) - timedelta(days=i * 30)
-            first_day_of_month_str = first_day_of_month.strftime('%Y-%m-01')
-
-            result = (
-                DSDownloadRecord.query .join(
-                    DataSet,
-                    DataSet.id == DSDownloadRecord.dataset_id) .filter(
-                    DataSet.user_id == current_user.id) .filter(
-                    func.date(
-                        DSDownloadRecord.download_date) >= first_day_of_month_str) .filter(
-                        func.date(
-                            DSDownloadRecord.download_date) < (
-                                first_day_of_month +
-                                timedelta(
-                                    days=32)).strftime('%Y-%m-01')) .count())
-
-            months.append(first_day_of_month.strftime('%Y-%m'))
-            download_counts.append(result)
-
-        months.reverse()
-        download_counts.reverse()
-
-        return months, download_counts
+        return DashboardRepository.sum_per_month(
+            DataSetDailyStats.query.filter(DataSetDailyStats.owner_id == current_user.id),
+            DataSetDailyStats.day,
+            DataSetDailyStats.downloads,
+        )
+
+
+class RollupSource(NamedTuple):
+    """
+    A table of view or download records and the daily rollup counter it feeds.
+    """
+    name: str
+    record: type
+    date_column: object
+    stats: type
+    key: str
+    counter: str
+
+
+ROLLUP_SOURCES = [
+    RollupSource(
+        'ds_view_record', DSViewRecord, DSViewRecord.view_date, DataSetDailyStats, 'dataset_id', 'views'
+    ),
+    RollupSource(
+        'ds_download_record', DSDownloadRecord, DSDownloadRecord.download_date, DataSetDailyStats, 'dataset_id',
+        'downloads'
+    ),
+    RollupSource(
+        'file_view_record', HubfileViewRecord, HubfileViewRecord.view_date, HubfileDailyStats, 'file_id', 'views'
+    ),
+    RollupSource(
+        'file_download_record', HubfileDownloadRecord, HubfileDownloadRecord.download_date, HubfileDailyStats,
+        'file_id', 'downloads'
+    ),
+]
+
+
+class StatsRollupRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(StatsRollupState)
+
+    def get_state(self, source: RollupSource) -> StatsRollupState:
+        state = self.model.query.filter_by(source=source.name).with_for_update().first()
+        if state is None:
+            state = self.create(commit=False, source=source.name, last_record_id=0)
+        return state
+
+    def get_max_record_id(self, source: RollupSource, created_before: datetime) -> int:
+        """
+        The highest id of the records created before ``created_before``. The ids are scanned from the newest, so only
+        the records inside the lag are read.
+        """
+        return (
+            self.session.query(source.record.id)
+            .filter(source.date_column < created_before)
+            .order_by(source.record.id.desc())
+            .limit(1)
+            .scalar()
+        ) or 0
+
+    def count_records(self, source: RollupSource, first_id: int, last_id: int) -> list:
+        """
+        Count the records with ids in (first_id, last_id] per key, owner and day. The owner of a record is the
+        owner of its dataset, joined directly for dataset records and through the feature model for file records.
+        """
+        key = getattr(source.record, source.key)
+        query = self.session.query(source.record)
+        if source.stats is DataSetDailyStats:
+            query = query.join(DataSet, DataSet.id == key)
+        else:
+            query = query.join(Hubfile, Hubfile.id == key).join(FeatureModel).join(DataSet)
+
+        day = func.date(source.date_column)
+        return (
+            query
+            .filter(source.record.id > first_id, source.record.id <= last_id)
+            .with_entities(key, DataSet.user_id, day, func.count())
+            .group_by(key, DataSet.user_id, day)
+            .all()
+        )
+
+    def add_counts(self, source: RollupSource, counts: list):
+        """
+        Add the counts of ``count_records`` to the daily rollup rows, creating the missing ones. Does not commit.
+        """
+        counts = [
+            (key, owner_id, day if isinstance(day, date) else date.fromisoformat(str(day)), count)
+            for key, owner_id, day, count in counts
+        ]
+        if not counts:
+            return
+
+        key_column = getattr(source.stats, source.key)
+        rows = {
+            (getattr(row, source.key), row.day): row
+            for row in source.stats.query.filter(
+                key_column.in_({key for key, _, _, _ in counts}),
+                source.stats.day.in_({day for _, _, day, _ in counts}),
+            )
+        }
+        for key, owner_id, day, count in counts:
+            row = rows.get((key, day))
+            if row is None:
+                row = source.stats(**{source.key: key}, owner_id=owner_id, day=day, views=0, downloads=0)
+                self.session.add(row)
+                rows[(key, day)] = row
+            setattr(row, source.counter, getattr(row, source.counter) + count)
+
+    def advance(self, state: StatsRollupState, last_record_id: int):
+        state.last_record_id = last_record_id
+        state.updated_at = datetime.now(timezone.utc)
+
+    def clear(self):
+        DataSetDailyStats.query.delete()
+        HubfileDailyStats.query.delete()
+        self.model.query.delete()
+        self.session.commit()
+
+    def total(self, counter) -> int:
+        return self.session.query(func.coalesce(func.sum(counter), 0)).scalar()
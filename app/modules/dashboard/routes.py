@@ -1,4 +1,4 @@
-from flask import render_template
+from flask import jsonify, render_template, request
 from flask_login import login_required
 from app.modules.dashboard import dashboard_bp
 from app.modules.dashboard.services import DashboardService
@@ -15,40 +15,20 @@ READ ALL
 @dashboard_bp.route('/dashboard', methods=['GET'])
 @login_required
 def index():
-    # General
-    statistics = dashboardService.get_detailed_statistics()
-    author_names, dataset_counts = dashboardService.get_all_author_names_and_dataset_counts()
-    datasets_names_views, datasets_views = dashboardService.get_views_per_dataset_lists()
-    datasets_names_downloads, datasets_downloads = dashboardService.get_downloads_per_dataset_lists()
-    month, downloads = dashboardService.get_downloads_per_month()
-    month_views, views = dashboardService.get_views_per_month()
-
-    # User
-    datasets_names_user, datasets_views_user = dashboardService.get_views_per_dataset_user_logued()
-    datasets_names_user_downloads, datasets_download_user = dashboardService.get_downloads_per_dataset_user_logued()
-    month_views_user, views_user = dashboardService.get_downloads_per_month_user_logued()
-    month_downloads_user, downloads_user = dashboardService.get_views_per_month_user_logued()
-    print(month_downloads_user)
-    print(downloads_user)
-
+    # The charts load their series from the data endpoint once the page is shown
     return render_template('dashboard/index.html',
-                           statistics=statistics,
-                           author_names=author_names,
-                           datasets_count=dataset_counts,
-                           datasets_names_views=datasets_names_views,
-                           datasets_views=datasets_views,
-                           datasets_names_downloads=datasets_names_downloads,
-                           datasets_downloads=datasets_downloads,
-                           months=month,
-                           downloads=downloads,
-                           datasets_names_user=datasets_names_user,
-                           datasets_views_user=datasets_views_user,
-                           months_views=month_views,
-                           views_per_month=views,
-                           datasets_names_user_downloads=datasets_names_user_downloads,
-                           datasets_download_user=datasets_download_user,
-                           month_views_user=month_views_user,
-                           views_per_month_user=views_user,
-                           month_downloads_user=month_downloads_user,
-                           downloads_per_month_user=downloads_user
-                           )
+                           statistics=dashboardService.get_global_dashboard_data()["statistics"])
+
+
+@dashboard_bp.route('/dashboard/data', methods=['GET'])
+@login_required
+def data():
+    return jsonify(dashboardService.get_dashboard_data())
+
+
+@dashboard_bp.route('/dashboard/authors', methods=['GET'])
+@login_required
+def authors():
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+    return jsonify(dashboardService.get_author_page(page=page, per_page=per_page))
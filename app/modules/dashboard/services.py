@@ -1,6 +1,38 @@
-from app.modules.dashboard.repositories import DashboardRepository
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from flask_login import current_user
+
+from app.modules.dashboard.models import DataSetDailyStats, HubfileDailyStats
+from app.modules.dashboard.repositories import ROLLUP_SOURCES, DashboardRepository, StatsRollupRepository
+from core.cache.json_cache import JsonCache
+from core.configuration.configuration import cache_folder_name
 from core.services.BaseService import BaseService
 from app.modules.dataset.repositories import DataSetRepository
+from app.modules.jobs.services import periodic_task
+
+logger = logging.getLogger(__name__)
+
+# Records rolled up per transaction, bounds the memory and the lock time of a backfill
+STATS_ROLLUP_BATCH_SIZE = int(os.getenv('STATS_ROLLUP_BATCH_SIZE', 50000))
+# Seconds between the rollups run by the job workers, 0 leaves them to `rosemary stats:rollup`
+STATS_ROLLUP_INTERVAL = int(os.getenv('STATS_ROLLUP_INTERVAL', 60))
+# Age in seconds a record must reach before it is rolled up. Ids are assigned on insert but records become visible
+# on commit, so the newest ids may still be missing lower ones that a slower transaction has not committed yet.
+STATS_ROLLUP_LAG = int(os.getenv('STATS_ROLLUP_LAG', 300))
+# Seconds the dashboard statistics shared by every user are served from the cache
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 300))
+# Upper bound on the age of the cached dashboard of a user, it is also dropped when the rollups count new views or
+# downloads of their datasets
+DASHBOARD_USER_CACHE_TTL = int(os.getenv('DASHBOARD_USER_CACHE_TTL', 3600))
+DASHBOARD_GLOBAL_CACHE_KEY = 'dashboard_global'
+# Authors shown in the dashboard chart, the full ranking is paginated by the authors endpoint
+DASHBOARD_TOP_AUTHORS = 10
+
+# Statistics documents shared by every web and job worker process, rooted like the other caches so their
+# invalidations reach every container that shares the cache folder
+stats_cache = JsonCache(os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "stats"), 16 * 1024 * 1024)
 
 
 class DashboardService(BaseService):
@@ -22,12 +54,28 @@ class DashboardService(BaseService):
         }
         return statistics
 
-    def get_all_author_names_and_dataset_counts(self):
-        author_data = DashboardRepository.get_user_profile_and_dataset_counts(self)
+    def get_top_author_dataset_counts(self, limit, offset=0):
+        """
+        Names and dataset counts of the ``limit`` authors with most datasets after the first ``offset`` ones.
+        """
+        author_data = DashboardRepository.get_user_profile_and_dataset_counts(self, limit=limit, offset=offset)
         author_names = [item[0] for item in author_data]
         dataset_counts = [item[1] for item in author_data]
         return author_names, dataset_counts
 
+    def get_author_page(self, page=1, per_page=DASHBOARD_TOP_AUTHORS):
+        author_names, dataset_counts = self.get_top_author_dataset_counts(
+            limit=per_page, offset=(page - 1) * per_page
+        )
+        return {
+            "authors": [
+                {"name": name, "datasets": count} for name, count in zip(author_names, dataset_counts)
+            ],
+            "page": page,
+            "per_page": per_page,
+            "total": DashboardRepository.count_authors(self),
+        }
+
     def get_views_per_dataset_lists(self):
         result = DashboardRepository.get_views_per_dataset(self)
         dataset_names = [item[0] for item in result]
@@ -69,3 +117,146 @@ class DashboardService(BaseService):
     def get_views_per_month_user_logued(self):
         listas = DashboardRepository.get_last_12_months_downloads_user_logued(self)
         return listas
+
+    def get_dashboard_data(self) -> dict:
+        """
+        Every series of the dashboard of the logged user, read from the caches.
+        """
+        return {**self.get_global_dashboard_data(), **self.get_user_dashboard_data()}
+
+    def get_global_dashboard_data(self) -> dict:
+        """
+        The statistics shared by every user, computed at most once per ``DASHBOARD_CACHE_TTL`` seconds for every
+        worker process.
+        """
+        return stats_cache.get_or_compute(
+            DASHBOARD_GLOBAL_CACHE_KEY, DASHBOARD_CACHE_TTL, self.compute_global_dashboard_data
+        )
+
+    def compute_global_dashboard_data(self) -> dict:
+        author_names, datasets_count = self.get_top_author_dataset_counts(limit=DASHBOARD_TOP_AUTHORS)
+        datasets_names_views, datasets_views = self.get_views_per_dataset_lists()
+        datasets_names_downloads, datasets_downloads = self.get_downloads_per_dataset_lists()
+        months, downloads = self.get_downloads_per_month()
+        months_views, views_per_month = self.get_views_per_month()
+        return {
+            "statistics": self.get_detailed_statistics(),
+            "author_names": author_names,
+            "datasets_count": datasets_count,
+            "datasets_names_views": datasets_names_views,
+            "datasets_views": datasets_views,
+            "datasets_names_downloads": datasets_names_downloads,
+            "datasets_downloads": datasets_downloads,
+            "months": months,
+            "downloads": downloads,
+            "months_views": months_views,
+            "views_per_month": views_per_month,
+        }
+
+    def get_user_dashboard_data(self) -> dict:
+        """
+        The statistics of the datasets of the logged user, cached until the rollups count new views or downloads of
+        them, or for ``DASHBOARD_USER_CACHE_TTL`` seconds at most.
+        """
+        return stats_cache.get_or_compute(
+            DashboardService.user_cache_key(current_user.id), DASHBOARD_USER_CACHE_TTL, self.compute_user_dashboard_data
+        )
+
+    def compute_user_dashboard_data(self) -> dict:
+        datasets_names_user, datasets_views_user = self.get_views_per_dataset_user_logued()
+        datasets_names_user_downloads, datasets_download_user = self.get_downloads_per_dataset_user_logued()
+        month_views_user, views_per_month_user = self.get_downloads_per_month_user_logued()
+        month_downloads_user, downloads_per_month_user = self.get_views_per_month_user_logued()
+        return {
+            "datasets_names_user": datasets_names_user,
+            "datasets_views_user": datasets_views_user,
+            "datasets_names_user_downloads": datasets_names_user_downloads,
+            "datasets_download_user": datasets_download_user,
+            "month_views_user": month_views_user,
+            "views_per_month_user": views_per_month_user,
+            "month_downloads_user": month_downloads_user,
+            "downloads_per_month_user": downloads_per_month_user,
+        }
+
+    @staticmethod
+    def user_cache_key(user_id) -> str:
+        return f"dashboard_user_{user_id}"
+
+    @staticmethod
+    def invalidate_user_dashboard_data(user_ids):
+        for user_id in user_ids:
+            stats_cache.invalidate(DashboardService.user_cache_key(user_id))
+
+
+class StatsRollupService(BaseService):
+    """
+    Maintains the daily view and download rollups that the dashboard and the public pages read, so statistics never
+    scan the record tables.
+    """
+
+    def __init__(self):
+        super().__init__(StatsRollupRepository())
+
+    def rollup(self, batch_size: int = None, lag: int = None) -> int:
+        """
+        Add the records created since the last rollup to the daily statistics, batch by batch.
+
+        Records newer than ``lag`` seconds (``STATS_ROLLUP_LAG`` by default) wait for the next rollup, so a record
+        whose transaction commits after a higher id is not skipped by the high-water mark.
+
+        Returns:
+            int: The number of records rolled up.
+        """
+        batch_size = batch_size or STATS_ROLLUP_BATCH_SIZE
+        lag = STATS_ROLLUP_LAG if lag is None else lag
+        # The record dates are naive UTC
+        created_before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=lag)
+        rolled_up = 0
+        owner_ids = set()
+        for source in ROLLUP_SOURCES:
+            max_record_id = self.repository.get_max_record_id(source, created_before)
+            while True:
+                state = self.repository.get_state(source)
+                if state.last_record_id >= max_record_id:
+                    self.repository.session.commit()
+                    break
+                last_record_id = min(state.last_record_id + batch_size, max_record_id)
+                try:
+                    counts = self.repository.count_records(source, state.last_record_id, last_record_id)
+                    self.repository.add_counts(source, counts)
+                    self.repository.advance(state, last_record_id)
+                    self.repository.session.commit()
+                except Exception:
+                    self.repository.session.rollback()
+                    raise
+                rolled_up += sum(count for _, _, _, count in counts)
+                owner_ids.update(owner_id for _, owner_id, _, _ in counts)
+        if rolled_up:
+            logger.info(f"Rolled up {rolled_up} view and download records")
+        # The owners of the datasets with new views or downloads see them on their next dashboard visit
+        DashboardService.invalidate_user_dashboard_data(owner_ids)
+        return rolled_up
+
+    def backfill(self) -> int:
+        """
+        Rebuild the daily statistics from every record.
+        """
+        self.repository.clear()
+        return self.rollup()
+
+    def total_dataset_views(self) -> int:
+        return self.repository.total(DataSetDailyStats.views)
+
+    def total_dataset_downloads(self) -> int:
+        return self.repository.total(DataSetDailyStats.downloads)
+
+    def total_file_views(self) -> int:
+        return self.repository.total(HubfileDailyStats.views)
+
+    def total_file_downloads(self) -> int:
+        return self.repository.total(HubfileDailyStats.downloads)
+
+
+@periodic_task('stats.rollup', STATS_ROLLUP_INTERVAL)
+def rollup_stats():
+    StatsRollupService().rollup()
@@ -1,7 +1,7 @@
 import pytest
 from app.modules.dashboard.repositories import DashboardRepository
-from app.modules.dashboard.services import DashboardService
-from unittest.mock import patch, MagicMock
+from app.modules.dashboard.services import DashboardService, StatsRollupService, stats_cache
+from unittest.mock import patch
 from sqlalchemy.orm.query import Query
 from app import create_app, db
 from app.modules.auth.models import User
@@ -10,6 +10,7 @@ from flask_login import login_user
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from app.modules.profile.models import UserProfile
+from app.modules.dataset.models import DSMetaData, DataSet, PublicationType
 
 
 @pytest.fixture
@@ -37,6 +38,11 @@ for i in range(12):
     months.append(first_day_of_month.strftime('%Y-%m'))
 
 
+# One grouped row per month with records, the months without records are missing
+monthly_rows = [(int(month[:4]), int(month[5:]), 1) for month in months[::2]]
+monthly_counts = [1 if i % 2 == 0 else 0 for i in range(12)][::-1]
+
+
 @patch('app.modules.dataset.repositories.DataSetRepository.count_unsynchronized_datasets')
 @patch('app.modules.dataset.repositories.DataSetRepository.count_synchronized_datasets')
 @patch('app.modules.dashboard.repositories.DashboardRepository.total_number_dataset_views')
@@ -70,7 +76,7 @@ def test_get_detailed_statistics(
 
 
 @patch('app.modules.dashboard.repositories.DashboardRepository.get_user_profile_and_dataset_counts')
-def test_service_get_all_author_names_and_dataset_counts(mock_get_author_names_and_dataset_counts):
+def test_service_get_top_author_dataset_counts(mock_get_author_names_and_dataset_counts):
     mock_data = [
         ("Author 1", 5),
         ("Author 2", 3)
@@ -78,11 +84,11 @@ def test_service_get_all_author_names_and_dataset_counts(mock_get_author_names_a
     mock_get_author_names_and_dataset_counts.return_value = mock_data
 
     service = DashboardService()
-    author_names, dataset_counts = service.get_all_author_names_and_dataset_counts()
+    author_names, dataset_counts = service.get_top_author_dataset_counts(limit=2)
 
     assert author_names == ["Author 1", "Author 2"]
     assert dataset_counts == [5, 3]
-    mock_get_author_names_and_dataset_counts.assert_called_once()
+    mock_get_author_names_and_dataset_counts.assert_called_once_with(service, limit=2, offset=0)
 
 
 @patch('app.modules.dashboard.repositories.DashboardRepository.get_views_per_dataset')
@@ -253,7 +259,7 @@ def test_service_get_views_per_month_user_logued(mock_get_last_12_months_downloa
     mock_get_last_12_months_downloads_user_logued.assert_called_once()
 
 
-def test_route(test_client):
+def test_route(test_client, tmp_path):
     login_response = login(test_client, 'user@example.com', 'password')
     assert login_response.status_code == 200, "Login was not successful"
     mock_statistics = {
@@ -291,9 +297,10 @@ def test_route(test_client):
     mock_month_downloads_user = ['2024-01', '2024-02']
     mock_downloads_user = [220, 200]
 
-    with patch('app.modules.dashboard.services.DashboardService.get_detailed_statistics',
-               return_value=mock_statistics), \
-            patch('app.modules.dashboard.services.DashboardService.get_all_author_names_and_dataset_counts',
+    with patch.object(stats_cache, 'folder', str(tmp_path)), \
+            patch('app.modules.dashboard.services.DashboardService.get_detailed_statistics',
+                  return_value=mock_statistics), \
+            patch('app.modules.dashboard.services.DashboardService.get_top_author_dataset_counts',
                   return_value=(mock_author_names, mock_dataset_counts)), \
             patch('app.modules.dashboard.services.DashboardService.get_views_per_dataset_lists',
                   return_value=(mock_datasets_names_views, mock_datasets_views)), \
@@ -314,6 +321,13 @@ def test_route(test_client):
 
         response = test_client.get('/dashboard')
 
+        assert response.status_code == 200
+        assert b'100' in response.data
+        assert b'200' in response.data
+
+        # The charts read their series from the data endpoint
+        response = test_client.get('/dashboard/data')
+
         assert response.status_code == 200
 
         assert b'author1' in response.data
@@ -342,29 +356,60 @@ def test_route(test_client):
 
 
 def test_repository_total_number_dataset_downloads(dashboard_repository):
-    with patch.object(Query, 'count', return_value=1):
+    with patch.object(Query, 'scalar', return_value=1):
         result = dashboard_repository.total_number_dataset_downloads()
         assert result == 1
-        Query.count.assert_called_once()
+        Query.scalar.assert_called_once()
 
 
 def test_repository_total_number_dataset_views(dashboard_repository):
-    with patch.object(Query, 'count', return_value=1):
+    with patch.object(Query, 'scalar', return_value=1):
         result = dashboard_repository.total_number_dataset_views()
         assert result == 1
-        Query.count.assert_called_once()
+        Query.scalar.assert_called_once()
 
 
 def test_repository_get_all_author_names_and_dataset_counts(dashboard_repository):
-    mock_profile = MagicMock(spec=UserProfile)
-    mock_profile.name = 'John'
-    mock_profile.surname = 'Doe'
-    with patch.object(Query, 'all', return_value=[mock_profile]):
-        with patch.object(Query, 'count', return_value=1):
+    with patch.object(Query, 'all', return_value=[('John', 'Doe', 1)]):
+        with patch.object(Query, 'count') as mock_count:
             result = dashboard_repository.get_user_profile_and_dataset_counts()
             assert result == [('John Doe', 1)]
             Query.all.assert_called_once()
-            Query.count.assert_called_once()
+            mock_count.assert_not_called()
+
+
+def test_authors_ranking_and_pagination(test_client):
+    with test_client.application.app_context():
+        prolific = User(email='prolific@example.com', password='password')
+        idle = User(email='idle@example.com', password='password')
+        db.session.add_all([prolific, idle])
+        db.session.flush()
+        db.session.add_all([
+            UserProfile(user_id=prolific.id, name='Prolific', surname='Author'),
+            UserProfile(user_id=idle.id, name='Idle', surname='Author'),
+        ])
+        db.session.add_all([
+            DataSet(user_id=prolific.id, ds_meta_data=DSMetaData(
+                title=f'Ranked {i}', description='Ranked.', publication_type=PublicationType.NONE
+            ))
+            for i in range(2)
+        ])
+        db.session.commit()
+
+        author_names, dataset_counts = DashboardService().get_top_author_dataset_counts(limit=100)
+        assert author_names[0] == 'Prolific Author'
+        assert dataset_counts[0] == 2
+        assert dataset_counts[author_names.index('Idle Author')] == 0
+
+    login(test_client, 'user@example.com', 'password')
+    response = test_client.get('/dashboard/authors?page=1&per_page=1')
+    assert response.status_code == 200
+    assert response.json['authors'] == [{'name': 'Prolific Author', 'datasets': 2}]
+    assert response.json['total'] >= 2
+
+    response = test_client.get('/dashboard/authors?page=2&per_page=1')
+    assert response.json['authors'][0]['name'] != 'Prolific Author'
+    logout(test_client)
 
 
 def test_repository_get_views_per_dataset(dashboard_repository):
@@ -392,16 +437,17 @@ def test_repository_get_downloads_per_dataset(dashboard_repository):
 
 
 def test_repository_get_last_12_months_downloads(dashboard_repository):
-    with patch.object(Query, 'count', return_value=1):
+    with patch.object(Query, 'all', return_value=monthly_rows):
         result = dashboard_repository.get_last_12_months_downloads()
-        assert result == (months[::-1], [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1])
+        assert result == (months[::-1], monthly_counts)
+        Query.all.assert_called_once()
 
 
 def test_repository_get_last_12_months_views(dashboard_repository):
-    mock_author_data = 1
-    with patch.object(Query, 'count', return_value=mock_author_data):
+    with patch.object(Query, 'all', return_value=monthly_rows):
         result = dashboard_repository.get_last_12_months_views()
-        assert result == (months[::-1], [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1])
+        assert result == (months[::-1], monthly_counts)
+        Query.all.assert_called_once()
 
 
 def test_repository_get_views_per_dataset_user_logued(dashboard_repository, test_client):
@@ -434,16 +480,168 @@ def test_repository_get_downloads_per_dataset_user_logued(dashboard_repository,
 def test_repository_get_last_12_months_views_for_user(dashboard_repository):
     mock_user = User(id=1)
     login_user(mock_user)
-    mock_author_data = 1
-    with patch.object(Query, 'count', return_value=mock_author_data):
+    with patch.object(Query, 'all', return_value=monthly_rows):
         result = dashboard_repository.get_last_12_months_views_for_user()
-        assert result == (months[::-1], [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1])
+        assert result == (months[::-1], monthly_counts)
+        Query.all.assert_called_once()
 
 
 def test_repository_get_last_12_months_downloads_user_logued(dashboard_repository):
     mock_user = User(id=1)
     login_user(mock_user)
-    mock_author_data = 1
-    with patch.object(Query, 'count', return_value=mock_author_data):
+    with patch.object(Query, 'all', return_value=monthly_rows):
         result = dashboard_repository.get_last_12_months_downloads_user_logued()
-        assert result == (months[::-1], [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1])
+        assert result == (months[::-1], monthly_counts)
+        Query.all.assert_called_once()
+
+
+def test_rollup_buckets_calendar_months(test_client):
+    from app.modules.dataset.models import DSMetaData, DSViewRecord, DataSet, PublicationType
+
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        dataset = DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(title="Viewed", description="Viewed.", publication_type=PublicationType.REPORT)
+        )
+        db.session.add(dataset)
+        db.session.commit()
+
+        current_month = datetime.today().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        view_dates = [
+            current_month,
+            current_month - relativedelta(seconds=1),  # Last second of the previous month
+            current_month - relativedelta(months=2, days=-27),
+            current_month - relativedelta(months=12),  # Out of the range
+        ]
+        db.session.add_all([
+            DSViewRecord(dataset_id=dataset.id, view_date=view_date, view_cookie="cookie") for view_date in view_dates
+        ])
+        db.session.commit()
+
+        StatsRollupService().rollup(lag=0)
+        result = DashboardRepository().get_last_12_months_views()
+
+    assert result == (months[::-1], [0] * 9 + [1, 1, 1])
+
+
+def test_rollup_is_incremental(test_client):
+    from app.modules.dashboard.models import DataSetDailyStats, HubfileDailyStats
+    from app.modules.dataset.models import DSDownloadRecord, DSMetaData, DataSet, PublicationType
+    from app.modules.featuremodel.models import FeatureModel
+    from app.modules.hubfile.models import Hubfile, HubfileViewRecord
+
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        hubfile = Hubfile(name="model.uvl", checksum="checksum", size=1)
+        dataset = DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(title="Rolled", description="Rolled.", publication_type=PublicationType.REPORT),
+            feature_models=[FeatureModel(files=[hubfile])],
+        )
+        db.session.add(dataset)
+        db.session.commit()
+
+        service = StatsRollupService()
+        service.rollup()
+        dataset_downloads = service.total_dataset_downloads()
+        file_views = service.total_file_views()
+
+        download_date = datetime(2024, 3, 10, 12)
+        db.session.add_all([
+            DSDownloadRecord(dataset_id=dataset.id, download_date=download_date, download_cookie="a"),
+            DSDownloadRecord(dataset_id=dataset.id, download_date=download_date, download_cookie="b"),
+            HubfileViewRecord(file_id=hubfile.id, view_date=download_date, view_cookie="c"),
+        ])
+        db.session.commit()
+        assert service.rollup() == 3
+
+        # Records already rolled up are not counted again, new ones are added to the same day
+        db.session.add(DSDownloadRecord(dataset_id=dataset.id, download_date=download_date, download_cookie="d"))
+        db.session.commit()
+        assert service.rollup(batch_size=1) == 1
+        assert service.rollup() == 0
+
+        stats = DataSetDailyStats.query.filter_by(dataset_id=dataset.id).one()
+        assert (stats.owner_id, stats.day, stats.downloads, stats.views) == (user.id, download_date.date(), 3, 0)
+        assert HubfileDailyStats.query.filter_by(file_id=hubfile.id).one().views == 1
+        assert service.total_dataset_downloads() == dataset_downloads + 3
+        assert service.total_file_views() == file_views + 1
+
+        # The backfill rebuilds the same statistics from every record
+        service.backfill()
+        assert DataSetDailyStats.query.filter_by(dataset_id=dataset.id).one().downloads == 3
+        assert service.total_dataset_downloads() == dataset_downloads + 3
+
+
+def test_user_dashboard_is_cached_until_new_records_are_rolled_up(test_client, tmp_path):
+    from app.modules.dataset.models import DSViewRecord
+
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        dataset = DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(title="Cached", description="Cached.", publication_type=PublicationType.REPORT),
+        )
+        db.session.add(dataset)
+        db.session.commit()
+        dataset_id = dataset.id
+        StatsRollupService().rollup()
+
+    login(test_client, 'user@example.com', 'password')
+    with patch.object(stats_cache, 'folder', str(tmp_path)):
+        views = test_client.get('/dashboard/data').json["views_per_month_user"]
+
+        with test_client.application.app_context():
+            db.session.add(DSViewRecord(dataset_id=dataset_id, view_date=datetime.today(), view_cookie="cached"))
+            db.session.commit()
+
+        # Not rolled up yet, the cached dashboard is served
+        assert test_client.get('/dashboard/data').json["views_per_month_user"] == views
+
+        with test_client.application.app_context():
+            assert StatsRollupService().rollup(lag=0) == 1
+
+        # The rollup counted a view of a dataset of the user, so their dashboard is recomputed
+        assert test_client.get('/dashboard/data').json["views_per_month_user"][-1] == views[-1] + 1
+    logout(test_client)
+
+
+def test_rollup_waits_for_records_inside_the_lag(test_client):
+    from app.modules.dataset.models import DSViewRecord
+
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        dataset = DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(title="Lagged", description="Lagged.", publication_type=PublicationType.REPORT),
+        )
+        db.session.add(dataset)
+        db.session.commit()
+        service = StatsRollupService()
+        service.rollup(lag=0)
+
+        # A record that may still be preceded by an uncommitted one is left for a later rollup
+        db.session.add(DSViewRecord(dataset_id=dataset.id, view_date=datetime.utcnow(), view_cookie="lagged"))
+        db.session.commit()
+        assert service.rollup(lag=300) == 0
+        assert service.rollup(lag=0) == 1
+
+
+def test_rollup_runs_in_the_job_workers(test_client):
+    from app.modules.jobs.services import PERIODIC_TASKS, JobService
+
+    assert 'stats.rollup' in PERIODIC_TASKS
+    with patch.object(StatsRollupService, 'rollup') as rollup:
+        with test_client.application.app_context():
+            JobService().work(burst=True)
+        # Pages only read the daily statistics
+        test_client.get('/')
+    rollup.assert_called_once_with()
+
+
+def test_stats_cache_is_rooted_at_the_working_dir():
+    import os
+    from core.configuration.configuration import cache_folder_name
+
+    assert stats_cache.folder == os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "stats")
@@ -128,6 +128,43 @@ var currentId = 0;
             upload_error.style.display = 'block';
         }
 
+        function write_uvl_errors(errors) {
+            if (!errors) {
+                return;
+            }
+            for (let [filename, messages] of Object.entries(errors)) {
+                write_upload_error(filename + ': ' + messages.join(' '));
+            }
+        }
+
+        const PUBLICATION_POLL_INTERVAL = 3000;
+
+        function wait_for_publication(status_url) {
+            fetch(status_url)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'done') {
+                        window.location.href = "/dataset/list";
+                    } else if (job.status === 'failed') {
+                        hide_loading();
+                        clean_upload_errors();
+                        write_upload_error('the dataset was created but could not be published: ' + job.error);
+                    } else {
+                        clean_upload_errors();
+                        if (job.error) {
+                            // The job is retried with a backoff, show why the last attempt failed meanwhile
+                            write_upload_error('publication attempt ' + job.attempts + ' of ' + job.max_attempts
+                                + ' failed, retrying: ' + job.error);
+                        }
+                        setTimeout(() => wait_for_publication(status_url), PUBLICATION_POLL_INTERVAL);
+                    }
+                })
+                .catch(error => {
+                    console.error('Error polling the publication job:', error);
+                    setTimeout(() => wait_for_publication(status_url), PUBLICATION_POLL_INTERVAL);
+                });
+        }
+
         window.onload = function () {
 
             if (use_fakenodo === false) {
@@ -210,7 +247,8 @@ var currentId = 0;
                                     console.log('Dataset sent successfully');
                                     response.json().then(data => {
                                         console.log(data.message);
-                                        window.location.href = "/dataset/list";
+                                        // The publication runs in a background job, wait for it before leaving
+                                        wait_for_publication(data.status_url);
                                     });
                                 } else {
                                     response.json().then(data => {
@@ -218,6 +256,7 @@ var currentId = 0;
                                         hide_loading();
 
                                         write_upload_error(data.message);
+                                        write_uvl_errors(data.errors);
 
                                     });
                                 }
@@ -0,0 +1,385 @@
+import json
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import yaml
+
+from core.cache.file_cache import FileCache
+from core.configuration.configuration import cache_folder_name
+
+# Bumped whenever the exported documents change, so cached exports of the previous version are not served
+UVL_EXPORT_VERSION = "1"
+
+EXPORT_EXTENSIONS = {"json": ".json", "xml": ".xml", "yaml": ".yaml"}
+
+SECTION_KEYWORDS = {"namespace", "imports", "include", "features", "constraints"}
+GROUP_KEYWORDS = {"mandatory", "optional", "alternative", "or"}
+FEATURE_TYPES = {"Boolean", "Integer", "Real", "String"}
+
+GROUP_CARDINALITY = re.compile(r"^\[\s*\d+\s*(\.\.\s*(\d+|\*)\s*)?\]$")
+FEATURE_CARDINALITY = re.compile(r"^cardinality\s*\[([^\]]*)\]")
+FEATURE_NAME = re.compile(r"^[^\s{]+")
+
+
+class UVLSyntaxError(ValueError):
+    def __init__(self, line_number: int, message: str):
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+class UVLGroup(NamedTuple):
+    kind: str
+    features: list
+
+
+class UVLFeature(NamedTuple):
+    name: str
+    type: Optional[str]
+    cardinality: Optional[str]
+    attributes: dict
+    groups: List[UVLGroup]
+
+
+class UVLModel(NamedTuple):
+    namespace: Optional[str]
+    imports: list
+    includes: list
+    root: Optional[UVLFeature]
+    constraints: list
+
+
+def _strip_comments(line: str, in_block_comment: bool) -> Tuple[str, bool]:
+    """
+    Remove the ``//`` and ``/* */`` comments of a line, leaving the quoted text untouched.
+
+    Returns the remaining text and whether a block comment is still open at the end of the line.
+    """
+    text = []
+    quote = None
+    i = 0
+    while i < len(line):
+        if in_block_comment:
+            end = line.find("*/", i)
+            if end < 0:
+                return "".join(text), True
+            in_block_comment = False
+            i = end + 2
+            continue
+        char = line[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif line.startswith("//", i):
+            break
+        elif line.startswith("/*", i):
+            in_block_comment = True
+            i += 2
+            continue
+        text.append(char)
+        i += 1
+    return "".join(text), in_block_comment
+
+
+def tokenize_uvl(content: str) -> Iterator[Tuple[int, int, str]]:
+    """
+    Yield the line number, indentation and text of every line of a UVL model with content.
+
+    Comments are removed and tabs count as four columns of indentation.
+    """
+    in_block_comment = False
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        line, in_block_comment = _strip_comments(line, in_block_comment)
+        line = line.expandtabs(4).rstrip()
+        text = line.lstrip()
+        if text:
+            yield line_number, len(line) - len(text), text
+
+
+def _split_top_level(text: str, separator: str = ",") -> List[str]:
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[(":
+            depth += 1
+        elif char in "}])":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _parse_value(text: str, line_number: int):
+    if text.startswith("{"):
+        if not text.endswith("}"):
+            raise UVLSyntaxError(line_number, f"Unterminated attributes '{text}'")
+        return _parse_attributes(text[1:-1], line_number)
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    if text in ("true", "false"):
+        return text == "true"
+    for number_type in (int, float):
+        try:
+            return number_type(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _parse_attributes(text: str, line_number: int) -> dict:
+    attributes = {}
+    for item in _split_top_level(text):
+        if item[0] in "\"'":
+            end = item.find(item[0], 1)
+            if end < 0:
+                raise UVLSyntaxError(line_number, f"Unterminated name '{item}'")
+            key, value = item[1:end], item[end + 1:].strip()
+        else:
+            key, _, value = item.partition(" ")
+            value = value.strip()
+        attributes[key] = _parse_value(value, line_number) if value else True
+    return attributes
+
+
+def _parse_feature(text: str, line_number: int) -> UVLFeature:
+    feature_type = None
+    first, _, remainder = text.partition(" ")
+    if first in FEATURE_TYPES and remainder.strip():
+        feature_type, text = first, remainder.strip()
+
+    if text.startswith('"'):
+        end = text.find('"', 1)
+        if end < 0:
+            raise UVLSyntaxError(line_number, f"Unterminated feature name '{text}'")
+        name, text = text[1:end], text[end + 1:].strip()
+    else:
+        match = FEATURE_NAME.match(text)
+        if not match:
+            raise UVLSyntaxError(line_number, f"Missing feature name in '{text}'")
+        name, text = match.group(0), text[match.end():].strip()
+
+    cardinality = None
+    match = FEATURE_CARDINALITY.match(text)
+    if match:
+        cardinality = match.group(1).replace(" ", "")
+        text = text[match.end():].strip()
+
+    attributes = {}
+    if text.startswith("{"):
+        attributes = _parse_value(text, line_number)
+    elif text:
+        raise UVLSyntaxError(line_number, f"Unexpected '{text}' after feature '{name}'")
+
+    return UVLFeature(name, feature_type, cardinality, attributes, [])
+
+
+def parse_uvl(content: str) -> UVLModel:
+    """
+    Build the tree of a UVL model in a single pass over its lines.
+
+    The hierarchy follows the indentation: a feature holds groups (mandatory, optional, alternative, or and
+    cardinality groups) and every group holds features. Constraints are kept as written.
+
+    Raises:
+        UVLSyntaxError: If the model is not well formed.
+    """
+    namespace = None
+    imports = []
+    includes = []
+    constraints = []
+    root = None
+
+    section = None
+    constraint_indent = None
+    stack = []
+
+    for line_number, indent, text in tokenize_uvl(content):
+        if indent == 0:
+            keyword, _, argument = text.partition(" ")
+            if keyword not in SECTION_KEYWORDS:
+                raise UVLSyntaxError(line_number, f"Unexpected '{text}' outside of a section")
+            section = keyword
+            if section == "namespace":
+                namespace = argument.strip()
+            elif section == "features" and root is not None:
+                raise UVLSyntaxError(line_number, "Duplicated features section")
+            continue
+
+        if section == "imports":
+            imports.append(text)
+        elif section == "include":
+            includes.append(text)
+        elif section == "constraints":
+            # A line indented deeper than the constraints continues the previous one
+            if constraint_indent is None or indent <= constraint_indent or not constraints:
+                constraint_indent = indent
+                constraints.append(text)
+            else:
+                constraints[-1] = f"{constraints[-1]} {text}"
+        elif section == "features":
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            if not stack:
+                if root is not None:
+                    raise UVLSyntaxError(line_number, f"Second root feature '{text}'")
+                root = _parse_feature(text, line_number)
+                stack.append((indent, root))
+                continue
+
+            parent = stack[-1][1]
+            if text in GROUP_KEYWORDS or GROUP_CARDINALITY.match(text):
+                if not isinstance(parent, UVLFeature):
+                    raise UVLSyntaxError(line_number, f"Group '{text}' is not nested in a feature")
+                node = UVLGroup(text, [])
+                parent.groups.append(node)
+            else:
+                if not isinstance(parent, UVLGroup):
+                    raise UVLSyntaxError(line_number, f"Feature '{text}' is not nested in a group")
+                node = _parse_feature(text, line_number)
+                parent.features.append(node)
+            stack.append((indent, node))
+        else:
+            raise UVLSyntaxError(line_number, f"Unexpected '{text}' outside of a section")
+
+    return UVLModel(namespace, imports, includes, root, constraints)
+
+
+def feature_to_dict(feature: UVLFeature) -> dict:
+    data = {"name": feature.name}
+    if feature.type:
+        data["type"] = feature.type
+    if feature.cardinality:
+        data["cardinality"] = feature.cardinality
+    if feature.attributes:
+        data["attributes"] = feature.attributes
+    if feature.groups:
+        data["groups"] = [
+            {"type": group.kind, "features": [feature_to_dict(child) for child in group.features]}
+            for group in feature.groups
+        ]
+    return data
+
+
+def model_to_dict(model: UVLModel) -> dict:
+    data = {}
+    if model.namespace:
+        data["namespace"] = model.namespace
+    if model.imports:
+        data["imports"] = model.imports
+    if model.includes:
+        data["include"] = model.includes
+    data["features"] = feature_to_dict(model.root) if model.root else None
+    data["constraints"] = model.constraints
+    return data
+
+
+def write_json(model: UVLModel) -> bytes:
+    return json.dumps(model_to_dict(model), indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def write_yaml(model: UVLModel) -> bytes:
+    return yaml.safe_dump(
+        model_to_dict(model), default_flow_style=False, sort_keys=False, allow_unicode=True
+    ).encode("utf-8")
+
+
+def _xml_attributes(attributes: dict, indent: str) -> Iterator[str]:
+    for name, value in attributes.items():
+        if isinstance(value, dict):
+            yield f"{indent}<attribute name={quoteattr(name)}>"
+            yield from _xml_attributes(value, indent + "  ")
+            yield f"{indent}</attribute>"
+        else:
+            if isinstance(value, bool):
+                value = "true" if value else "false"
+            yield f"{indent}<attribute name={quoteattr(name)}>{escape(str(value))}</attribute>"
+
+
+def _xml_feature(feature: UVLFeature, indent: str) -> Iterator[str]:
+    tag = f"<feature name={quoteattr(feature.name)}"
+    if feature.type:
+        tag += f" type={quoteattr(feature.type)}"
+    if feature.cardinality:
+        tag += f" cardinality={quoteattr(feature.cardinality)}"
+    if not feature.attributes and not feature.groups:
+        yield f"{indent}{tag}/>"
+        return
+    yield f"{indent}{tag}>"
+    yield from _xml_attributes(feature.attributes, indent + "  ")
+    for group in feature.groups:
+        yield f"{indent}  <group type={quoteattr(group.kind)}>"
+        for child in group.features:
+            yield from _xml_feature(child, indent + "    ")
+        yield f"{indent}  </group>"
+    yield f"{indent}</feature>"
+
+
+def _xml_lines(model: UVLModel) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>'
+    yield f"<uvl namespace={quoteattr(model.namespace)}>" if model.namespace else "<uvl>"
+    for tag, items in (("import", model.imports), ("include", model.includes)):
+        if items:
+            yield f"  <{tag}s>"
+            for item in items:
+                yield f"    <{tag}>{escape(item)}</{tag}>"
+            yield f"  </{tag}s>"
+    if model.root:
+        yield "  <features>"
+        yield from _xml_feature(model.root, "    ")
+        yield "  </features>"
+    yield "  <constraints>"
+    for constraint in model.constraints:
+        yield f"    <constraint>{escape(constraint)}</constraint>"
+    yield "  </constraints>"
+    yield "</uvl>"
+
+
+def write_xml(model: UVLModel) -> bytes:
+    return ("\n".join(_xml_lines(model)) + "\n").encode("utf-8")
+
+
+WRITERS = {"json": write_json, "xml": write_xml, "yaml": write_yaml}
+
+
+def export_uvl(content: str, formats: Iterable[str] = EXPORT_EXTENSIONS) -> dict:
+    """
+    Parse a UVL model once and write it in every requested format.
+
+    Returns:
+        dict: The content of each format as bytes.
+    """
+    model = parse_uvl(content)
+    return {format_name: WRITERS[format_name](model) for format_name in formats}
+
+
+class UVLExportCache(FileCache):
+    """
+    On-disk store of the JSON, XML and YAML exports of UVL models keyed by (UVL checksum, format, export version).
+    """
+
+    def __init__(self, folder: Optional[str] = None, max_size: Optional[int] = None):
+        super().__init__(
+            folder or os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "exports"),
+            max_size if max_size is not None else int(os.getenv("UVL_EXPORT_CACHE_MAX_SIZE", 256 * 1024 ** 2)),
+        )
+
+    def filename(self, checksum: str, format_name: str) -> str:
+        return f"{checksum}-v{UVL_EXPORT_VERSION}{EXPORT_EXTENSIONS[format_name]}"
+
+    def get_export(self, checksum: str, format_name: str) -> Optional[str]:
+        return self.get(self.filename(checksum, format_name))
+
+    def put_export(self, checksum: str, format_name: str, data: bytes) -> str:
+        return self.put(self.filename(checksum, format_name), data)
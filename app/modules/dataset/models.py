@@ -49,7 +49,7 @@ class DSMetrics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     number_of_models = db.Column(db.String(120))
     number_of_features = db.Column(db.Integer)
-    number_of_products = db.Column(db.Integer)
+    number_of_products = db.Column(db.BigInteger)
 
     def __repr__(self):
         nm = self.number_of_models
@@ -65,7 +65,11 @@ class DSMetaData(db.Model):
     description = db.Column(db.Text, nullable=False)
     publication_type = db.Column(SQLAlchemyEnum(PublicationType), nullable=False)
     publication_doi = db.Column(db.String(120))
-    rating = db.Column(db.Float, default=0.0)
+    # Average rating, kept up to date with the sum and count of the ratings by DSRatingService. Double precision, a
+    # single precision FLOAT is returned rounded by MySQL and would not compare equal to itself as a keyset cursor
+    rating = db.Column(db.Double, default=0.0, index=True)
+    rating_sum = db.Column(db.Double, nullable=False, default=0.0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     dataset_doi = db.Column(db.String(120))
     tags = db.Column(db.String(120))
     ds_metrics_id = db.Column(db.Integer, db.ForeignKey('ds_metrics.id'))
@@ -111,17 +115,12 @@ class DataSet(db.Model):
 
     def get_uvlhub_doi(self):
         from app.modules.dataset.services import DataSetService
-        return DataSetService().get_uvlhub_doi(self)
-
-    def update_rating(self):
-        total_ratings = sum(rating.rating for rating in self.ratings)
-        count = len(self.ratings)
-        self.rating = total_ratings / count if count > 0 else 0
-        db.session.commit()
+        return DataSetService.get_uvlhub_doi(self)
 
     def to_dict(self):
-        from app.modules.dataset.services import DSRatingService
-        avg_rating = DSRatingService().get_dataset_average_rating(self.ds_meta_data.id)
+        from app.modules.dataset.services import SizeService
+        files = self.files()
+        total_size = sum(file.size for file in files)
 
         return {
             'title': self.ds_meta_data.title,
@@ -132,16 +131,16 @@ class DataSet(db.Model):
             'authors': [author.to_dict() for author in self.ds_meta_data.authors],
             'publication_type': self.get_cleaned_publication_type(),
             'publication_doi': self.ds_meta_data.publication_doi,
-            'rating': avg_rating,
+            'rating': self.ds_meta_data.rating or 0.0,
             'dataset_doi': self.ds_meta_data.dataset_doi,
             'tags': self.ds_meta_data.tags.split(",") if self.ds_meta_data.tags else [],
             'url': self.get_uvlhub_doi(),
             'download': f'{request.host_url.rstrip("/")}/dataset/download/{self.id}',
             'zenodo': self.get_zenodo_url(),
-            'files': [file.to_dict() for fm in self.feature_models for file in fm.files],
-            'files_count': self.get_files_count(),
-            'total_size_in_bytes': self.get_file_total_size(),
-            'total_size_in_human_format': self.get_file_total_size_for_human(),
+            'files': [file.to_dict() for file in files],
+            'files_count': len(files),
+            'total_size_in_bytes': total_size,
+            'total_size_in_human_format': SizeService().get_human_readable_size(total_size),
         }
 
     def __repr__(self):
@@ -152,7 +151,7 @@ class DSDownloadRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id'))
-    download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    download_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     download_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
 
     def __repr__(self):
@@ -168,7 +167,7 @@ class DSViewRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id'))
-    view_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    view_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     view_cookie = db.Column(db.String(36), nullable=False)  # Assuming UUID4 strings
 
     def __repr__(self):
@@ -3,7 +3,8 @@ import logging
 from flask_login import current_user
 from typing import Optional
 
-from sqlalchemy import desc, func
+from sqlalchemy import case, desc, func
+from sqlalchemy.orm import selectinload
 
 from app.modules.dataset.models import (
     Author,
@@ -14,11 +15,23 @@ from app.modules.dataset.models import (
     DataSet,
     DSRating
 )
+from app.modules.featuremodel.models import FeatureModel
+from core.events.event_buffer import event_buffer
 from core.repositories.BaseRepository import BaseRepository
 
 logger = logging.getLogger(__name__)
 
 
+def dataset_serialization_options() -> tuple:
+    """
+    Loader options that fetch everything ``DataSet.to_dict`` reads with one query per relationship.
+    """
+    return (
+        selectinload(DataSet.ds_meta_data).selectinload(DSMetaData.authors),
+        selectinload(DataSet.feature_models).selectinload(FeatureModel.files),
+    )
+
+
 class AuthorRepository(BaseRepository):
     def __init__(self):
         super().__init__(Author)
@@ -32,6 +45,16 @@ class DSDownloadRecordRepository(BaseRepository):
         max_id = self.model.query.with_entities(func.max(self.model.id)).scalar()
         return max_id if max_id is not None else 0
 
+    def record_download(self, dataset_id: int, user_cookie: str):
+        event_buffer.record(
+            self.model,
+            ('user_id', 'dataset_id', 'download_cookie'),
+            user_id=current_user.id if current_user.is_authenticated else None,
+            dataset_id=dataset_id,
+            download_date=datetime.now(timezone.utc),
+            download_cookie=user_cookie,
+        )
+
 
 class DSMetaDataRepository(BaseRepository):
     def __init__(self):
@@ -64,6 +87,16 @@ class DSViewRecordRepository(BaseRepository):
             view_cookie=user_cookie,
         )
 
+    def record_view(self, dataset: DataSet, user_cookie: str):
+        event_buffer.record(
+            self.model,
+            ('user_id', 'dataset_id', 'view_cookie'),
+            user_id=current_user.id if current_user.is_authenticated else None,
+            dataset_id=dataset.id,
+            view_date=datetime.now(timezone.utc),
+            view_cookie=user_cookie,
+        )
+
 
 class DataSetRepository(BaseRepository):
     def __init__(self):
@@ -83,6 +116,14 @@ class DataSetRepository(BaseRepository):
             .all()
         )
 
+    def get_all_synchronized(self) -> list:
+        return (
+            self.model.query.join(DSMetaData)
+            .filter(DSMetaData.dataset_doi.isnot(None))
+            .order_by(self.model.id)
+            .all()
+        )
+
     def get_unsynchronized(self, current_user_id: int) -> DataSet:
         return (
             self.model.query.join(DSMetaData)
@@ -114,7 +155,8 @@ class DataSetRepository(BaseRepository):
 
     def latest_synchronized(self):
         return (
-            self.model.query.join(DSMetaData)
+            self.model.query.options(*dataset_serialization_options())
+            .join(DSMetaData)
             .filter(DSMetaData.dataset_doi.isnot(None))
             .order_by(desc(self.model.id))
             .limit(5)
@@ -138,9 +180,33 @@ class DSRatingRepository(BaseRepository):
         return self.model.query.filter(DSRating.ds_meta_data_id == ds_meta_data_id, DSRating.user_id == user_id).first()
 
     def get_average_rating(self, ds_meta_data_id: int) -> float:
-        avg = func.avg(DSRating.rating)
-        average = self.model.query.filter(DSRating.ds_meta_data_id == ds_meta_data_id).with_entities(avg).scalar()
+        average = self.session.query(DSMetaData.rating).filter(DSMetaData.id == ds_meta_data_id).scalar()
         return average if average else 0.0
 
     def count_ratings(self, ds_meta_data_id: int) -> int:
-        return self.model.query.filter(DSRating.ds_meta_data_id == ds_meta_data_id).count()
+        count = self.session.query(DSMetaData.rating_count).filter(DSMetaData.id == ds_meta_data_id).scalar()
+        return count or 0
+
+    def update_rating_aggregates(self, ds_meta_data_id: int, sum_delta: float, count_delta: int):
+        """
+        Add the deltas to the rating sum and count of the metadata and recompute its average, without committing.
+
+        Both updates are atomic in the database, so concurrent ratings of the same dataset are not lost.
+        """
+        metadata = DSMetaData.query.filter(DSMetaData.id == ds_meta_data_id)
+        metadata.update(
+            {
+                DSMetaData.rating_sum: DSMetaData.rating_sum + sum_delta,
+                DSMetaData.rating_count: DSMetaData.rating_count + count_delta,
+            },
+            synchronize_session=False,
+        )
+        # A separate statement, MySQL and SQLite disagree on whether SET sees the values assigned before it
+        metadata.update(
+            {
+                DSMetaData.rating: case(
+                    (DSMetaData.rating_count > 0, DSMetaData.rating_sum / DSMetaData.rating_count), else_=0.0
+                )
+            },
+            synchronize_session=False,
+        )
@@ -1,44 +1,39 @@
 import logging
 import os
-import json
 import shutil
-import tempfile
 import uuid
-import yaml
-from datetime import datetime, timezone
-from zipfile import ZipFile
-from xml.etree.ElementTree import Element, SubElement, tostring
-import xml.dom.minidom as minidom
+from datetime import datetime
 
 from flask import (
+    Response,
     redirect,
     render_template,
     request,
     jsonify,
     send_file,
-    send_from_directory,
     make_response,
     abort,
     url_for,
 )
 from flask_login import login_required, current_user
 
+from app.modules.dataset.exporters import UVL_EXPORT_VERSION
 from app.modules.dataset.forms import DataSetForm
-from app.modules.dataset.models import (
-    DSDownloadRecord
-)
 from app.modules.dataset import dataset_bp
 from app.modules.dataset.services import (
     AuthorService,
     DSDownloadRecordService,
     DSMetaDataService,
     DSViewRecordService,
+    DataSetPublicationService,
     DataSetService,
     DOIMappingService,
-    DSRatingService
+    DSRatingService,
+    ChunkedUploadService,
+    InvalidUVLError,
+    UploadError,
 )
-from app.modules.fakenodo.services import FakenodoService
-from app.modules.zenodo.services import ZenodoService
+from app.modules.featuremodel.services import FeatureModelService
 from core.configuration.configuration import USE_FAKENODO
 
 logger = logging.getLogger(__name__)
@@ -47,11 +42,11 @@ logger = logging.getLogger(__name__)
 dataset_service = DataSetService()
 author_service = AuthorService()
 dsmetadata_service = DSMetaDataService()
-zenodo_service = ZenodoService()
-fakenodo_service = FakenodoService()
 doi_mapping_service = DOIMappingService()
 ds_view_record_service = DSViewRecordService()
 ds_rating_service = DSRatingService()
+feature_model_service = FeatureModelService()
+dataset_publication_service = DataSetPublicationService()
 
 
 @dataset_bp.route("/dataset/upload", methods=["GET", "POST"])
@@ -70,81 +65,26 @@ def create_dataset():
             dataset = dataset_service.create_from_form(form=form, current_user=current_user)
             logger.info(f"Created dataset: {dataset}")
             dataset_service.move_feature_models(dataset)
+            feature_model_service.schedule_analysis(dataset.feature_models)
+        except InvalidUVLError as exc:
+            return jsonify({"message": "Some UVL models are not valid", "errors": exc.errors}), 400
         except Exception as exc:
             logger.exception(f"Exception while create dataset data in local {exc}")
             return jsonify({"Exception while create dataset data in local: ": str(exc)}), 400
 
-        if USE_FAKENODO:
-            data = {}
-            try:
-                fakenodo_response_json = fakenodo_service.create_new_deposition(dataset)
-                response_data = json.dumps(fakenodo_response_json)
-                data = json.loads(response_data)
-            except Exception as exc:
-                data = {}
-                fakenodo_response_json = {}
-                logger.exception(f"Exception while create dataset data in Fakenodo {exc}")
-
-            if data.get("conceptrecid"):
-                deposition_id = data.get("id")
-
-                # update dataset with deposition id in Fakenodo
-                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
-                try:
-                    # iterate for each feature model (one feature model = one request to Fakenodo)
-                    for feature_model in dataset.feature_models:
-                        fakenodo_service.upload_file(dataset, deposition_id, feature_model)
-
-                    # publish deposition
-                    fakenodo_service.publish_deposition(deposition_id)
-
-                    # update DOI
-                    deposition_doi = fakenodo_service.get_doi(deposition_id)
-                    dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-                except Exception as e:
-                    msg = f"it has not been possible upload feature models in Fakenodo and update the DOI: {e}"
-                    return jsonify({"message": msg}), 200
-        else:
-            # send dataset as deposition to Zenodo
-            data = {}
-            try:
-                zenodo_response_json = zenodo_service.create_new_deposition(dataset)
-                response_data = json.dumps(zenodo_response_json)
-                data = json.loads(response_data)
-            except Exception as exc:
-                data = {}
-                zenodo_response_json = {}
-                logger.exception(f"Exception while create dataset data in Zenodo {exc}")
-
-            if data.get("conceptrecid"):
-                deposition_id = data.get("id")
-
-                # update dataset with deposition id in Zenodo
-                dataset_service.update_dsmetadata(dataset.ds_meta_data_id, deposition_id=deposition_id)
-
-                try:
-                    # iterate for each feature model (one feature model = one request to Zenodo)
-                    for feature_model in dataset.feature_models:
-                        zenodo_service.upload_file(dataset, deposition_id, feature_model)
-
-                    # publish deposition
-                    zenodo_service.publish_deposition(deposition_id)
-
-                    # update DOI
-                    deposition_doi = zenodo_service.get_doi(deposition_id)
-                    dataset_service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=deposition_doi)
-                except Exception as e:
-                    msg = f"it has not been possible upload feature models in Zenodo and update the DOI: {e}"
-                    return jsonify({"message": msg}), 200
+        # The deposition is created, filled and published by a background job, the client polls its status
+        job = dataset_publication_service.enqueue(dataset)
 
         # Delete temp folder
         file_path = current_user.temp_folder()
         if os.path.exists(file_path) and os.path.isdir(file_path):
             shutil.rmtree(file_path)
 
-        msg = "Everything works!"
-        return jsonify({"message": msg}), 200
+        return jsonify({
+            "message": "Dataset created, its publication is queued",
+            "job_id": job.id,
+            "status_url": url_for("jobs.job_status", job_id=job.id),
+        }), 202
 
     return render_template("dataset/upload_dataset.html", form=form, use_fakenodo=USE_FAKENODO)
 
@@ -162,45 +102,71 @@ def list_dataset():
 @dataset_bp.route("/dataset/file/upload", methods=["POST"])
 @login_required
 def upload():
-    file = request.files["file"]
-    temp_folder = current_user.temp_folder()
-
+    file = request.files.get("file")
     if not file or not file.filename.endswith(".uvl"):
         return jsonify({"message": "No valid file"}), 400
 
-    # create temp folder
-    if not os.path.exists(temp_folder):
-        os.makedirs(temp_folder)
-
-    file_path = os.path.join(temp_folder, file.filename)
-
-    if os.path.exists(file_path):
-        # Generate unique filename (by recursion)
-        base_name, extension = os.path.splitext(file.filename)
-        i = 1
-        while os.path.exists(
-            os.path.join(temp_folder, f"{base_name} ({i}){extension}")
-        ):
-            i += 1
-        new_filename = f"{base_name} ({i}){extension}"
-        file_path = os.path.join(temp_folder, new_filename)
-    else:
-        new_filename = file.filename
-
+    uploads = ChunkedUploadService(current_user.temp_folder())
     try:
-        file.save(file_path)
+        if "dzuuid" in request.form:
+            # Trozo enviado por Dropzone, la subida se completa al recibir el último
+            upload_id = request.form["dzuuid"]
+            offset = request.form.get("dzchunkbyteoffset", type=int)
+            if offset == 0 or not uploads.exists(upload_id):
+                uploads.init(file.filename, request.form.get("dztotalfilesize", type=int), upload_id)
+            state = uploads.write_chunk(upload_id, offset, file.stream)
+            if state["offset"] < state["size"]:
+                return jsonify(state), 200
+            result = uploads.finalize(upload_id)
+        else:
+            result = uploads.upload(file.filename, file.stream)
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status_code
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
-    return (
-        jsonify(
-            {
-                "message": "UVL uploaded and validated successfully",
-                "filename": new_filename,
-            }
-        ),
-        200,
-    )
+    return jsonify({"message": "UVL uploaded and validated successfully", **result}), 200
+
+
+@dataset_bp.route("/dataset/file/upload/init", methods=["POST"])
+@login_required
+def upload_init():
+    data = request.get_json(silent=True) or {}
+    try:
+        state = ChunkedUploadService(current_user.temp_folder()).init(data.get("filename"), data.get("size"))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status_code
+    return jsonify(state), 201
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>", methods=["GET"])
+@login_required
+def upload_status(upload_id):
+    try:
+        return jsonify(ChunkedUploadService(current_user.temp_folder()).status(upload_id))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status_code
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>", methods=["PUT"])
+@login_required
+def upload_chunk(upload_id):
+    offset = request.args.get("offset", type=int)
+    try:
+        return jsonify(ChunkedUploadService(current_user.temp_folder()).write_chunk(upload_id, offset, request.stream))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status_code
+
+
+@dataset_bp.route("/dataset/file/upload/<upload_id>/finalize", methods=["POST"])
+@login_required
+def upload_finalize(upload_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        result = ChunkedUploadService(current_user.temp_folder()).finalize(upload_id, data.get("checksum"))
+    except UploadError as e:
+        return jsonify(e.to_dict()), e.status_code
+    return jsonify({"message": "UVL uploaded and validated successfully", **result}), 200
 
 
 @dataset_bp.route("/dataset/file/delete", methods=["POST"])
@@ -217,28 +183,28 @@ def delete():
     return jsonify({"error": "Error: File not found"})
 
 
-@dataset_bp.route("/dataset/download/<int:dataset_id>", methods=["GET"])
-def download_dataset(dataset_id):
-    dataset = dataset_service.get_or_404(dataset_id)
-
-    file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
+def zip_response(dataset, cache_name, entries, filename, version=""):
+    cached_zip = dataset_service.get_cached_archive(cache_name, dataset, version)
+    if cached_zip:
+        return send_file(cached_zip, as_attachment=True, download_name=filename, mimetype="application/zip")
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
+    return Response(
+        dataset_service.cache_archive(cache_name, dataset, entries, version),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
 
-                relative_path = os.path.relpath(full_path, file_path)
+@dataset_bp.route("/dataset/download/<int:dataset_id>", methods=["GET"])
+def download_dataset(dataset_id):
+    dataset = dataset_service.get_or_404(dataset_id)
 
-                zipf.write(
-                    full_path,
-                    arcname=os.path.join(
-                        os.path.basename(zip_path[:-4]), relative_path
-                    ),
-                )
+    resp = zip_response(
+        dataset,
+        f"dataset_{dataset_id}-uvl",
+        dataset_service.get_dataset_zip_entries(dataset),
+        f"dataset_{dataset_id}.zip",
+    )
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
@@ -246,38 +212,10 @@ def download_dataset(dataset_id):
             uuid.uuid4()
         )  # Generate a new unique identifier if it does not exist
         # Save the cookie to the user's browser
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
-
-    # Check if the download record already exists for this cookie
-    existing_record = DSDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_cookie=user_cookie
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        DSDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
-        )
+
+    # Record the download, written in the background and only once per user and cookie
+    DSDownloadRecordService().record_download(dataset_id, user_cookie)
 
     return resp
 
@@ -310,11 +248,16 @@ def rate_dataset(dataset_id):
         if not (1 <= rate <= 5):
             return jsonify({'message': 'Invalid rating value, it should be between 1 and 5'}), 400
 
+        # Las calificaciones se guardan sobre los metadatos del dataset, no sobre el dataset
+        dataset = dataset_service.get_by_id(dataset_id)
+        if dataset is None:
+            return jsonify({'message': 'Dataset not found'}), 404
+
         # Agregar o actualizar la calificación
-        ds_rating_service.add_or_update_rating(dataset_id, user_id, rate)
+        ds_rating_service.add_or_update_rating(dataset.ds_meta_data_id, user_id, rate)
 
         # Calcular el promedio actualizado
-        avg_rating = ds_rating_service.get_dataset_average_rating(dataset_id)
+        avg_rating = ds_rating_service.get_dataset_average_rating(dataset.ds_meta_data_id)
 
         return jsonify({'message': 'Rating added/updated', 'average_rating': avg_rating}), 200
     except Exception as e:
@@ -323,7 +266,10 @@ def rate_dataset(dataset_id):
 
 @dataset_bp.route('/datasets/<int:dataset_id>/average-rating', methods=['GET'])
 def get_average_rating(dataset_id):
-    average_rating = ds_rating_service.get_dataset_average_rating(dataset_id)
+    dataset = dataset_service.get_by_id(dataset_id)
+    if dataset is None:
+        return jsonify({'message': 'Dataset not found'}), 404
+    average_rating = ds_rating_service.get_dataset_average_rating(dataset.ds_meta_data_id)
     return jsonify({'average_rating': average_rating})
 
 
@@ -332,237 +278,34 @@ def view_dataset(dataset_id):
     # Obtener el dataset
     dataset = dataset_service.get_or_404(dataset_id)  # Ajusta según tu implementación
 
-    # Calcular el promedio de calificaciones
-    average_rating = ds_rating_service.get_dataset_average_rating(dataset_id) or 0.0
-
-    # Asignar el promedio al dataset
-    dataset.ds_meta_data.rating = average_rating
+    # El promedio de calificaciones ya está guardado en dataset.ds_meta_data.rating
 
     # Renderizar el template
     return render_template('dataset/view_dataset.html', dataset=dataset)
 
 
-# Descargar los datos en .json
-def convert_uvl_to_json(content):
-    lines = content.splitlines()
-    result = {}
-    current_feature = None
-    current_mandatory = None
-    current_optional = None
-    in_constraints = False
-
-    for line in lines:
-        stripped_line = line.strip()
-        if stripped_line.startswith("features"):
-            result["features"] = {}
-            current_feature = result["features"]
-        elif stripped_line.startswith("constraints"):
-            in_constraints = True
-            result["constraints"] = {}
-            current_constraint = result["constraints"]
-        elif stripped_line.startswith("Chat"):
-            current_feature["Chat"] = {"mandatory": {}, "optional": {}}
-            current_mandatory = current_feature["Chat"]["mandatory"]
-            current_optional = current_feature["Chat"]["optional"]
-        elif stripped_line.startswith("mandatory"):
-            pass
-        elif stripped_line.startswith("optional"):
-            pass
-        elif "=>" in stripped_line:
-            if in_constraints:
-                # Asumiendo que la restricción es en formato "A => B"
-                key, value = stripped_line.split("=>")
-                current_constraint[key.strip()] = value.strip().strip('"')
-        else:
-            if current_mandatory is not None:
-                current_mandatory[stripped_line] = stripped_line
-            elif current_optional is not None:
-                current_optional[stripped_line] = stripped_line
-
-    return result
-
-# Descargar los elementos en xml
-
-
-def convert_uvl_to_xml(content):
-    # Crear el elemento raíz
-    root = Element("UVLData")
-    current_parent = root  # Empezamos en el nodo raíz
-    parent_stack = []  # Pila para gestionar el nivel jerárquico
-    indentation_level = 0  # Seguimiento de los niveles de sangría
-
-    for line in content.splitlines():
-        stripped_line = line.strip()  # Elimina espacios al inicio y final
-        if not stripped_line:
-            continue  # Saltar líneas en blanco
-
-        # Calcular el nivel de indentación (2 espacios por nivel en este ejemplo)
-        new_level = (len(line) - len(stripped_line)) // 4
-
-        # Actualizar el nivel de nodo
-        if new_level > indentation_level:
-            parent_stack.append(current_parent)
-        elif new_level < indentation_level:
-            for _ in range(indentation_level - new_level):
-                current_parent = parent_stack.pop()
-
-        # Crear el nuevo nodo bajo el nodo actual
-        element = SubElement(current_parent, "item", name=stripped_line)
-        current_parent = element
-        indentation_level = new_level
-
-    # Generar una cadena XML bonita
-    xml_str = minidom.parseString(tostring(root)).toprettyxml(indent="  ")
-    return xml_str
-
-
-# Convierte el uvl en yaml
-def convert_uvl_to_yaml(content):
-    yaml_data = {
-        'features': {},
-        'constraints': {}
-    }
-
-    current_feature = None
-    current_mandatory = None
-    current_messages = None
-
-    for line in content.splitlines():
-        stripped_line = line.strip()
-
-        if not stripped_line:  # Ignora líneas vacías
-            continue
-
-        if stripped_line.startswith("features"):
-            current_feature = "features"
-        elif stripped_line.startswith("constraints"):
-            current_feature = "constraints"
-            continue  # No procesar más por el momento, solo ir a constraints
-        elif current_feature == "features":
-            # Manejar las secciones de features
-            if stripped_line == "Chat":
-                yaml_data[current_feature]["Chat"] = {
-                    "mandatory": {},
-                    "optional": []
-                }
-                current_mandatory = yaml_data[current_feature]["Chat"]["mandatory"]
-            elif stripped_line == "mandatory":
-                current_mandatory = {}
-                yaml_data[current_feature]["Chat"]["mandatory"] = current_mandatory
-            elif stripped_line == "optional":
-                # Cambiar a una lista para almacenar elementos directamente
-                yaml_data[current_feature]["Chat"]["optional"] = []
-                current_mandatory = None  # No se necesita más
-            elif stripped_line == "Connection":
-                current_mandatory["Connection"] = {}
-                current_mandatory["Connection"]["alternative"] = []
-            elif stripped_line == "alternative":
-                # La línea "alternative" se procesa aquí, pero no agrega nada aún
-                pass
-            elif stripped_line.startswith('"'):
-                # Maneja las alternativas
-                if current_mandatory and "Connection" in current_mandatory:
-                    current_mandatory["Connection"]["alternative"].append(stripped_line.strip('"'))
-                elif current_feature == "features" and "optional" in yaml_data[current_feature]["Chat"]:
-                    yaml_data[current_feature]["Chat"]["optional"].append(stripped_line.strip('"'))
-            elif stripped_line == "Messages":
-                current_messages = {}
-                current_mandatory["Messages"] = current_messages
-            elif stripped_line == "or":
-                current_messages["or"] = []
-            elif stripped_line in ["Text", "Video", "Audio"]:
-                if current_messages and "or" in current_messages:
-                    current_messages["or"].append(stripped_line)
-
-        elif current_feature == "constraints":
-            # Manejo de restricciones
-            if '=>' in stripped_line:
-                key, value = map(str.strip, stripped_line.split('=>'))
-                yaml_data['constraints'][key] = value.strip('"')
-            elif ':' in stripped_line:
-                key, value = map(str.strip, stripped_line.split(':'))
-                yaml_data['constraints'][key] = value.strip('"')
-
-    return yaml.dump(yaml_data, default_flow_style=False, sort_keys=False)
-
-
 @dataset_bp.route("/dataset/download_informat/<file_format>/<int:dataset_id>", methods=["GET"])
 def download_dataset_json(file_format, dataset_id):
     if file_format not in ["json", "xml", "yaml"]:
         abort(400, "Formato no soportado")  # Solo acepta json,xmly yaml
 
     dataset = dataset_service.get_or_404(dataset_id)
-    file_path = f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
-
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"dataset_{dataset_id}.zip")
-
-    with ZipFile(zip_path, "w") as zipf:
-        for subdir, dirs, files in os.walk(file_path):
-            for file in files:
-                full_path = os.path.join(subdir, file)
-
-                if file.endswith('.uvl'):
-                    # Leer el contenido del archivo .uvl
-                    with open(full_path, 'r') as uvl_file:
-                        content = uvl_file.read()
-                        try:
-                            # Convertir según el formato solicitado
-                            if file_format == "json":
-                                converted_content = json.dumps(convert_uvl_to_json(content))
-                                new_file_name = file[:-4] + '.json'
-                            elif file_format == "xml":
-                                converted_content = convert_uvl_to_xml(content)
-                                new_file_name = file[:-4] + '.xml'
-                            elif file_format == "yaml":
-                                converted_content = convert_uvl_to_yaml(content)
-                                new_file_name = file[:-4] + '.yaml'
-                            zipf.writestr(new_file_name, converted_content)
-                        except Exception as e:
-                            print(f"Error al convertir {file}: {e}")
-                else:
-                    zipf.write(
-                        full_path,
-                        arcname=os.path.join(
-                            os.path.basename(zip_path[:-4]), file
-                        ),
-                    )
+
+    resp = zip_response(
+        dataset,
+        f"dataset_{dataset_id}-{file_format}",
+        dataset_service.get_dataset_export_entries(dataset, file_format),
+        f"dataset_{dataset_id}.zip",
+        version=UVL_EXPORT_VERSION,
+    )
 
     user_cookie = request.cookies.get("download_cookie")
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
-        resp = make_response(
-            send_from_directory(
-                temp_dir,
-                f"dataset_{dataset_id}.zip",
-                as_attachment=True,
-                mimetype="application/zip",
-            )
-        )
         resp.set_cookie("download_cookie", user_cookie)
-    else:
-        resp = send_from_directory(
-            temp_dir,
-            f"dataset_{dataset_id}.zip",
-            as_attachment=True,
-            mimetype="application/zip",
-        )
-
-    # Check if the download record already exists for this cookie
-    existing_record = DSDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        dataset_id=dataset_id,
-        download_cookie=user_cookie
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        DSDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            dataset_id=dataset_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
-        )
+
+    # Record the download, written in the background and only once per user and cookie
+    DSDownloadRecordService().record_download(dataset_id, user_cookie)
 
     return resp
 
@@ -3,6 +3,7 @@ import shutil
 from app.modules.auth.models import User
 from app.modules.featuremodel.models import FMMetaData, FeatureModel
 from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.services import calculate_file_digests
 from core.seeders.BaseSeeder import BaseSeeder
 from app.modules.dataset.models import (
     DataSet,
@@ -120,10 +121,12 @@ class DataSetSeeder(BaseSeeder):
             else:
                 print(f"File was not created: {file_path}")
 
+            digests = calculate_file_digests(file_path)
             uvl_file = Hubfile(
                 name=file_name,
-                checksum=f'checksum{i + 1}',
-                size=os.path.getsize(file_path),
+                checksum=digests.md5,
+                sha256=digests.sha256,
+                size=digests.size,
                 feature_model_id=feature_model.id
             )
             self.seed([uvl_file])
@@ -1,16 +1,23 @@
+import fcntl
+import json
 import logging
 import os
 import hashlib
+import re
 import shutil
+import sys
 import tempfile
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
 import uuid
-from zipfile import ZipFile
-from flamapy.metamodels.fm_metamodel.transformations import UVLReader, GlencoeWriter, SPLOTWriter
-from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat, DimacsWriter
-from flask import abort, request
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+from flask import abort, current_app, request
 
 from app.modules.auth.services import AuthenticationService
+from app.modules.dataset.exporters import EXPORT_EXTENSIONS, UVLExportCache, export_uvl
 from app.modules.dataset.models import DSViewRecord, DataSet, DSMetaData, DSMetrics, DSRating
 from app.modules.dataset.repositories import (
     AuthorRepository,
@@ -21,12 +28,22 @@ from app.modules.dataset.repositories import (
     DataSetRepository,
     DSRatingRepository
 )
+from app.modules.explore.services import SearchIndexService
+from app.modules.fakenodo.services import FakenodoService
 from app.modules.featuremodel.repositories import FMMetaDataRepository, FeatureModelRepository
+from app.modules.flamapy.services import CONVERSION_EXTENSIONS, FlamapyService, get_flamapy_version
 from app.modules.hubfile.repositories import (
     HubfileDownloadRecordRepository,
     HubfileRepository,
     HubfileViewRecordRepository
 )
+from app.modules.hubfile.services import FileDigests, calculate_file_digests
+from app.modules.jobs.models import Job
+from app.modules.jobs.services import JobService, job_handler
+from app.modules.public.services import PublicService
+from app.modules.zenodo.services import ZenodoService
+from core.cache.file_cache import FileCache
+from core.configuration.configuration import USE_FAKENODO, cache_folder_name
 from core.services.BaseService import BaseService
 from datetime import datetime
 
@@ -34,12 +51,599 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 
-def calculate_checksum_and_size(file_path):
-    file_size = os.path.getsize(file_path)
-    with open(file_path, "rb") as file:
-        content = file.read()
-        hash_md5 = hashlib.md5(content).hexdigest()
-        return hash_md5, file_size
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+
+# DSMetrics.number_of_products es un BigInteger con signo
+MAX_NUMBER_OF_PRODUCTS = 2 ** 63 - 1
+
+# Campos de DSMetaData que forman parte del índice de búsqueda de explore
+SEARCHABLE_DSMETADATA_FIELDS = {"title", "description", "tags"}
+
+# Tamaño de los trozos que se sugiere a los clientes y del buffer con el que se copian al disco
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_BUFFER_SIZE = 64 * 1024
+UPLOAD_MAX_FILE_SIZE = int(os.getenv("UPLOAD_MAX_FILE_SIZE", 100 * 1024 ** 2))
+# Segundos tras los que se descarta una subida sin terminar
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))
+UPLOAD_ID = re.compile(r"^[0-9A-Za-z-]{1,64}$")
+
+# Tipo del trabajo en segundo plano que publica un dataset en Zenodo o Fakenodo
+PUBLISH_DATASET_JOB = "dataset.publish"
+
+# Hilos con los que se leen los UVL de un dataset antes de abrir la transacción que lo guarda
+INGEST_WORKERS = int(os.getenv("DATASET_INGEST_WORKERS", min(8, os.cpu_count() or 1)))
+
+
+class ZipStreamBuffer:
+    """
+    Write-only, non-seekable file object used as the target of a ZipFile.
+
+    ZipFile falls back to data descriptors when it cannot seek, so every byte it writes can be
+    handed to the client as soon as it is produced.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, Union[str, bytes]]],
+               chunk_size: int = ZIP_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Build a ZIP archive on the fly and yield it in chunks.
+
+    :param entries: Iterable of (arcname, source) pairs. A source is either the path of a file on disk,
+        which is copied in chunks, or the in-memory content of the entry as bytes.
+    :param chunk_size: Size of the blocks read from the files on disk.
+    :return: Iterator over the bytes of the archive.
+    """
+    buffer = ZipStreamBuffer()
+    with ZipFile(buffer, "w", compression=ZIP_DEFLATED) as zipf:
+        for arcname, source in entries:
+            if isinstance(source, bytes):
+                zipf.writestr(arcname, source)
+            else:
+                zinfo = ZipInfo.from_file(source, arcname)
+                zinfo.compress_type = ZIP_DEFLATED
+                with open(source, "rb") as src, zipf.open(zinfo, "w") as dest:
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        dest.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+def get_archive_checksums(dataset: DataSet) -> list:
+    """
+    Nombre y checksum de cada fichero del dataset en orden, de los que depende cualquier ZIP generado a partir de él.
+    """
+    return [f"{file.name}:{file.checksum}" for file in sorted(dataset.files(), key=lambda file: file.id)]
+
+
+class ArchiveCache(FileCache):
+    """
+    Persistent, content-addressed store of generated ZIP archives.
+
+    Each archive is stored under a name (e.g. ``dataset_3-uvl``) and a key derived from the ordered checksums of
+    the files it contains and the version of the converter that produced them, so changing any file or converter
+    produces a new key and the previous archive for that name is discarded. The least recently used archives are
+    evicted once the cache grows beyond ``max_size`` bytes.
+    """
+
+    def __init__(self, folder: Optional[str] = None, max_size: Optional[int] = None):
+        super().__init__(
+            folder or os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "archives"),
+            max_size if max_size is not None else int(os.getenv("ARCHIVE_CACHE_MAX_SIZE", 1024 ** 3)),
+        )
+
+    def key(self, checksums: Iterable[str], version: str = "") -> str:
+        return hashlib.sha256(",".join([version, *checksums]).encode("utf-8")).hexdigest()
+
+    def filename(self, name: str, checksums: Iterable[str], version: str = "") -> str:
+        return f"{name}-{self.key(checksums, version)}.zip"
+
+    def get(self, name: str, checksums: Iterable[str], version: str = "") -> Optional[str]:
+        return super().get(self.filename(name, checksums, version))
+
+    def store(self, name: str, checksums: Iterable[str], chunks: Iterable[bytes],
+              version: str = "") -> Iterator[bytes]:
+        """
+        Pass the chunks of an archive through while writing them to the cache.
+
+        The archive is only published once every chunk has been consumed, so an interrupted download never
+        leaves a truncated entry behind.
+        """
+        filename = self.filename(name, checksums, version)
+        fd, temp_path = self.create_temp()
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+                    yield chunk
+            self.invalidate(name, keep=filename)
+            self.publish(temp_path, filename)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def build(self, name: str, checksums: Iterable[str], chunks: Iterable[bytes], version: str = "") -> str:
+        checksums = list(checksums)
+        for _ in self.store(name, checksums, chunks, version):
+            pass
+        return self.path(self.filename(name, checksums, version))
+
+    def invalidate(self, name: str, keep: Optional[str] = None):
+        for filename in self.filenames():
+            if filename.startswith(f"{name}-") and filename != keep:
+                self.remove(filename)
+
+
+class AllDatasetsBundle:
+    """
+    Hub-wide ZIP with every synchronized dataset and its Glencoe, SPLOT and DIMACS conversions.
+
+    Each dataset is converted once into a fragment archive keyed by the checksums of its files. A small state
+    file records which fragments the current bundle holds, so publishing a dataset only appends its fragment to
+    a copy of the bundle, and removed or modified datasets trigger a rebuild from the stored fragments. All of
+    this runs in a background thread; requests only ever read the last complete bundle.
+    """
+
+    supported_formats = ["Glencoe", "Dinamacs", "SPLOT"]
+
+    _refresh_lock = threading.Lock()
+    _refresh_running = False
+    _refresh_pending = False
+
+    def __init__(self, folder: Optional[str] = None):
+        self.folder = folder or os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "bundle")
+        self.state_path = os.path.join(self.folder, "all_datasets.json")
+        self.fragments = ArchiveCache(folder=os.path.join(self.folder, "fragments"), max_size=sys.maxsize)
+        # The fragments hold flamapy conversions, so they are rebuilt when flamapy changes
+        self.version = get_flamapy_version()
+
+    def read_state(self) -> dict:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"bundle": None, "datasets": {}}
+
+    def write_state(self, state: dict):
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def get(self) -> Optional[str]:
+        bundle = self.read_state()["bundle"]
+        if bundle and os.path.exists(os.path.join(self.folder, bundle)):
+            return os.path.join(self.folder, bundle)
+        return None
+
+    def get_fragment_entries(self, dataset: DataSet, conversions: dict) -> Iterator[Tuple[str, Union[str, bytes]]]:
+        dataset_dir = f"dataset_{dataset.id}"
+        dataset_path = DataSetService().get_dataset_folder(dataset)
+
+        for file in sorted(dataset.files(), key=lambda file: file.id):
+            uvl_file_path = os.path.join(dataset_path, file.name)
+            base_name = os.path.splitext(file.name)[0]
+
+            # Añadir el archivo UVL original al ZIP
+            yield os.path.join(dataset_dir, "UVL", file.name), uvl_file_path
+
+            # Añadir los formatos convertidos al ZIP
+            for fmt, converted_file in conversions.get(uvl_file_path, {}).get("files", {}).items():
+                yield os.path.join(dataset_dir, fmt, base_name + CONVERSION_EXTENSIONS[fmt]), converted_file
+
+    def build_fragments(self, datasets: list):
+        """
+        Build the fragments of the given datasets.
+
+        Conversions come from the artifact store; the missing ones are converted in a single parallel batch and
+        stored, so publishing a dataset also warms the per-file conversion downloads.
+        """
+        dataset_service = DataSetService()
+        uvl_files = [
+            (os.path.join(dataset_service.get_dataset_folder(dataset), file.name), file.checksum)
+            for dataset in datasets
+            for file in dataset.files()
+        ]
+
+        conversions = FlamapyService().get_conversions(uvl_files, self.supported_formats)
+        for dataset in datasets:
+            self.fragments.build(
+                f"dataset_{dataset.id}",
+                get_archive_checksums(dataset),
+                stream_zip(self.get_fragment_entries(dataset, conversions)),
+                self.version,
+            )
+
+    def get_fragment(self, dataset: DataSet) -> str:
+        name = f"dataset_{dataset.id}"
+        checksums = get_archive_checksums(dataset)
+        fragment = self.fragments.get(name, checksums, self.version)
+        if not fragment:
+            self.build_fragments([dataset])
+            fragment = self.fragments.get(name, checksums, self.version)
+        return fragment
+
+    def refresh(self, datasets: list):
+        """
+        Bring the bundle in line with the given synchronized datasets.
+
+        Fragments are built for datasets that do not have one yet. When the bundle only lacks some datasets, their
+        fragments are appended to a copy of it; otherwise the bundle is rebuilt from the fragments.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        state = self.read_state()
+        current_bundle = self.get()
+
+        if not datasets:
+            self.write_state({"bundle": None, "datasets": {}})
+            if current_bundle:
+                os.remove(current_bundle)
+            return
+
+        included = state["datasets"] if current_bundle else {}
+        wanted = {
+            str(dataset.id): self.fragments.key(get_archive_checksums(dataset), self.version) for dataset in datasets
+        }
+
+        if current_bundle and included == wanted:
+            return
+
+        appending = all(wanted.get(dataset_id) == key for dataset_id, key in included.items())
+        if not appending:
+            included = {}
+
+        self.build_fragments([
+            dataset for dataset in datasets
+            if str(dataset.id) not in included
+            and not self.fragments.get(f"dataset_{dataset.id}", get_archive_checksums(dataset), self.version)
+        ])
+
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix=".part")
+        os.close(fd)
+        try:
+            if included:
+                shutil.copyfile(current_bundle, temp_path)
+                mode = "a"
+            else:
+                mode = "w"
+
+            with ZipFile(temp_path, mode, compression=ZIP_DEFLATED) as bundle:
+                for dataset in datasets:
+                    if str(dataset.id) in included:
+                        continue
+                    with ZipFile(self.get_fragment(dataset)) as fragment:
+                        for info in fragment.infolist():
+                            with fragment.open(info) as src, bundle.open(info, "w") as dest:
+                                shutil.copyfileobj(src, dest, ZIP_STREAM_CHUNK_SIZE)
+
+            bundle_name = f"all_datasets-{self.fragments.key(sorted(wanted.values()))}.zip"
+            os.replace(temp_path, os.path.join(self.folder, bundle_name))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self.write_state({"bundle": bundle_name, "datasets": wanted})
+
+        if current_bundle and current_bundle != os.path.join(self.folder, bundle_name):
+            os.remove(current_bundle)
+        for dataset_id in set(state["datasets"]) - set(wanted):
+            self.fragments.invalidate(f"dataset_{dataset_id}")
+
+    def refresh_in_background(self):
+        """
+        Refresh the bundle in a daemon thread.
+
+        Calls made while a refresh is running are coalesced into a single follow-up refresh, and a file lock keeps
+        several worker processes from rebuilding the bundle at the same time.
+        """
+        cls = type(self)
+        with cls._refresh_lock:
+            if cls._refresh_running:
+                cls._refresh_pending = True
+                return
+            cls._refresh_running = True
+
+        app = current_app._get_current_object()
+        threading.Thread(target=self._refresh_worker, args=(app,), daemon=True).start()
+
+    def _refresh_worker(self, app):
+        cls = type(self)
+        while True:
+            with cls._refresh_lock:
+                cls._refresh_pending = False
+            try:
+                with app.app_context():
+                    os.makedirs(self.folder, exist_ok=True)
+                    with open(os.path.join(self.folder, "all_datasets.lock"), "w") as lock_file:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                        self.refresh(DataSetRepository().get_all_synchronized())
+            except Exception as exc:
+                logger.exception(f"Exception while refreshing the all datasets bundle: {exc}")
+            with cls._refresh_lock:
+                if not cls._refresh_pending:
+                    cls._refresh_running = False
+                    return
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400, offset: Optional[int] = None,
+                 errors: Optional[list] = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.offset = offset
+        self.errors = errors
+
+    def to_dict(self) -> dict:
+        data = {"message": self.message}
+        if self.offset is not None:
+            data["offset"] = self.offset
+        if self.errors is not None:
+            data["errors"] = self.errors
+        return data
+
+
+class InvalidUVLError(ValueError):
+    """
+    Raised when some UVL files of a dataset cannot be read, with the errors of each file by name.
+    """
+
+    def __init__(self, errors: dict):
+        super().__init__("; ".join(f"{name}: {' '.join(messages)}" for name, messages in errors.items()))
+        self.errors = errors
+
+
+class ChunkedUploadService:
+    """
+    Resumable uploads of UVL files to the temp folder of a user, sent as a sequence of chunks.
+
+    Every upload is a ``.part`` file and a JSON state with its name, size and the offset received so far, both
+    under ``<temp folder>/.uploads``. Chunks are copied straight from the request to the part file while an MD5
+    of the file is updated, so finishing an upload never reads it again. A chunk starting before the offset
+    replaces what was received from there on, which is how a client retries a chunk whose response it lost, and
+    a client that was cut off asks for the offset and carries on from it.
+    """
+
+    _hashers = {}
+    _hashers_lock = threading.Lock()
+
+    def __init__(self, temp_folder: str):
+        self.temp_folder = temp_folder
+        self.folder = os.path.join(temp_folder, ".uploads")
+
+    def state_path(self, upload_id: str) -> str:
+        return os.path.join(self.folder, f"{upload_id}.json")
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.folder, f"{upload_id}.part")
+
+    @staticmethod
+    def clean_filename(filename: str) -> str:
+        filename = os.path.basename((filename or "").replace("\\", "/")).strip()
+        if not filename.endswith(".uvl") or filename.startswith("."):
+            raise UploadError("No valid file")
+        return filename
+
+    def init(self, filename: str, size: int, upload_id: Optional[str] = None) -> dict:
+        filename = self.clean_filename(filename)
+        if size is None or size < 0:
+            raise UploadError("The size of the file is required")
+        if size > UPLOAD_MAX_FILE_SIZE:
+            raise UploadError(f"The file is larger than {UPLOAD_MAX_FILE_SIZE} bytes", 413)
+        if upload_id is None:
+            upload_id = uuid.uuid4().hex
+        elif not UPLOAD_ID.match(upload_id):
+            raise UploadError("Invalid upload id")
+
+        os.makedirs(self.folder, exist_ok=True)
+        self.remove_expired()
+        open(self.part_path(upload_id), "wb").close()
+        state = {"upload_id": upload_id, "filename": filename, "size": size, "offset": 0}
+        with open(self.state_path(upload_id), "w") as state_file:
+            json.dump(state, state_file)
+        return self.describe(state)
+
+    def status(self, upload_id: str) -> dict:
+        with self.session(upload_id) as state:
+            return self.describe(state)
+
+    def exists(self, upload_id: str) -> bool:
+        return bool(UPLOAD_ID.match(upload_id or "")) and os.path.exists(self.state_path(upload_id))
+
+    def write_chunk(self, upload_id: str, offset: int, stream) -> dict:
+        """
+        Write the chunk read from ``stream`` at ``offset`` and return the new state of the upload.
+        """
+        with self.session(upload_id) as state:
+            if offset is None or offset < 0 or offset > state["offset"]:
+                raise UploadError("The chunk does not continue the upload", 409, state["offset"])
+
+            part_path = self.part_path(upload_id)
+            md5 = self.hasher(part_path, offset)
+            written = offset
+            try:
+                with open(part_path, "r+b") as part_file:
+                    part_file.seek(offset)
+                    part_file.truncate()
+                    for chunk in iter(lambda: stream.read(UPLOAD_BUFFER_SIZE), b""):
+                        written += len(chunk)
+                        if written > state["size"]:
+                            raise UploadError("The chunk goes past the end of the file", 413, state["offset"])
+                        part_file.write(chunk)
+                        md5.update(chunk)
+            except BaseException:
+                # The running checksum already has part of the failed chunk
+                self.forget_hasher(part_path)
+                raise
+
+            state["offset"] = written
+            with ChunkedUploadService._hashers_lock:
+                ChunkedUploadService._hashers[part_path] = (written, md5)
+            return self.describe(state)
+
+    def finalize(self, upload_id: str, checksum: Optional[str] = None) -> dict:
+        """
+        Move a complete upload into the temp folder under a free name, once flamapy can read it.
+
+        Returns:
+            dict: The name given to the file, its size and its MD5.
+        """
+        with self.session(upload_id) as state:
+            if state["offset"] != state["size"]:
+                raise UploadError("The upload is not complete", 409, state["offset"])
+
+            part_path = self.part_path(upload_id)
+            md5 = self.hasher(part_path, state["size"]).hexdigest()
+            if checksum and checksum.lower() != md5:
+                self.discard(upload_id)
+                raise UploadError("The checksum of the uploaded file does not match", 422)
+
+            filename = self.claim_filename(state["filename"])
+            file_path = os.path.join(self.temp_folder, filename)
+            os.replace(part_path, file_path)
+            self.discard(upload_id)
+
+            validation = FlamapyService().validate_uvl_files([(file_path, md5)])[file_path]
+            if not validation["valid"]:
+                os.remove(file_path)
+                raise UploadError("UVL not valid", errors=validation["errors"])
+            return {"filename": filename, "size": state["size"], "checksum": md5}
+
+    def upload(self, filename: str, stream, size: Optional[int] = None) -> dict:
+        """
+        Receive a whole file in one request, through the same chunked path.
+        """
+        upload_id = self.init(filename, UPLOAD_MAX_FILE_SIZE if size is None else size)["upload_id"]
+        try:
+            received = self.write_chunk(upload_id, 0, stream)
+            if size is None:
+                with self.session(upload_id) as state:
+                    state["size"] = received["offset"]
+            return self.finalize(upload_id)
+        except UploadError:
+            self.discard(upload_id)
+            raise
+
+    @contextmanager
+    def session(self, upload_id: str):
+        """
+        Lock the state of an upload and write it back when the block ends.
+        """
+        if not UPLOAD_ID.match(upload_id or ""):
+            raise UploadError("Upload not found", 404)
+        state_path = self.state_path(upload_id)
+        try:
+            state_file = open(state_path, "r+")
+        except (FileNotFoundError, NotADirectoryError):
+            raise UploadError("Upload not found", 404)
+
+        with state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            if not os.path.exists(state_path):
+                raise UploadError("Upload not found", 404)
+            state = json.load(state_file)
+            yield state
+            if os.path.exists(state_path):
+                state_file.seek(0)
+                state_file.truncate()
+                json.dump(state, state_file)
+
+    def hasher(self, part_path: str, offset: int):
+        """
+        Running MD5 of the first ``offset`` bytes of a part file.
+
+        The checksum kept by this process is reused when it is at that offset, otherwise (the previous chunks went
+        to another worker, or a chunk is sent again) it is rebuilt from the part file.
+        """
+        with ChunkedUploadService._hashers_lock:
+            cached = ChunkedUploadService._hashers.pop(part_path, None)
+        if cached and cached[0] == offset:
+            return cached[1]
+
+        md5 = hashlib.md5()
+        remaining = offset
+        with open(part_path, "rb") as part_file:
+            while remaining:
+                chunk = part_file.read(min(UPLOAD_BUFFER_SIZE, remaining))
+                if not chunk:
+                    break
+                md5.update(chunk)
+                remaining -= len(chunk)
+        return md5
+
+    def forget_hasher(self, part_path: str):
+        with ChunkedUploadService._hashers_lock:
+            ChunkedUploadService._hashers.pop(part_path, None)
+
+    def claim_filename(self, filename: str) -> str:
+        """
+        Reserve a free name for a file in the temp folder, adding " (i)" to the name when it is taken.
+
+        The name is created exclusively, so two uploads of the same file never get the same name.
+        """
+        base_name, extension = os.path.splitext(filename)
+        candidate = filename
+        i = 0
+        while True:
+            try:
+                os.close(os.open(os.path.join(self.temp_folder, candidate), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return candidate
+            except FileExistsError:
+                i += 1
+                candidate = f"{base_name} ({i}){extension}"
+
+    def discard(self, upload_id: str):
+        self.forget_hasher(self.part_path(upload_id))
+        for path in (self.part_path(upload_id), self.state_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def remove_expired(self):
+        expiration = time.time() - UPLOAD_SESSION_TTL
+        for filename in os.listdir(self.folder):
+            path = os.path.join(self.folder, filename)
+            try:
+                if os.path.getmtime(path) < expiration:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    @staticmethod
+    def describe(state: dict) -> dict:
+        return {
+            "upload_id": state["upload_id"],
+            "filename": state["filename"],
+            "size": state["size"],
+            "offset": state["offset"],
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+        }
 
 
 def parse_uvl(file_path):
@@ -89,20 +693,28 @@ def parse_uvl(file_path):
     }
 
 
-def calculate_number_of_products(feature_hierarchy, constraints):
-    # Start with mandatory features (1 configuration)
-    product_count = 1
+class UVLFileSummary(NamedTuple):
+    digests: FileDigests
+    number_of_features: int
+
+
+def summarize_uvl_file(file_path: str) -> UVLFileSummary:
+    return UVLFileSummary(calculate_file_digests(file_path), len(parse_uvl(file_path)["features"]))
 
-    # Add optional features (each has 2 states: included or excluded)
-    product_count *= 2 ** len(feature_hierarchy["optional"])
 
-    # Handle "alternative" groups (1 choice per group)
-    product_count *= len(feature_hierarchy["alternative"])
+def summarize_uvl_files(uvl_paths: Dict[str, str]) -> Dict[str, UVLFileSummary]:
+    """
+    Hash and count the features of several UVL files in a thread pool.
 
-    # Handle "or" groups (any combination except empty set)
-    product_count *= (2 ** len(feature_hierarchy["or"])) - 1
+    hashlib releases the GIL on large buffers, so reading and hashing the files overlap.
 
-    return product_count
+    :param uvl_paths: Path of each file, keyed by its name.
+    :return: Summary of each file, keyed by its name.
+    """
+    if len(uvl_paths) <= 1:
+        return {name: summarize_uvl_file(path) for name, path in uvl_paths.items()}
+    with ThreadPoolExecutor(max_workers=min(INGEST_WORKERS, len(uvl_paths))) as executor:
+        return dict(zip(uvl_paths, executor.map(summarize_uvl_file, uvl_paths.values())))
 
 
 class DataSetService(BaseService):
@@ -118,6 +730,10 @@ class DataSetService(BaseService):
         self.dsviewrecord_repostory = DSViewRecordRepository()
         self.hubfileviewrecord_repository = HubfileViewRecordRepository()
         self.dsrating_repository = DSRatingRepository()
+        self.archive_cache = ArchiveCache()
+        self.export_cache = UVLExportCache()
+        self.all_datasets_bundle = AllDatasetsBundle()
+        self.search_index_service = SearchIndexService()
 
     def move_feature_models(self, dataset: DataSet):
         current_user = AuthenticationService().get_authenticated_user()
@@ -132,6 +748,88 @@ class DataSetService(BaseService):
             uvl_filename = feature_model.fm_meta_data.uvl_filename
             shutil.move(os.path.join(source_dir, uvl_filename), dest_dir)
 
+    def update_number_of_products(self, dataset: DataSet, compute_missing: bool = True):
+        """
+        Calcula el número exacto de productos del dataset sumando los de cada uno de sus modelos.
+
+        Si algún modelo no se puede contar dentro del presupuesto el número de productos queda sin definir.
+        Con compute_missing=False solo se usan los recuentos ya guardados, y si falta alguno no se modifica nada.
+        """
+        dataset_path = self.get_dataset_folder(dataset)
+        uvl_files = [(os.path.join(dataset_path, file.name), file.checksum) for file in dataset.files()]
+        counts = FlamapyService().count_products(uvl_files, compute_missing=compute_missing)
+        if not compute_missing and any(count is None for count in counts.values()):
+            return
+
+        number_of_products = None
+        if all(count is not None for count in counts.values()):
+            number_of_products = sum(counts.values())
+            if number_of_products > MAX_NUMBER_OF_PRODUCTS:
+                logger.warning(f"Dataset {dataset.id} has {number_of_products} products, too many to be stored")
+                number_of_products = None
+
+        dataset.ds_meta_data.ds_metrics.number_of_products = number_of_products
+        self.repository.session.commit()
+
+    def get_dataset_folder(self, dataset: DataSet) -> str:
+        return f"uploads/user_{dataset.user_id}/dataset_{dataset.id}/"
+
+    def get_dataset_zip_entries(self, dataset: DataSet) -> Iterator[Tuple[str, str]]:
+        file_path = self.get_dataset_folder(dataset)
+        for subdir, dirs, files in os.walk(file_path):
+            for file in files:
+                full_path = os.path.join(subdir, file)
+                relative_path = os.path.relpath(full_path, file_path)
+                yield os.path.join(f"dataset_{dataset.id}", relative_path), full_path
+
+    def get_dataset_export_entries(self, dataset: DataSet, file_format: str) -> Iterator[Tuple[str, str]]:
+        """
+        Entradas del ZIP de un dataset con sus modelos UVL exportados a ``file_format`` (json, xml o yaml).
+
+        Los modelos que no se pueden exportar se omiten del ZIP y el resto de ficheros se incluyen tal cual.
+        """
+        file_path = self.get_dataset_folder(dataset)
+        checksums = {file.name: file.checksum for file in dataset.files()}
+        for subdir, dirs, files in os.walk(file_path):
+            for file in files:
+                full_path = os.path.join(subdir, file)
+                if not file.endswith(".uvl"):
+                    yield os.path.join(f"dataset_{dataset.id}", file), full_path
+                    continue
+                try:
+                    export_path = self.export_uvl_file(full_path, file_format, checksums.get(file))
+                except (OSError, ValueError) as exc:
+                    logger.error(f"Error al convertir {file}: {exc}")
+                    continue
+                yield file[:-4] + EXPORT_EXTENSIONS[file_format], export_path
+
+    def export_uvl_file(self, uvl_file_path: str, file_format: str, checksum: Optional[str] = None) -> str:
+        """
+        Devuelve la ruta de la exportación de un modelo UVL, guardada por checksum.
+
+        Si falta, el modelo se analiza una sola vez y se guardan todos los formatos a la vez, de modo que las
+        descargas en otro formato ya la encuentran hecha.
+        """
+        checksum = checksum or calculate_file_digests(uvl_file_path).md5
+        cached = self.export_cache.get_export(checksum, file_format)
+        if cached:
+            return cached
+
+        with open(uvl_file_path, "r", encoding="utf-8") as uvl_file:
+            exports = export_uvl(uvl_file.read())
+        paths = {
+            format_name: self.export_cache.put_export(checksum, format_name, data)
+            for format_name, data in exports.items()
+        }
+        return paths[file_format]
+
+    def get_cached_archive(self, name: str, dataset: DataSet, version: str = "") -> Optional[str]:
+        return self.archive_cache.get(name, get_archive_checksums(dataset), version)
+
+    def cache_archive(self, name: str, dataset: DataSet, entries: Iterable[Tuple[str, Union[str, bytes]]],
+                      version: str = ""):
+        return self.archive_cache.store(name, get_archive_checksums(dataset), stream_zip(entries), version)
+
     def is_synchronized(self, dataset_id: int) -> bool:
         return self.repository.is_synchronized(dataset_id)
 
@@ -171,76 +869,70 @@ class DataSetService(BaseService):
             "affiliation": current_user.profile.affiliation,
             "orcid": current_user.profile.orcid,
         }
+        # Los UVL se leen, resumen y validan antes de abrir la transacción, que solo inserta las filas
+        uvl_paths = {
+            feature_model.uvl_filename.data: os.path.join(current_user.temp_folder(), feature_model.uvl_filename.data)
+            for feature_model in form.feature_models
+        }
+        summaries = summarize_uvl_files(uvl_paths)
+        # Todos los modelos se validan a la vez antes de guardar nada, un dataset no puede tener UVL ilegibles
+        validations = FlamapyService().validate_uvl_files(
+            [(path, summaries[uvl_filename].digests.md5) for uvl_filename, path in uvl_paths.items()]
+        )
+        invalid = {
+            uvl_filename: validations[path]["errors"]
+            for uvl_filename, path in uvl_paths.items() if not validations[path]["valid"]
+        }
+        if invalid:
+            raise InvalidUVLError(invalid)
+
         try:
             logger.info(f"Creating dsmetadata...: {form.get_dsmetadata()}")
-            dsmetadata = self.dsmetadata_repository.create(**form.get_dsmetadata())
-            for author_data in [main_author] + form.get_authors():
-                author = self.author_repository.create(
-                    commit=False,
-                    ds_meta_data_id=dsmetadata.id,
-                    **author_data
-                )
-                dsmetadata.authors.append(author)
-
-            dataset = self.create(
+            # Cada tabla se inserta con un único flush, de modo que sus filas van en un mismo INSERT por lotes
+            dsmetadata = self.dsmetadata_repository.create(
                 commit=False,
-                user_id=current_user.id,
-                ds_meta_data_id=dsmetadata.id
+                ds_metrics=DSMetrics(
+                    number_of_models=str(len(form.feature_models)),
+                    number_of_features=sum(summary.number_of_features for summary in summaries.values()),
+                    # El número de productos lo rellena el análisis de los modelos (FeatureModelService.analyze)
+                    number_of_products=None
+                ),
+                **form.get_dsmetadata()
             )
+            dataset = self.create(commit=False, user_id=current_user.id, ds_meta_data=dsmetadata)
 
-            total_features = 0
-            total_models = len(form.feature_models)
-            total_products = 0
-
-            for feature_model in form.feature_models:
-                uvl_filename = feature_model.uvl_filename.data
-                fmmetadata = self.fmmetadata_repository.create(
-                    commit=False,
-                    **feature_model.get_fmmetadata()
-                )
-                for author_data in feature_model.get_authors():
-                    author = self.author_repository.create(
-                        commit=False,
-                        fm_meta_data_id=fmmetadata.id,
-                        **author_data
-                    )
-                    fmmetadata.authors.append(author)
-
-                fm = self.feature_model_repository.create(
-                    commit=False,
-                    data_set_id=dataset.id,
-                    fm_meta_data_id=fmmetadata.id
-                )
-
-                file_path = os.path.join(current_user.temp_folder(), uvl_filename)
-                checksum, size = calculate_checksum_and_size(file_path)
-                parse_result = parse_uvl(file_path)
-                feature_count = len(parse_result["features"])
-                total_features += feature_count
-
-                product_count = calculate_number_of_products(
-                    parse_result["feature_hierarchy"],
-                    parse_result["constraints"]
-                )
-                total_products += product_count
-
-                file = self.hubfilerepository.create(
-                    commit=False,
-                    name=uvl_filename,
-                    checksum=checksum,
-                    size=size,
-                    feature_model_id=fm.id
-                )
-                fm.files.append(file)
-
-            dsmetrics = DSMetrics(
-                number_of_models=str(total_models),
-                number_of_features=total_features,
-                number_of_products=total_products
+            fmmetadatas = self.fmmetadata_repository.create_many(
+                [feature_model.get_fmmetadata() for feature_model in form.feature_models], commit=False
             )
-            dsmetadata.ds_metrics = dsmetrics
-
-            dataset.ds_meta_data = dsmetadata
+            self.author_repository.create_many(
+                [dict(author_data, ds_meta_data=dsmetadata) for author_data in [main_author] + form.get_authors()]
+                + [
+                    dict(author_data, fm_metadata=fmmetadata)
+                    for feature_model, fmmetadata in zip(form.feature_models, fmmetadatas)
+                    for author_data in feature_model.get_authors()
+                ],
+                commit=False
+            )
+            fms = self.feature_model_repository.create_many(
+                [{"data_set": dataset, "fm_meta_data": fmmetadata} for fmmetadata in fmmetadatas], commit=False
+            )
+            hubfile_rows = []
+            for feature_model, fm in zip(form.feature_models, fms):
+                uvl_filename = feature_model.uvl_filename.data
+                file_digests = summaries[uvl_filename].digests
+                hubfile_rows.append({
+                    "name": uvl_filename,
+                    "checksum": file_digests.md5,
+                    "sha256": file_digests.sha256,
+                    "size": file_digests.size,
+                    "valid": True,
+                    "errors": validations[uvl_paths[uvl_filename]]["errors"],
+                    "feature_model": fm,
+                })
+            self.hubfilerepository.create_many(hubfile_rows, commit=False)
+
+            # El índice de búsqueda se guarda en la misma transacción que el dataset
+            self.search_index_service.index_dataset(dataset, commit=False)
 
             self.repository.session.commit()
         except Exception as exc:
@@ -255,92 +947,132 @@ class DataSetService(BaseService):
         """
         Convierte un archivo UVL a múltiples formatos (Glencoe, Dinamacs, SPLOT).
 
+        Las conversiones se guardan en el almacén de conversiones de FlamapyService, que es quien las borra, por lo
+        que el llamante no debe borrar ni modificar los archivos devueltos. Para convertir muchos archivos a la vez
+        se debe usar FlamapyService.get_conversions, que reparte las que faltan entre varios procesos.
+
         :param uvl_file_path: Ruta del archivo UVL de entrada.
         :param output_formats: Lista de formatos a los que convertir (Glencoe, Dinamacs, SPLOT).
         :return: Diccionario con las rutas de los archivos convertidos.
         """
-        fm = UVLReader(uvl_file_path).transform()
-        converted_files = {}
+        checksum = calculate_file_digests(uvl_file_path).md5
+        result = FlamapyService().get_conversions([(uvl_file_path, checksum)], output_formats, parallel=False)
+        result = result[uvl_file_path]
 
-        for format_name in output_formats:
-            temp_file = tempfile.NamedTemporaryFile(suffix=f'.{format_name.lower()}', delete=False)
-            output_file_path = temp_file.name
+        if result["errors"]:
+            format_name, error = next(iter(result["errors"].items()))
+            raise ValueError(f"Error al convertir {uvl_file_path} a {format_name}: {error}")
 
-            try:
-                if format_name == "Glencoe":
-                    GlencoeWriter(output_file_path, fm).transform()
-                elif format_name == "SPLOT":
-                    SPLOTWriter(output_file_path, fm).transform()
-                elif format_name == "Dinamacs":
-                    sat = FmToPysat(fm).transform()
-                    DimacsWriter(output_file_path, sat).transform()
-                else:
-                    raise ValueError(f"Formato no soportado: {format_name}")
-
-                converted_files[format_name] = output_file_path
-            except Exception as exc:
-                logger.error(f"Error al convertir {uvl_file_path} a {format_name}: {exc}")
-                temp_file.close()
-                os.remove(output_file_path)
-                raise exc
-
-        return converted_files
+        return result["files"]
 
     def zip_all_datasets(self) -> str:
-        temp_dir = tempfile.mkdtemp()
-        zip_path = os.path.join(temp_dir, "all_datasets.zip")
-        supported_formats = ["Glencoe", "Dinamacs", "SPLOT"]
-
-        datasets_found = False
-
-        with ZipFile(zip_path, "w") as zipf:
-            for user_dir in os.listdir("uploads"):
-                user_path = os.path.join("uploads", user_dir)
-
-                if os.path.isdir(user_path) and user_dir.startswith("user_"):
-                    for dataset_dir in os.listdir(user_path):
-                        dataset_path = os.path.join(user_path, dataset_dir)
-
-                        if os.path.isdir(dataset_path) and dataset_dir.startswith("dataset_"):
-                            dataset_id = int(dataset_dir.split("_")[1])
-
-                            if self.is_synchronized(dataset_id):
-                                datasets_found = True  # Se encontró al menos un dataset sincronizado
-                                for subdir, _, files in os.walk(dataset_path):
-                                    for file in files:
-                                        if file.endswith(".uvl"):
-                                            uvl_file_path = os.path.join(subdir, file)
-
-                                            # Añadir el archivo UVL original al ZIP
-                                            uvl_relative_path = os.path.join(
-                                                dataset_dir, "UVL", file
-                                            )
-                                            zipf.write(uvl_file_path, arcname=uvl_relative_path)
-
-                                            # Convertir a otros formatos y añadirlos al ZIP
-                                            converted_files = self.convert_uvl_to_formats(
-                                                uvl_file_path, supported_formats
-                                            )
-                                            for fmt, converted_file in converted_files.items():
-                                                fmt_relative_path = os.path.join(
-                                                    dataset_dir, fmt, os.path.basename(converted_file)
-                                                )
-                                                zipf.write(converted_file, arcname=fmt_relative_path)
+        bundle_path = self.all_datasets_bundle.get()
+        if bundle_path:
+            return bundle_path
 
         # Si no se encontraron datasets, devolver un error 404
-        if not datasets_found:
+        if not self.count_synchronized_datasets():
             abort(404, description="No synchronized datasets found.")
 
-        return zip_path
+        # El ZIP se genera en segundo plano, nunca durante la petición
+        self.all_datasets_bundle.refresh_in_background()
+        abort(503, description="The datasets bundle is being prepared, please try again in a few minutes.")
 
     def update_dsmetadata(self, id, **kwargs):
-        return self.dsmetadata_repository.update(id, **kwargs)
+        dsmetadata = self.dsmetadata_repository.update(id, **kwargs)
+        if dsmetadata and SEARCHABLE_DSMETADATA_FIELDS.intersection(kwargs):
+            for dataset in self.repository.model.query.filter_by(ds_meta_data_id=id):
+                self.search_index_service.index_dataset(dataset)
+        if dsmetadata and "dataset_doi" in kwargs:
+            # El dataset entra o sale de los publicados, la página principal debe mostrarlo sin esperar a que caduque
+            # y el paquete de "descargar todo" debe incluirlo o quitarlo
+            PublicService().invalidate_index_data()
+            self.all_datasets_bundle.refresh_in_background()
+        return dsmetadata
+
+    def update(self, id, **kwargs):
+        dataset = self.repository.update(id, **kwargs)
+        if dataset:
+            self.all_datasets_bundle.refresh_in_background()
+        return dataset
 
-    def get_uvlhub_doi(self, dataset: DataSet) -> str:
+    def delete(self, id) -> bool:
+        deleted = self.repository.delete(id)
+        if deleted:
+            # El paquete de "descargar todo" se reconstruye sin el dataset eliminado
+            self.all_datasets_bundle.refresh_in_background()
+        return deleted
+
+    @staticmethod
+    def get_uvlhub_doi(dataset: DataSet) -> str:
         domain = os.getenv('DOMAIN', 'localhost')
         return f'http://{domain}/doi/{dataset.ds_meta_data.dataset_doi}'
 
 
+class DataSetPublicationService:
+    """
+    Publica los datasets en Zenodo (o Fakenodo) desde la cola de trabajos, fuera de la petición que los crea.
+
+    Cada paso comprueba lo que ya está hecho, de modo que un trabajo reintentado tras un fallo continúa la
+    publicación donde se quedó en lugar de crear otro depósito.
+    """
+
+    def __init__(self):
+        self.dataset_service = DataSetService()
+        self.job_service = JobService()
+        self.deposition_service = FakenodoService() if USE_FAKENODO else ZenodoService()
+
+    def enqueue(self, dataset: DataSet) -> Job:
+        return self.job_service.enqueue(PUBLISH_DATASET_JOB, {"dataset_id": dataset.id}, user_id=dataset.user_id)
+
+    def publish(self, job: Job) -> dict:
+        dataset = self.dataset_service.get_by_id(job.payload["dataset_id"])
+        if dataset is None:
+            raise ValueError(f"Dataset {job.payload['dataset_id']} not found")
+        ds_meta_data = dataset.ds_meta_data
+
+        if not ds_meta_data.dataset_doi:
+            # El id del depósito se guarda nada más crearlo, un reintento lo reutiliza
+            deposition_id = ds_meta_data.deposition_id
+            if deposition_id is None:
+                deposition_id = self.deposition_service.create_new_deposition(dataset)["id"]
+                self.dataset_service.update_dsmetadata(ds_meta_data.id, deposition_id=deposition_id)
+            self.job_service.checkpoint(job, step="upload", deposition_id=deposition_id)
+
+            deposition = self.deposition_service.get_deposition(deposition_id)
+            if not self.deposition_service.is_published(deposition):
+                # Solo se suben los modelos que no están ya en el depósito con el mismo checksum
+                uploaded = self.deposition_service.get_uploaded_checksums(deposition)
+                pending = [
+                    feature_model for feature_model in dataset.feature_models
+                    if not self.is_uploaded(feature_model, uploaded)
+                ]
+                self.deposition_service.upload_files(dataset, deposition_id, pending, user=dataset.user)
+                self.job_service.checkpoint(job, step="publish", uploaded_files=len(pending))
+                self.deposition_service.publish_deposition(deposition_id)
+
+            # Guardar el DOI añade el dataset publicado al paquete de "descargar todo"
+            deposition_doi = self.deposition_service.get_doi(deposition_id)
+            self.dataset_service.update_dsmetadata(ds_meta_data.id, dataset_doi=deposition_doi)
+
+        return {
+            "dataset_id": dataset.id,
+            "deposition_id": ds_meta_data.deposition_id,
+            "dataset_doi": ds_meta_data.dataset_doi,
+        }
+
+    @staticmethod
+    def is_uploaded(feature_model, uploaded: dict) -> bool:
+        uvl_filename = feature_model.fm_meta_data.uvl_filename
+        hubfile = next((file for file in feature_model.files if file.name == uvl_filename), None)
+        return hubfile is not None and uploaded.get(uvl_filename) == hubfile.checksum
+
+
+@job_handler(PUBLISH_DATASET_JOB)
+def publish_dataset(job: Job) -> dict:
+    return DataSetPublicationService().publish(job)
+
+
 class AuthorService(BaseService):
     def __init__(self):
         super().__init__(AuthorRepository())
@@ -350,6 +1082,10 @@ class DSDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(DSDownloadRecordRepository())
 
+    def record_download(self, dataset_id: int, user_cookie: str):
+        # Se escribe en diferido y sin duplicados por usuario, dataset y cookie
+        self.repository.record_download(dataset_id, user_cookie)
+
 
 class DSMetaDataService(BaseService):
     def __init__(self):
@@ -378,10 +1114,8 @@ class DSViewRecordService(BaseService):
         if not user_cookie:
             user_cookie = str(uuid.uuid4())
 
-        existing_record = self.the_record_exists(dataset=dataset, user_cookie=user_cookie)
-
-        if not existing_record:
-            self.create_new_record(dataset=dataset, user_cookie=user_cookie)
+        # Se escribe en diferido y sin duplicados por usuario, dataset y cookie
+        self.repository.record_view(dataset=dataset, user_cookie=user_cookie)
 
         return user_cookie
 
@@ -423,11 +1157,13 @@ class DSRatingService(BaseService):
         existing_rating = self.repository.get_user_rating(dsmetadata_id, user_id)
 
         if existing_rating:
-            # Actualiza la calificación existente
+            # Actualiza la calificación existente, el número de calificaciones no cambia
+            sum_delta, count_delta = rating_value - existing_rating.rating, 0
             existing_rating.rating = rating_value
             existing_rating.rated_date = datetime.utcnow()
         else:
             # Crea una nueva calificación
+            sum_delta, count_delta = rating_value, 1
             existing_rating = self.repository.create(
                 commit=False,
                 ds_meta_data_id=dsmetadata_id,
@@ -436,7 +1172,13 @@ class DSRatingService(BaseService):
                 rated_date=datetime.utcnow()
             )
 
-        self.repository.session.commit()
+        # La suma, el número y la media de calificaciones del dataset se actualizan en la misma transacción
+        try:
+            self.repository.update_rating_aggregates(dsmetadata_id, sum_delta, count_delta)
+            self.repository.session.commit()
+        except Exception:
+            self.repository.session.rollback()
+            raise
         return existing_rating
 
     def get_dataset_average_rating(self, dsmetadata_id: int) -> float:
@@ -446,7 +1188,5 @@ class DSRatingService(BaseService):
         return self.repository.count_ratings(dsmetadata_id)
 
     def get_datasets_with_rating(self, current_user_id):
-        datasets = self.repository.get_synchronized(current_user_id)
-        for dataset in datasets:
-            dataset.ds_meta_data.rating = self.dsrating_repository.get_average_rating(dataset.ds_meta_data.id)
-        return datasets
+        # La media de cada dataset ya está guardada en ds_meta_data.rating, se mantiene al calificar
+        return DataSetRepository().get_synchronized(current_user_id)
@@ -1,12 +1,31 @@
+import hashlib
+import io
+import os
+import shutil
+
 import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from unittest.mock import MagicMock, patch
 import unittest
 
-from app.modules.dataset.models import DataSet, DSMetaData
+from app.modules.dataset.models import DataSet, DSDownloadRecord, DSMetaData, PublicationType
+from app.modules.dataset.services import (
+    AllDatasetsBundle,
+    DataSetPublicationService,
+    DataSetService,
+    DSDownloadRecordService,
+)
+from app.modules.fakenodo.services import FakenodoService
+from app.modules.featuremodel.models import FeatureModel, FMMetaData
+from app.modules.hubfile.models import Hubfile
+from app.modules.jobs.models import Job, JobStatus
+from app.modules.jobs.services import JobService
 from app.modules.conftest import login
 from app.modules.auth.models import User
 from app.modules.profile.models import UserProfile
 from app import db
+from core.events.event_buffer import event_buffer
 
 
 @pytest.fixture(scope="module")
@@ -48,8 +67,8 @@ def test_download_dataset_formats_mocked(test_client):
         # Set the return value of the mocked method
         mock_get.return_value = mock_dataset
 
-        # Mock the DSDownloadRecordService.create method to prevent database insertion
-        with patch('app.modules.dataset.services.DSDownloadRecordService.create') as mock_create:
+        # Mock the DSDownloadRecordService.record_download method to prevent database insertion
+        with patch('app.modules.dataset.services.DSDownloadRecordService.record_download') as mock_create:
             mock_create.return_value = None  # No action needed for the mock
 
             # Define the URL for the download endpoint and the formats to test
@@ -69,6 +88,296 @@ def test_download_dataset_formats_mocked(test_client):
                 mock_create.assert_called()
 
 
+def test_download_records_are_buffered_and_deduplicated(test_client):
+    """
+    Test that download records are queued, written in one batch, and not duplicated per user, dataset and cookie.
+    """
+    app = test_client.application
+    with app.app_context():
+        dataset = DataSet(
+            user_id=test_client.user_id,
+            ds_meta_data=DSMetaData(title="Buffered", description="Buffered.", publication_type=PublicationType.REPORT)
+        )
+        db.session.add(dataset)
+        db.session.commit()
+        dataset_id = dataset.id
+
+    flush_interval = app.config['EVENT_BUFFER_FLUSH_INTERVAL']
+    app.config['EVENT_BUFFER_FLUSH_INTERVAL'] = 3600
+    try:
+        with app.test_request_context():
+            service = DSDownloadRecordService()
+            for cookie in ["first", "first", "second"]:
+                service.record_download(dataset_id, cookie)
+
+            assert event_buffer.pending() == 3
+            assert DSDownloadRecord.query.filter_by(dataset_id=dataset_id).count() == 0
+
+            assert event_buffer.flush() == 2
+            assert DSDownloadRecord.query.filter_by(dataset_id=dataset_id).count() == 2
+
+            # Records already stored are not written again
+            service.record_download(dataset_id, "second")
+            assert event_buffer.flush() == 0
+            assert DSDownloadRecord.query.filter_by(dataset_id=dataset_id).count() == 2
+    finally:
+        app.config['EVENT_BUFFER_FLUSH_INTERVAL'] = flush_interval
+
+
+def test_failed_flushes_requeue_or_isolate_records(test_client):
+    """
+    Test that records are queued again while the database is unavailable and that a record that cannot be written
+    does not drop the others.
+    """
+    from sqlalchemy.exc import OperationalError
+
+    app = test_client.application
+    with app.app_context():
+        dataset = DataSet(
+            user_id=test_client.user_id,
+            ds_meta_data=DSMetaData(title="Retried", description="Retried.", publication_type=PublicationType.REPORT)
+        )
+        db.session.add(dataset)
+        db.session.commit()
+        dataset_id = dataset.id
+
+    flush_interval = app.config['EVENT_BUFFER_FLUSH_INTERVAL']
+    app.config['EVENT_BUFFER_FLUSH_INTERVAL'] = 3600
+    try:
+        with app.test_request_context():
+            service = DSDownloadRecordService()
+            service.record_download(dataset_id, "retried")
+
+            unavailable = OperationalError("INSERT", {}, Exception("Lost connection"))
+            with patch.object(event_buffer, '_get_stored_keys', side_effect=unavailable):
+                assert event_buffer.flush() == 0
+            assert event_buffer.pending() == 1
+            assert event_buffer.flush() == 1
+
+            # A record with an invalid date cannot be stored, the other one of its batch is
+            unique = ('user_id', 'dataset_id', 'download_cookie')
+            event_buffer.record(DSDownloadRecord, unique, user_id=None, dataset_id=dataset_id,
+                                download_date="not a date", download_cookie="invalid")
+            service.record_download(dataset_id, "valid")
+            assert event_buffer.flush() == 1
+            assert event_buffer.pending() == 0
+            cookies = {record.download_cookie for record in DSDownloadRecord.query.filter_by(dataset_id=dataset_id)}
+            assert cookies == {"retried", "valid"}
+
+            # Records are dropped after EVENT_BUFFER_MAX_RETRIES failed flushes
+            service.record_download(dataset_id, "dropped")
+            with patch.object(event_buffer, '_get_stored_keys', side_effect=unavailable):
+                for _ in range(app.config['EVENT_BUFFER_MAX_RETRIES'] + 1):
+                    event_buffer.flush()
+            assert event_buffer.pending() == 0
+    finally:
+        app.config['EVENT_BUFFER_FLUSH_INTERVAL'] = flush_interval
+
+
+def test_chunked_upload_resumes_and_checks_integrity(test_client):
+    """
+    Test that an upload sent in chunks can be resumed, rejects chunks out of order and keeps its checksum.
+    """
+    temp_folder = os.path.join("uploads", "temp", str(test_client.user_id))
+    with open(os.path.join(os.path.dirname(__file__), "..", "uvl_examples", "file1.uvl"), "rb") as uvl_file:
+        content = uvl_file.read()
+    assert len(content) > 100
+    first, second = content[:100], content[100:]
+    login(test_client, "user@example.com", "test1234")
+    try:
+        response = test_client.post("/dataset/file/upload/init", json={"filename": "model.uvl", "size": len(content)})
+        assert response.status_code == 201
+        upload_id = response.json["upload_id"]
+
+        assert test_client.put(f"/dataset/file/upload/{upload_id}?offset=0", data=first).json["offset"] == 100
+
+        # A chunk past the received bytes is rejected with the offset to resume from
+        response = test_client.put(f"/dataset/file/upload/{upload_id}?offset=200", data=second)
+        assert response.status_code == 409
+        assert response.json["offset"] == 100
+
+        # Sending the first chunk again replaces it
+        assert test_client.put(f"/dataset/file/upload/{upload_id}?offset=0", data=first).json["offset"] == 100
+        assert test_client.get(f"/dataset/file/upload/{upload_id}").json["offset"] == 100
+
+        response = test_client.post(f"/dataset/file/upload/{upload_id}/finalize")
+        assert response.status_code == 409
+
+        test_client.put(f"/dataset/file/upload/{upload_id}?offset=100", data=second)
+        response = test_client.post(
+            f"/dataset/file/upload/{upload_id}/finalize", json={"checksum": hashlib.md5(content).hexdigest()}
+        )
+        assert response.status_code == 200
+        assert response.json["filename"] == "model.uvl"
+        with open(os.path.join(temp_folder, "model.uvl"), "rb") as uploaded:
+            assert uploaded.read() == content
+        assert test_client.get(f"/dataset/file/upload/{upload_id}").status_code == 404
+
+        # The single request upload goes through the same path and gets a free name
+        response = test_client.post(
+            "/dataset/file/upload", data={"file": (io.BytesIO(content), "model.uvl")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 200
+        assert response.json["filename"] == "model (1).uvl"
+        assert response.json["checksum"] == hashlib.md5(content).hexdigest()
+
+        # Files that flamapy cannot read are rejected with their errors
+        response = test_client.post(
+            "/dataset/file/upload", data={"file": (io.BytesIO(b"features\n    Root {\n"), "broken.uvl")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 400
+        assert response.json["errors"]
+        assert not os.path.exists(os.path.join(temp_folder, "broken.uvl"))
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+
+def test_create_from_form_inserts_each_table_in_one_flush(test_client):
+    """
+    Test that a dataset with several feature models inserts each table in a single flush and stores every row.
+    """
+    temp_folder = os.path.join("uploads", "temp", str(test_client.user_id))
+    examples = os.path.join(os.path.dirname(__file__), "..", "uvl_examples")
+    uvl_filenames = ["file1.uvl", "file2.uvl", "file3.uvl"]
+    os.makedirs(temp_folder, exist_ok=True)
+    for uvl_filename in uvl_filenames:
+        shutil.copy(os.path.join(examples, uvl_filename), temp_folder)
+
+    def feature_model_form(uvl_filename):
+        feature_model = MagicMock()
+        feature_model.uvl_filename.data = uvl_filename
+        feature_model.get_fmmetadata.return_value = {
+            "uvl_filename": uvl_filename, "title": uvl_filename, "description": "Model",
+            "publication_type": "NONE", "publication_doi": "", "tags": "", "uvl_version": "1.0",
+        }
+        feature_model.get_authors.return_value = [{"name": f"Author of {uvl_filename}"}]
+        return feature_model
+
+    form = MagicMock()
+    form.feature_models = [feature_model_form(uvl_filename) for uvl_filename in uvl_filenames]
+    form.get_dsmetadata.return_value = {
+        "title": "Bulk dataset", "description": "Bulk", "publication_type": PublicationType.NONE.name,
+        "publication_doi": "", "dataset_doi": None, "tags": "bulk",
+    }
+    form.get_authors.return_value = [{"name": "Coauthor"}]
+
+    # Tables that received rows in each flush
+    flushes = [set()]
+
+    def record_insert(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO"):
+            flushes[-1].add(statement.split()[2].strip('"`'))
+
+    def next_flush(session, flush_context):
+        flushes.append(set())
+
+    try:
+        with test_client.application.app_context():
+            engine = db.engine
+            event.listen(engine, "before_cursor_execute", record_insert)
+            event.listen(Session, "after_flush", next_flush)
+            try:
+                user = db.session.get(User, test_client.user_id)
+                dataset = DataSetService().create_from_form(form=form, current_user=user)
+            finally:
+                event.remove(engine, "before_cursor_execute", record_insert)
+                event.remove(Session, "after_flush", next_flush)
+
+            for table in ("author", "fm_meta_data", "feature_model", "file"):
+                assert sum(table in tables for tables in flushes) == 1
+            dataset = db.session.get(DataSet, dataset.id)
+            assert [fm.files[0].name for fm in dataset.feature_models] == uvl_filenames
+            assert [fm.fm_meta_data.authors[0].name for fm in dataset.feature_models] == [
+                f"Author of {uvl_filename}" for uvl_filename in uvl_filenames
+            ]
+            assert [author.name for author in dataset.ds_meta_data.authors] == ["Surname, Name", "Coauthor"]
+            assert dataset.ds_meta_data.ds_metrics.number_of_models == "3"
+            assert dataset.files()[0].checksum == hashlib.md5(
+                open(os.path.join(examples, "file1.uvl"), "rb").read()
+            ).hexdigest()
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+
+def test_publication_job_resumes_the_deposition(test_client):
+    """
+    Test that a publication that fails halfway is retried on the same deposition and ends with the DOI stored.
+    """
+    with test_client.application.app_context():
+        dataset = DataSet(
+            user_id=test_client.user_id,
+            ds_meta_data=DSMetaData(title="Queued", description="Queued.", publication_type=PublicationType.NONE),
+            feature_models=[FeatureModel(
+                fm_meta_data=FMMetaData(
+                    uvl_filename="queued.uvl", title="Queued", description="Queued.",
+                    publication_type=PublicationType.NONE,
+                ),
+                files=[Hubfile(name="queued.uvl", checksum="0" * 32, size=10)],
+            )],
+        )
+        db.session.add(dataset)
+        db.session.commit()
+        dataset_id = dataset.id
+
+        job_id = DataSetPublicationService().enqueue(dataset).id
+        service = JobService()
+        with patch.object(AllDatasetsBundle, "refresh_in_background"):
+            with patch.object(FakenodoService, "publish_deposition", side_effect=Exception("Fakenodo is down")):
+                service.run_next("worker-1")
+
+            job = db.session.get(Job, job_id)
+            dataset = db.session.get(DataSet, dataset_id)
+            assert job.status == JobStatus.QUEUED
+            assert job.error == "Fakenodo is down"
+            assert job.progress["step"] == "publish"
+            deposition_id = dataset.ds_meta_data.deposition_id
+            assert deposition_id is not None
+            assert dataset.ds_meta_data.dataset_doi is None
+
+            job.run_after = job.created_at
+            db.session.commit()
+            with patch.object(FakenodoService, "create_new_deposition") as create_new_deposition:
+                service.run_next("worker-1")
+            create_new_deposition.assert_not_called()
+
+        job = db.session.get(Job, job_id)
+        dataset = db.session.get(DataSet, dataset_id)
+        assert job.status == JobStatus.DONE
+        assert dataset.ds_meta_data.dataset_doi == f"10.5281/fakenodo.{deposition_id}"
+        assert job.result == {
+            "dataset_id": dataset_id,
+            "deposition_id": deposition_id,
+            "dataset_doi": f"10.5281/fakenodo.{deposition_id}",
+        }
+
+
+def test_bundle_is_refreshed_when_a_dataset_is_published_or_deleted(test_client):
+    """
+    Test that publishing, unpublishing or deleting a dataset refreshes the download-all bundle.
+    """
+    with test_client.application.app_context():
+        dataset = DataSet(
+            user_id=test_client.user_id,
+            ds_meta_data=DSMetaData(title="Bundled", description="Bundled.", publication_type=PublicationType.NONE),
+        )
+        db.session.add(dataset)
+        db.session.commit()
+
+        service = DataSetService()
+        with patch.object(AllDatasetsBundle, "refresh_in_background") as refresh:
+            service.update_dsmetadata(dataset.ds_meta_data_id, title="Renamed")
+            refresh.assert_not_called()
+
+            service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi="10.1234/bundled")
+            service.update_dsmetadata(dataset.ds_meta_data_id, dataset_doi=None)
+            assert refresh.call_count == 2
+
+            assert service.delete(dataset.id)
+            assert refresh.call_count == 3
+
+
 class TestDatasetExport(unittest.TestCase):
 
     def setUp(self):
@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from app.modules.auth.models import User
+from app.modules.dataset.models import DSMetaData, DataSet, PublicationType
+from app.modules.dataset.services import DSRatingService
 from app.modules.profile.models import UserProfile
 from app import db
 
@@ -36,7 +38,10 @@ def test_add_or_update_rating_mocked(test_client_with_ratings):
     """
     Test adding or updating a dataset rating using mocks.
     """
-    with patch('app.modules.dataset.services.DSRatingService.add_or_update_rating') as mock_add_rating:
+    with patch('app.modules.dataset.services.DataSetService.get_by_id') as mock_get_dataset, \
+         patch('app.modules.dataset.services.DSRatingService.add_or_update_rating') as mock_add_rating:
+        # The rating is stored on the metadata of the dataset, whose id differs from the dataset id
+        mock_get_dataset.return_value = MagicMock(id=1, ds_meta_data_id=7)
         # Mock the return value of the service
         mock_add_rating.return_value = MagicMock(
             id=1, ds_meta_data_id=1, user_id=test_client_with_ratings.user_id, rating=4
@@ -51,15 +56,17 @@ def test_add_or_update_rating_mocked(test_client_with_ratings):
         # Assert response and mock calls
         assert response.status_code == 200, "Failed to add or update rating"
         assert response.json['message'] == "Rating added/updated"
-        mock_add_rating.assert_called_once_with(1, test_client_with_ratings.user_id, 4)
+        mock_add_rating.assert_called_once_with(7, test_client_with_ratings.user_id, 4)
 
 
 def test_get_average_rating_mocked(test_client_with_ratings):
     """
     Test retrieving average rating for a dataset using mocks.
     """
-    with patch('app.modules.dataset.services.DSRatingService.get_dataset_average_rating') as mock_avg_rating:
-        # Mock the average rating
+    with patch('app.modules.dataset.services.DataSetService.get_by_id') as mock_get_dataset, \
+         patch('app.modules.dataset.services.DSRatingService.get_dataset_average_rating') as mock_avg_rating:
+        # Mock the dataset and the average rating
+        mock_get_dataset.return_value = MagicMock(id=1, ds_meta_data_id=7)
         mock_avg_rating.return_value = 4.5
 
         # Call the average rating endpoint
@@ -68,7 +75,7 @@ def test_get_average_rating_mocked(test_client_with_ratings):
         # Assert response and mock calls
         assert response.status_code == 200, "Failed to retrieve average rating"
         assert response.json['average_rating'] == 4.5
-        mock_avg_rating.assert_called_once_with(1)
+        mock_avg_rating.assert_called_once_with(7)
 
 
 def test_invalid_rating_value(test_client_with_ratings):
@@ -95,15 +102,42 @@ def test_view_dataset_with_average_rating_mocked(test_client_with_ratings):
     with patch('app.modules.dataset.services.DataSetService.get_or_404') as mock_get_dataset, \
          patch('app.modules.dataset.services.DSRatingService.get_dataset_average_rating') as mock_avg_rating:
 
-        # Mock the dataset and average rating
-        mock_dataset = MagicMock(id=1, ds_meta_data=MagicMock(rating=None))
+        # Mock the dataset with its stored average rating
+        mock_dataset = MagicMock(id=1, ds_meta_data=MagicMock(rating=4.0))
         mock_get_dataset.return_value = mock_dataset
-        mock_avg_rating.return_value = 4.0
 
         # Call the view dataset endpoint
         response = test_client_with_ratings.get('/datasets/1')
 
-        # Assert response and mock calls
+        # The stored average is shown as is, without querying the ratings
         assert response.status_code == 200, "Failed to view dataset"
         mock_get_dataset.assert_called_once_with(1)
-        mock_avg_rating.assert_called_once_with(1)
+        mock_avg_rating.assert_not_called()
+        assert mock_dataset.ds_meta_data.rating == 4.0
+
+
+def test_add_or_update_rating_maintains_aggregates(test_client_with_ratings):
+    """
+    Test that adding and updating ratings keeps the stored sum, count and average of the dataset up to date.
+    """
+    with test_client_with_ratings.application.app_context():
+        other_user = User(email="other.rater@example.com", password="password123")
+        dataset = DataSet(
+            user_id=test_client_with_ratings.user_id,
+            ds_meta_data=DSMetaData(title="Rated", description="Rated.", publication_type=PublicationType.REPORT)
+        )
+        db.session.add_all([other_user, dataset])
+        db.session.commit()
+        ds_meta_data_id = dataset.ds_meta_data_id
+        service = DSRatingService()
+
+        service.add_or_update_rating(ds_meta_data_id, test_client_with_ratings.user_id, 2)
+        service.add_or_update_rating(ds_meta_data_id, other_user.id, 5)
+        assert service.get_dataset_average_rating(ds_meta_data_id) == 3.5
+        assert service.get_total_ratings(ds_meta_data_id) == 2
+
+        # Updating a rating changes the sum but not the count
+        service.add_or_update_rating(ds_meta_data_id, test_client_with_ratings.user_id, 4)
+        metadata = db.session.get(DSMetaData, ds_meta_data_id)
+        assert (metadata.rating_sum, metadata.rating_count, metadata.rating) == (9, 2, 4.5)
+        assert service.get_total_ratings(ds_meta_data_id) == 2
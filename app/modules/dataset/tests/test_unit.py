@@ -1,8 +1,16 @@
 import pytest
 from app import create_app
 import io
-from unittest.mock import patch
+import json
+import os
+import yaml
+from xml.etree import ElementTree
+from unittest.mock import MagicMock, patch
 from datetime import datetime
+from zipfile import ZipFile
+
+from app.modules.dataset.exporters import UVLExportCache, UVLSyntaxError, export_uvl, parse_uvl
+from app.modules.dataset.services import AllDatasetsBundle, ArchiveCache, DataSetService, stream_zip
 
 
 @pytest.fixture(scope="module")
@@ -54,13 +62,12 @@ def test_download_all_filename(mock_generar_zip, test_client):
     mock_generar_zip.assert_called_once()
 
 
-@patch('os.listdir')
-@patch('app.modules.dataset.services.DataSetService.is_synchronized')
-def test_zip_all_datasets_no_datasets(mock_is_synchronized, mock_listdir, test_client):
+@patch('app.modules.dataset.services.AllDatasetsBundle.get')
+@patch('app.modules.dataset.services.DataSetService.count_synchronized_datasets')
+def test_zip_all_datasets_no_datasets(mock_count_synchronized, mock_bundle_get, test_client):
     """Testea que la función devuelva un error 404 si no hay datasets sincronizados."""
-    # Mockear el sistema de archivos para que no haya datasets sincronizados
-    mock_listdir.side_effect = lambda path: [] if path == "uploads" else []
-    mock_is_synchronized.return_value = False
+    mock_bundle_get.return_value = None
+    mock_count_synchronized.return_value = 0
 
     # Ejecutar la solicitud y verificar que la respuesta sea 404
     response = test_client.get('/dataset/download/all')
@@ -69,15 +76,233 @@ def test_zip_all_datasets_no_datasets(mock_is_synchronized, mock_listdir, test_c
     assert response.status_code == 404
 
 
-@patch('os.listdir')
-@patch('app.modules.dataset.services.DataSetService.is_synchronized')
-def test_zip_all_datasets_no_users(mock_is_synchronized, mock_listdir, test_client):
-    """Testea que no se genera un archivo ZIP si no hay directorios de usuarios."""
-    # Mockear para que no haya directorios de usuarios
-    mock_listdir.side_effect = lambda path: []  # No hay usuarios
+@patch('app.modules.dataset.services.AllDatasetsBundle.refresh_in_background')
+@patch('app.modules.dataset.services.AllDatasetsBundle.get')
+@patch('app.modules.dataset.services.DataSetService.count_synchronized_datasets')
+def test_zip_all_datasets_not_ready(mock_count_synchronized, mock_bundle_get, mock_refresh, test_client):
+    """Testea que, si el ZIP aún no existe, se prepare en segundo plano sin convertir nada en la petición."""
+    mock_bundle_get.return_value = None
+    mock_count_synchronized.return_value = 2
 
-    # Ejecutar la solicitud y verificar que se devuelve un error 404
     response = test_client.get('/dataset/download/all')
 
-    # Verificar que el código de estado sea 404
-    assert response.status_code == 404
+    assert response.status_code == 503
+    mock_refresh.assert_called_once()
+
+
+def make_bundle_dataset(dataset_id, checksum):
+    dataset = MagicMock(id=dataset_id)
+    file = MagicMock(id=dataset_id, checksum=checksum)
+    file.name = f"file{dataset_id}.uvl"
+    dataset.files.return_value = [file]
+    return dataset
+
+
+def fake_fragment_entries(dataset, conversions):
+    yield f"dataset_{dataset.id}/UVL/file{dataset.id}.uvl", f"checksum {dataset.files()[0].checksum}".encode()
+
+
+def test_all_datasets_bundle_is_updated_incrementally(tmp_path):
+    """Testea que al publicar un dataset solo se añada su fragmento y que al eliminarlo se reconstruya el ZIP."""
+    bundle = AllDatasetsBundle(folder=str(tmp_path))
+    first, second = make_bundle_dataset(1, "aaa"), make_bundle_dataset(2, "bbb")
+
+    with patch.object(AllDatasetsBundle, 'get_fragment_entries', side_effect=fake_fragment_entries) as mock_entries, \
+         patch('app.modules.dataset.services.FlamapyService.get_conversions', return_value={}):
+        bundle.refresh([first])
+        with ZipFile(bundle.get()) as zipf:
+            assert zipf.namelist() == ["dataset_1/UVL/file1.uvl"]
+
+        bundle.refresh([first, second])
+        with ZipFile(bundle.get()) as zipf:
+            assert zipf.namelist() == ["dataset_1/UVL/file1.uvl", "dataset_2/UVL/file2.uvl"]
+        assert mock_entries.call_count == 2
+
+        bundle.refresh([second])
+        with ZipFile(bundle.get()) as zipf:
+            assert zipf.namelist() == ["dataset_2/UVL/file2.uvl"]
+        assert mock_entries.call_count == 2
+
+        bundle.refresh([make_bundle_dataset(2, "ccc")])
+        with ZipFile(bundle.get()) as zipf:
+            assert zipf.read("dataset_2/UVL/file2.uvl") == b"checksum ccc"
+
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".zip")]) == 1
+
+
+def test_stream_zip_builds_valid_archive(tmp_path):
+    """Testea que el ZIP generado por partes contenga los ficheros y contenidos esperados."""
+    uvl_file = tmp_path / "model.uvl"
+    uvl_file.write_text("features\n    Root\n" * 10000)
+
+    chunks = list(stream_zip([
+        ("dataset_1/model.uvl", str(uvl_file)),
+        ("dataset_1/model.json", b'{"features": {}}'),
+    ], chunk_size=1024))
+
+    assert len(chunks) > 1
+    with ZipFile(io.BytesIO(b"".join(chunks))) as zipf:
+        assert zipf.namelist() == ["dataset_1/model.uvl", "dataset_1/model.json"]
+        assert zipf.read("dataset_1/model.uvl") == uvl_file.read_bytes()
+        assert zipf.read("dataset_1/model.json") == b'{"features": {}}'
+
+
+def test_archive_cache_store_and_get(tmp_path):
+    """Testea que un ZIP cacheado se recupere con los mismos checksums y se invalide al cambiar los ficheros."""
+    cache = ArchiveCache(folder=str(tmp_path), max_size=1024 ** 2)
+
+    assert cache.get("dataset_1-uvl", ["a.uvl:111"]) is None
+
+    chunks = list(cache.store("dataset_1-uvl", ["a.uvl:111"], [b"first ", b"archive"]))
+    assert chunks == [b"first ", b"archive"]
+
+    cached = cache.get("dataset_1-uvl", ["a.uvl:111"])
+    with open(cached, "rb") as f:
+        assert f.read() == b"first archive"
+
+    cache.build("dataset_1-uvl", ["a.uvl:222"], [b"second archive"])
+
+    assert cache.get("dataset_1-uvl", ["a.uvl:111"]) is None
+    assert cache.get("dataset_1-uvl", ["a.uvl:222"]) is not None
+
+    # A new converter version invalidates the archives built by the previous one
+    cache.build("dataset_1-uvl", ["a.uvl:222"], [b"third archive"], version="2")
+    assert cache.get("dataset_1-uvl", ["a.uvl:222"]) is None
+    assert cache.get("dataset_1-uvl", ["a.uvl:222"], version="2") is not None
+
+
+def test_archive_cache_removes_stale_temporary_files(tmp_path):
+    """Testea que se borren los temporales que dejó una escritura interrumpida, pero no los que están en curso."""
+    cache = ArchiveCache(folder=str(tmp_path), max_size=1024 ** 2)
+    stale = tmp_path / "stale.part"
+    stale.write_bytes(b"partial")
+    os.utime(stale, (0, 0))
+    in_progress = tmp_path / "in_progress.part"
+    in_progress.write_bytes(b"partial")
+
+    cache.build("dataset_1-uvl", ["a.uvl:111"], [b"archive"])
+
+    assert not stale.exists()
+    assert in_progress.exists()
+
+
+def test_archive_cache_interrupted_store_is_discarded(tmp_path):
+    """Testea que una descarga interrumpida no deje un ZIP incompleto en la caché."""
+    cache = ArchiveCache(folder=str(tmp_path), max_size=1024 ** 2)
+
+    stream = cache.store("dataset_1-uvl", ["a.uvl:111"], [b"first ", b"archive"])
+    next(stream)
+    stream.close()
+
+    assert cache.get("dataset_1-uvl", ["a.uvl:111"]) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_archive_cache_evicts_least_recently_used(tmp_path):
+    """Testea que se eliminen los ZIP menos usados recientemente al superar el tamaño máximo."""
+    cache = ArchiveCache(folder=str(tmp_path), max_size=20)
+
+    old_path = cache.build("dataset_1-uvl", ["a"], [b"x" * 10])
+    os.utime(old_path, (0, 0))
+    cache.build("dataset_2-uvl", ["b"], [b"x" * 10])
+    cache.build("dataset_3-uvl", ["c"], [b"x" * 10])
+
+    assert cache.get("dataset_1-uvl", ["a"]) is None
+    assert cache.get("dataset_2-uvl", ["b"]) is not None
+    assert cache.get("dataset_3-uvl", ["c"]) is not None
+
+
+def test_archive_cache_keeps_archives_that_may_still_be_served(tmp_path):
+    """Testea que no se eliminen los ZIP recién guardados o leídos aunque se supere el tamaño máximo."""
+    cache = ArchiveCache(folder=str(tmp_path), max_size=20)
+
+    served = cache.build("dataset_1-uvl", ["a"], [b"x" * 15])
+    os.utime(served, (0, 0))
+    assert cache.get("dataset_1-uvl", ["a"]) == served
+    large = cache.build("dataset_2-uvl", ["b"], [b"x" * 30])
+
+    assert os.path.exists(served)
+    assert os.path.exists(large)
+
+    cache.min_age = 0
+    os.utime(served, (0, 0))
+    large = cache.build("dataset_3-uvl", ["c"], [b"x" * 30])
+    assert not os.path.exists(served)
+    assert os.path.exists(large)
+
+
+UVL_EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "uvl_examples", "file1.uvl")
+
+
+def test_parse_uvl_builds_feature_tree():
+    model = parse_uvl("""namespace Shop
+features
+    Shop {abstract}
+        mandatory
+            Payment
+                [1..2]
+                    Card
+                    "Bank Transfer" // comment
+        optional
+            Integer Items cardinality [0..*] {default 1, doc 'a, b'}
+constraints
+    Card =>
+        Payment
+""")
+
+    assert model.namespace == "Shop"
+    assert model.root.name == "Shop"
+    assert model.root.attributes == {"abstract": True}
+    mandatory, optional = model.root.groups
+    assert [feature.name for feature in mandatory.features[0].groups[0].features] == ["Card", "Bank Transfer"]
+    assert mandatory.features[0].groups[0].kind == "[1..2]"
+    items = optional.features[0]
+    assert (items.type, items.cardinality, items.attributes) == ("Integer", "0..*", {"default": 1, "doc": "a, b"})
+    assert model.constraints == ["Card => Payment"]
+
+
+def test_parse_uvl_reports_line_of_syntax_error():
+    with pytest.raises(UVLSyntaxError) as excinfo:
+        parse_uvl("features\n    Root\n        Child\n")
+    assert excinfo.value.line_number == 3
+
+
+def test_export_uvl_formats_share_the_same_tree():
+    with open(UVL_EXAMPLE) as uvl_file:
+        exports = export_uvl(uvl_file.read())
+
+    from_json = json.loads(exports["json"])
+    assert yaml.safe_load(exports["yaml"]) == from_json
+    assert from_json["features"]["name"] == "Chat"
+    assert from_json["constraints"] == ['Server => "Data Storage"', 'Video | Audio => "Media Player"']
+
+    root = ElementTree.fromstring(exports["xml"])
+    assert [feature.get("name") for feature in root.iter("feature")] == [
+        "Chat", "Connection", "Peer 2 Peer", "Server", "Messages", "Text", "Video", "Audio", "Data Storage",
+        "Media Player",
+    ]
+    assert root.find("constraints/constraint").text == 'Server => "Data Storage"'
+
+
+def test_export_uvl_file_parses_once_per_checksum(tmp_path):
+    service = DataSetService()
+    service.export_cache = UVLExportCache(str(tmp_path), 1024 ** 2)
+
+    with patch('app.modules.dataset.services.export_uvl', wraps=export_uvl) as mock_export:
+        json_path = service.export_uvl_file(UVL_EXAMPLE, "json", "checksum")
+        xml_path = service.export_uvl_file(UVL_EXAMPLE, "xml", "checksum")
+
+    mock_export.assert_called_once()
+    with open(json_path) as json_file:
+        assert json.load(json_file)["features"]["name"] == "Chat"
+    assert ElementTree.parse(xml_path).getroot().tag == "uvl"
+
+
+def test_export_uvl_file_keeps_exports_over_the_cache_size(tmp_path):
+    service = DataSetService()
+    service.export_cache = UVLExportCache(str(tmp_path), 1)
+
+    paths = [service.export_uvl_file(UVL_EXAMPLE, file_format, "checksum") for file_format in ["json", "xml", "yaml"]]
+
+    # Todas las exportaciones siguen en disco para el ZIP que las está leyendo
+    assert all(os.path.exists(path) for path in paths)
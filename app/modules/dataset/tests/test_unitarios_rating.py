@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from app.modules.auth.models import User
 from app.modules.profile.models import UserProfile
 from app import db
@@ -42,7 +42,15 @@ def auth_headers(test_client_with_ratings):
     }
 
 
-def test_rate_dataset_success(test_client_with_ratings, auth_headers):
+@pytest.fixture
+def rated_dataset():
+    """Dataset 1, whose metadata has a different id, so ratings must be stored by metadata id."""
+    with patch('app.modules.dataset.services.DataSetService.get_by_id') as mock_get_dataset:
+        mock_get_dataset.return_value = MagicMock(id=1, ds_meta_data_id=7)
+        yield mock_get_dataset.return_value
+
+
+def test_rate_dataset_success(test_client_with_ratings, auth_headers, rated_dataset):
     """Test successfully rating a dataset."""
     with patch('app.modules.dataset.services.DSRatingService.add_or_update_rating') as mock_add_rating, \
          patch('app.modules.dataset.services.DSRatingService.get_dataset_average_rating') as mock_avg_rating:
@@ -59,11 +67,11 @@ def test_rate_dataset_success(test_client_with_ratings, auth_headers):
         assert response.status_code == 200
         assert response.json['message'] == 'Rating added/updated'
         assert response.json['average_rating'] == 4.0
-        mock_add_rating.assert_called_once_with(1, test_client_with_ratings.user_id, 5)
-        mock_avg_rating.assert_called_once_with(1)
+        mock_add_rating.assert_called_once_with(7, test_client_with_ratings.user_id, 5)
+        mock_avg_rating.assert_called_once_with(7)
 
 
-def test_rate_dataset_boundary_values(test_client_with_ratings, auth_headers):
+def test_rate_dataset_boundary_values(test_client_with_ratings, auth_headers, rated_dataset):
     """Test boundary rating values."""
     for rating in [1, 5]:
         with patch('app.modules.dataset.services.DSRatingService.add_or_update_rating') as mock_add_rating, \
@@ -81,11 +89,11 @@ def test_rate_dataset_boundary_values(test_client_with_ratings, auth_headers):
             assert response.status_code == 200
             assert response.json['message'] == 'Rating added/updated'
             assert response.json['average_rating'] == (rating + 3) / 2  # Validate mock logic
-            mock_add_rating.assert_called_once_with(1, test_client_with_ratings.user_id, rating)
-            mock_avg_rating.assert_called_once_with(1)
+            mock_add_rating.assert_called_once_with(7, test_client_with_ratings.user_id, rating)
+            mock_avg_rating.assert_called_once_with(7)
 
 
-def test_rate_dataset_service_error(test_client_with_ratings, auth_headers):
+def test_rate_dataset_service_error(test_client_with_ratings, auth_headers, rated_dataset):
     """Test handling of service errors while rating."""
     with patch('app.modules.dataset.services.DSRatingService.add_or_update_rating') as mock_add_rating:
         mock_add_rating.side_effect = Exception("Service Error")
@@ -101,6 +109,16 @@ def test_rate_dataset_service_error(test_client_with_ratings, auth_headers):
         assert response.json['error'] == "Service Error"
 
 
+def test_rate_missing_dataset(test_client_with_ratings, auth_headers):
+    """Test rating a dataset that does not exist."""
+    with patch('app.modules.dataset.services.DataSetService.get_by_id', return_value=None), \
+         patch('app.modules.dataset.services.DSRatingService.add_or_update_rating') as mock_add_rating:
+        response = test_client_with_ratings.post('/datasets/999/rate', json={'rating': 3}, headers=auth_headers)
+
+    assert response.status_code == 404
+    mock_add_rating.assert_not_called()
+
+
 def test_rate_dataset_unauthenticated(test_client):
     """Test rating a dataset without authentication."""
     response = test_client.post('/datasets/1/rate', json={'rating': 4})
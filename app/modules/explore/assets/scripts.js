@@ -4,6 +4,9 @@ document.addEventListener('DOMContentLoaded', () => {
     send_query();
 });
 
+let nextCursor = null;
+let searchSequence = 0;
+
 function send_query() {
 
     console.log("send query...")
@@ -15,151 +18,168 @@ function send_query() {
     const filters = document.querySelectorAll('#filters input, #filters select, #filters [type="radio"]');
 
     filters.forEach(filter => {
-        filter.addEventListener('input', () => {
-            const csrfToken = document.getElementById('csrf_token').value;
-
-            const searchCriteria = {
-                csrf_token: csrfToken,
-                query: document.querySelector('#query').value,
-                publication_type: document.querySelector('#publication_type').value,
-                number_of_features: document.querySelector('#number_of_features').value,
-                number_of_products: document.querySelector('#number_of_products').value,
-                sorting: document.querySelector('[name="sorting"]:checked').value,
-            };
-
-            console.log(document.querySelector('#publication_type').value);
-            console.log(document.querySelector('#number_of_features').value);
-            console.log(document.querySelector('#number_of_products').value);
-
-            fetch('/explore', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(searchCriteria),
-            })
-                .then(response => response.json())
-                .then(data => {
-
-                    console.log(data);
-                    document.getElementById('results').innerHTML = '';
-
-                    // results counter
-                    const resultCount = data.length;
-                    const resultText = resultCount === 1 ? 'dataset' : 'datasets';
-                    document.getElementById('results_number').textContent = `${resultCount} ${resultText} found`;
-
-                    if (resultCount === 0) {
-                        console.log("show not found icon");
-                        document.getElementById("results_not_found").style.display = "block";
-                    } else {
-                        document.getElementById("results_not_found").style.display = "none";
-                    }
-
-
-                    data.forEach(dataset => {
-                        let card = document.createElement('div');
-                        card.className = 'col-12';
-                        card.innerHTML = `
-                            <div class="card">
-                                <div class="card-body">
-                                    <div class="d-flex align-items-center justify-content-between">
-                                        <h3><a href="${dataset.url}">${dataset.title}</a></h3>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
-                                        </div>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_number_of_features_as_query('${dataset.number_of_features}')">${dataset.number_of_features}</span>
-                                        </div>
-                                        <div>
-                                            <span class="badge bg-primary" style="cursor: pointer;" onclick="set_number_of_products_as_query('${dataset.number_of_products}')">${dataset.number_of_products}</span>
-                                        </div>
-                                    </div>
-                                    <p class="text-secondary">${formatDate(dataset.created_at)}</p>
+        filter.addEventListener('input', () => fetch_results(null));
+    });
 
-                                    <div class="row mb-2">
+    document.getElementById('load_more').addEventListener('click', () => fetch_results(nextCursor));
+}
 
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Description
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <p class="card-text">${dataset.description}</p>
-                                        </div>
+function get_search_criteria() {
+    return {
+        csrf_token: document.getElementById('csrf_token').value,
+        query: document.querySelector('#query').value,
+        publication_type: document.querySelector('#publication_type').value,
+        number_of_features: document.querySelector('#number_of_features').value,
+        number_of_products: document.querySelector('#number_of_products').value,
+        sorting: document.querySelector('[name="sorting"]:checked').value,
+    };
+}
 
-                                    </div>
+function fetch_results(cursor) {
+    // Results are fetched one page at a time, "Load more" asks for the page after the cursor
+    const searchCriteria = get_search_criteria();
+    if (cursor) {
+        searchCriteria.cursor = cursor;
+    }
+    const sequence = cursor ? searchSequence : ++searchSequence;
+
+    fetch('/explore', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(searchCriteria),
+    })
+        .then(response => response.json().then(data => ({
+            data,
+            total: parseInt(response.headers.get('X-Total-Count'), 10) || 0,
+            next: response.headers.get('X-Next-Cursor'),
+        })))
+        .then(({data, total, next}) => {
+
+            // Ignore pages of a search that has been replaced by a newer one
+            if (sequence !== searchSequence) {
+                return;
+            }
+            nextCursor = next;
+            document.getElementById('load_more').style.display = nextCursor ? 'inline-block' : 'none';
+
+            if (!cursor) {
+                document.getElementById('results').innerHTML = '';
+
+                // results counter
+                const resultText = total === 1 ? 'dataset' : 'datasets';
+                document.getElementById('results_number').textContent = `${total} ${resultText} found`;
+
+                if (total === 0) {
+                    console.log("show not found icon");
+                    document.getElementById("results_not_found").style.display = "block";
+                } else {
+                    document.getElementById("results_not_found").style.display = "none";
+                }
+            }
+
+            data.forEach(dataset => {
+                let card = document.createElement('div');
+                card.className = 'col-12';
+                card.innerHTML = `
+                    <div class="card">
+                        <div class="card-body">
+                            <div class="d-flex align-items-center justify-content-between">
+                                <h3><a href="${dataset.url}">${dataset.title}</a></h3>
+                                <div>
+                                    <span class="badge bg-primary" style="cursor: pointer;" onclick="set_publication_type_as_query('${dataset.publication_type}')">${dataset.publication_type}</span>
+                                </div>
+                                <div>
+                                    <span class="badge bg-primary" style="cursor: pointer;" onclick="set_number_of_features_as_query('${dataset.number_of_features}')">${dataset.number_of_features}</span>
+                                </div>
+                                <div>
+                                    <span class="badge bg-primary" style="cursor: pointer;" onclick="set_number_of_products_as_query('${dataset.number_of_products}')">${dataset.number_of_products}</span>
+                                </div>
+                            </div>
+                            <p class="text-secondary">${formatDate(dataset.created_at)}</p>
 
-                                    <div class="row mb-2">
+                            <div class="row mb-2">
 
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Authors
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.authors.map(author => `
-                                                <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
-                                            `).join('')}
-                                        </div>
+                                <div class="col-md-4 col-12">
+                                    <span class=" text-secondary">
+                                        Description
+                                    </span>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    <p class="card-text">${dataset.description}</p>
+                                </div>
 
-                                    </div>
+                            </div>
 
-                                    <div class="row mb-2">
+                            <div class="row mb-2">
 
-                                        <div class="col-md-4 col-12">
-                                            <span class=" text-secondary">
-                                                Tags
-                                            </span>
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
-                                        </div>
+                                <div class="col-md-4 col-12">
+                                    <span class=" text-secondary">
+                                        Authors
+                                    </span>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    ${dataset.authors.map(author => `
+                                        <p class="p-0 m-0">${author.name}${author.affiliation ? ` (${author.affiliation})` : ''}${author.orcid ? ` (${author.orcid})` : ''}</p>
+                                    `).join('')}
+                                </div>
 
-                                    </div>
+                            </div>
 
-                                    <div class="row">
+                            <div class="row mb-2">
 
-                                        <div class="col-md-4 col-12">
+                                <div class="col-md-4 col-12">
+                                    <span class=" text-secondary">
+                                        Tags
+                                    </span>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    ${dataset.tags.map(tag => `<span class="badge bg-primary me-1" style="cursor: pointer;" onclick="set_tag_as_query('${tag}')">${tag}</span>`).join('')}
+                                </div>
 
-                                        </div>
-                                        <div class="col-md-8 col-12">
-                                            <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                View dataset
-                                            </a>
-                                            <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                Download (${dataset.total_size_in_human_format})
-                                            </a>
-                                            <a href="/github/upload/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
-                                                Backup dataset to GitHub 
-                                            </a>
-                                        </div>
+                            </div>
 
+                            <div class="row">
 
-                                    </div>
+                                <div class="col-md-4 col-12">
 
-                                    <div class="row mb-2">
-                                        <div class="col-md-12 d-flex justify-content-between align-items-center" style="min-height: 60px;">
-                                                <span>Rating</span>
-                                                <!-- Promedio -->
-                                                <span id="average-rating-${dataset.id}" 
-                                                    class="ms-2" 
-                                                    style="font-size: 1.2em; color: #000;">
-                                                    ${dataset.rating ? dataset.rating.toFixed(1) + '/5' : '0.0/5'}
-                                                </span>
-                                            </div>
-                                        </div>
-                                    </div>
+                                </div>
+                                <div class="col-md-8 col-12">
+                                    <a href="${dataset.url}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                                        View dataset
+                                    </a>
+                                    <a href="/dataset/download/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                                        Download (${dataset.total_size_in_human_format})
+                                    </a>
+                                    <a href="/github/upload/${dataset.id}" class="btn btn-outline-primary btn-sm" id="search" style="border-radius: 5px;">
+                                        Backup dataset to GitHub 
+                                    </a>
+                                </div>
+
+
+                            </div>
 
+                            <div class="row mb-2">
+                                <div class="col-md-12 d-flex justify-content-between align-items-center" style="min-height: 60px;">
+                                        <span>Rating</span>
+                                        <!-- Promedio -->
+                                        <span id="average-rating-${dataset.id}" 
+                                            class="ms-2" 
+                                            style="font-size: 1.2em; color: #000;">
+                                            ${dataset.rating ? dataset.rating.toFixed(1) + '/5' : '0.0/5'}
+                                        </span>
+                                    </div>
                                 </div>
                             </div>
-                        `;
 
-                        document.getElementById('results').appendChild(card);
-                    });
-                });
+                        </div>
+                    </div>
+                `;
+
+                document.getElementById('results').appendChild(card);
+            });
         });
-    });
 }
 
 
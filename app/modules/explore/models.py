@@ -0,0 +1,24 @@
+from app import db
+
+
+class SearchToken(db.Model):
+    """
+    Normalised token of the searchable text of a dataset (titles, descriptions, authors, ORCIDs, tags and UVL
+    filenames). Each token is stored once per dataset with the weight of the most relevant field it appears in.
+    """
+    __tablename__ = 'search_token'
+    __table_args__ = (
+        db.UniqueConstraint('dataset_id', 'token', name='uq_search_token_dataset_token'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id', ondelete='CASCADE'), nullable=False)
+    token = db.Column(db.String(120), nullable=False, index=True)
+    weight = db.Column(db.Integer, nullable=False)
+
+    dataset = db.relationship(
+        'DataSet', backref=db.backref('search_tokens', lazy=True, cascade="all, delete-orphan")
+    )
+
+    def __repr__(self):
+        return f'SearchToken<{self.dataset_id}, {self.token}, {self.weight}>'
@@ -1,16 +1,34 @@
 import re
-from sqlalchemy import any_, or_
+from sqlalchemy import and_, any_, func, or_
 import unidecode
-from app.modules.dataset.models import Author, DSMetaData, DataSet, PublicationType, DSMetrics
-from app.modules.featuremodel.models import FMMetaData, FeatureModel
+from app.modules.dataset.models import DSMetaData, DataSet, PublicationType, DSMetrics
+from app.modules.dataset.repositories import dataset_serialization_options
+from app.modules.explore.models import SearchToken
 from core.repositories.BaseRepository import BaseRepository
 
 
+# ORCIDs and DOIs are kept as single tokens, split into their parts they would match every other identifier
+IDENTIFIER_PATTERN = re.compile(r"\b\d{4}-\d{4}-\d{4}-\d{3}[\dx]\b|\b10\.\d{4,9}/\S+")
+
+
+def tokenize(text) -> list:
+    """
+    Split a text into normalised search tokens: transliterated to ASCII and lowercased. ORCIDs and DOIs are
+    whole tokens, the rest of the text is split into alphanumeric words.
+    """
+    if not text:
+        return []
+    normalized_text = unidecode.unidecode(str(text)).lower()
+    identifiers = [match.rstrip(".,;:)]") for match in IDENTIFIER_PATTERN.findall(normalized_text)]
+    words = re.findall(r"[a-z0-9]+", IDENTIFIER_PATTERN.sub(" ", normalized_text))
+    return [token[:120] for token in identifiers + words]
+
+
 class ExploreRepository(BaseRepository):
     def __init__(self):
         super().__init__(DataSet)
 
-    def filter(
+    def build_filter_query(
         self,
         query="",
         sorting="newest",
@@ -20,34 +38,32 @@ class ExploreRepository(BaseRepository):
         tags=[],
         **kwargs
     ):
-        # Normalize and remove unwanted characters
-        normalized_query = unidecode.unidecode(query).lower()
-        cleaned_query = re.sub(r'[,.":\'()\[\]^;!¡¿?]', "", normalized_query)
-
-        filters = []
-        for word in cleaned_query.split():
-            filters.append(DSMetaData.title.ilike(f"%{word}%"))
-            filters.append(DSMetaData.description.ilike(f"%{word}%"))
-            filters.append(Author.name.ilike(f"%{word}%"))
-            filters.append(Author.affiliation.ilike(f"%{word}%"))
-            filters.append(Author.orcid.ilike(f"%{word}%"))
-            filters.append(FMMetaData.uvl_filename.ilike(f"%{word}%"))
-            filters.append(FMMetaData.title.ilike(f"%{word}%"))
-            filters.append(FMMetaData.description.ilike(f"%{word}%"))
-            filters.append(FMMetaData.publication_doi.ilike(f"%{word}%"))
-            filters.append(FMMetaData.tags.ilike(f"%{word}%"))
-            filters.append(DSMetaData.tags.ilike(f"%{word}%"))
+        """
+        Build the unordered query of the datasets matching the criteria.
 
+        Returns the query and the sort keys, in order, as (column, descending) pairs. The last key is the dataset
+        id, so the keys identify every row and can be used as a keyset pagination cursor.
+        """
         datasets = (
             self.model.query
+            .options(*dataset_serialization_options())
             .join(DataSet.ds_meta_data)
-            .join(DSMetaData.authors)
-            .join(DataSet.feature_models)
-            .join(FeatureModel.fm_meta_data)
-            .filter(or_(*filters))
             .filter(DSMetaData.dataset_doi.isnot(None))  # Exclude datasets with empty dataset_doi
         )
 
+        # Every query word matches the indexed tokens it prefixes, datasets are ranked by the weight of their matches
+        words = tokenize(query)
+        score = None
+        if words:
+            matches = (
+                self.session.query(SearchToken.dataset_id, func.sum(SearchToken.weight).label("score"))
+                .filter(or_(*[SearchToken.token.startswith(word, autoescape=True) for word in words]))
+                .group_by(SearchToken.dataset_id)
+                .subquery()
+            )
+            datasets = datasets.join(matches, matches.c.dataset_id == self.model.id)
+            score = matches.c.score
+
         if publication_type != "any":
             matching_type = None
             for member in PublicationType:
@@ -61,18 +77,80 @@ class ExploreRepository(BaseRepository):
         if tags:
             datasets = datasets.filter(DSMetaData.tags.ilike(any_(f"%{tag}%" for tag in tags)))
 
-        if number_of_features != "" and number_of_features is not None:
+        has_number_of_features = number_of_features != "" and number_of_features is not None
+        has_number_of_products = number_of_products != "" and number_of_products is not None
+        if has_number_of_features or has_number_of_products:
             datasets = datasets.join(DSMetaData.ds_metrics)
+
+        if has_number_of_features:
             datasets = datasets.filter(DSMetrics.number_of_features == int(number_of_features))
 
-        if number_of_products != "" and number_of_products is not None:
-            datasets = datasets.join(DSMetaData.ds_metrics)
+        if has_number_of_products:
             datasets = datasets.filter(DSMetrics.number_of_products == int(number_of_products))
 
-        # Order by created_at
-        if sorting == "oldest":
-            datasets = datasets.order_by(self.model.created_at.asc())
-        else:
-            datasets = datasets.order_by(self.model.created_at.desc())
+        # Order by relevance, then by rating if requested, then by created_at
+        descending = sorting != "oldest"
+        sort_keys = [(self.model.created_at, descending), (self.model.id, descending)]
+        if sorting == "rating":
+            sort_keys.insert(0, (DSMetaData.rating, True))
+        if score is not None:
+            sort_keys.insert(0, (score, True))
+
+        return datasets, sort_keys
+
+    def filter(self, *args, **kwargs):
+        datasets, sort_keys = self.build_filter_query(*args, **kwargs)
+        return datasets.order_by(*self.get_ordering(sort_keys)).all()
+
+    def filter_page(self, *args, limit=20, cursor=None, **kwargs):
+        """
+        Return a page of the datasets matching the criteria, paginated by keyset.
 
-        return datasets.all()
+        Returns:
+            tuple: The datasets of the page, the sort key values of the last one if there are more pages (None
+            otherwise) and the total number of matching datasets.
+        """
+        datasets, sort_keys = self.build_filter_query(*args, **kwargs)
+        total = datasets.order_by(None).count()
+
+        if cursor is not None:
+            # A cursor from a search with other sort keys, e.g. with or without a query, does not apply
+            if len(cursor) != len(sort_keys):
+                raise ValueError("Invalid cursor")
+            datasets = datasets.filter(self.get_keyset_condition(sort_keys, cursor))
+
+        page = datasets.order_by(*self.get_ordering(sort_keys)).add_columns(
+            *[column for column, _ in sort_keys]
+        ).limit(limit + 1).all()
+
+        next_cursor = list(page[limit - 1][1:]) if len(page) > limit else None
+        return [row[0] for row in page[:limit]], next_cursor, total
+
+    @staticmethod
+    def get_ordering(sort_keys: list) -> list:
+        return [column.desc() if descending else column.asc() for column, descending in sort_keys]
+
+    @staticmethod
+    def get_keyset_condition(sort_keys: list, cursor: list):
+        # (a, b, c) after (x, y, z) is: a after x, or a = x and b after y, or a = x and b = y and c after z
+        conditions = []
+        for index, (column, descending) in enumerate(sort_keys):
+            equal = [key_column == value for (key_column, _), value in zip(sort_keys[:index], cursor[:index])]
+            after = column < cursor[index] if descending else column > cursor[index]
+            conditions.append(and_(*equal, after))
+        return or_(*conditions)
+
+
+class SearchTokenRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(SearchToken)
+
+    def replace_dataset_tokens(self, dataset_id: int, weights: dict, commit: bool = True):
+        self.model.query.filter_by(dataset_id=dataset_id).delete(synchronize_session=False)
+        self.session.add_all([
+            self.model(dataset_id=dataset_id, token=token, weight=weight) for token, weight in weights.items()
+        ])
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
@@ -13,8 +13,19 @@ def index():
 
     if request.method == 'POST':
         criteria = request.get_json()
-        datasets = ExploreService().filter(**criteria)
-        return jsonify([dataset.to_dict() for dataset in datasets])
+        limit = criteria.pop('limit', None)
+        cursor = criteria.pop('cursor', None)
+        try:
+            datasets, next_cursor, total = ExploreService().filter_page(limit=limit, cursor=cursor, **criteria)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        # The page is the body, the total and the cursor of the next page go in the headers
+        response = jsonify([dataset.to_dict() for dataset in datasets])
+        response.headers['X-Total-Count'] = str(total)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
 
 
 @explore_bp.route('/explore2/models', methods=['GET'])
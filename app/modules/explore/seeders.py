@@ -0,0 +1,10 @@
+from app.modules.explore.services import SearchIndexService
+from core.seeders.BaseSeeder import BaseSeeder
+
+
+class SearchIndexSeeder(BaseSeeder):
+
+    priority = 3  # After the datasets are seeded
+
+    def run(self):
+        SearchIndexService().reindex_all()
@@ -1,7 +1,56 @@
-from app.modules.explore.repositories import ExploreRepository, FMMetaData
-from app.modules.featuremodel.models import FeatureModel
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.orm import selectinload
+
+from app.modules.dataset.models import DataSet
+from app.modules.explore.repositories import ExploreRepository, SearchTokenRepository, tokenize
+from app.modules.featuremodel.models import FMMetaData, FeatureModel
 from core.services.BaseService import BaseService
 
+# Weight of a token depending on the field it comes from, a token present in several fields keeps the highest one
+SEARCH_FIELD_WEIGHTS = {
+    "title": 5,
+    "tags": 4,
+    "author": 3,
+    "orcid": 3,
+    "feature_model": 2,
+    "description": 1,
+}
+
+
+EXPLORE_PAGE_SIZE = 20
+EXPLORE_MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(values: list) -> str:
+    values = [
+        value.isoformat() if isinstance(value, datetime) else int(value) if isinstance(value, Decimal) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Decode a cursor built by ``encode_cursor``. The sort keys always end with (created_at, id), the ones before
+    them (relevance and rating) are numbers.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(values, list) or len(values) < 2:
+            raise ValueError("Invalid cursor")
+        *scores, created_at, dataset_id = values
+        if not isinstance(dataset_id, int) or not all(
+            score is None or isinstance(score, (int, float)) for score in scores
+        ):
+            raise ValueError("Invalid cursor")
+        return [*scores, datetime.fromisoformat(created_at), dataset_id]
+    except (ValueError, TypeError, AttributeError, UnicodeEncodeError):
+        raise ValueError("Invalid cursor")
+
 
 class ExploreService(BaseService):
     def __init__(self):
@@ -21,13 +70,83 @@ class ExploreService(BaseService):
             query, sorting, publication_type, number_of_features, number_of_products, tags, **kwargs
         )
 
+    def filter_page(self, limit=None, cursor=None, **criteria):
+        """
+        Return a bounded page of the datasets matching the criteria.
+
+        Returns:
+            tuple: The datasets of the page, the cursor of the next page (None on the last page) and the total
+            number of matching datasets.
+        """
+        try:
+            limit = min(max(int(limit or EXPLORE_PAGE_SIZE), 1), EXPLORE_MAX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid limit")
+
+        datasets, next_values, total = self.repository.filter_page(
+            limit=limit, cursor=decode_cursor(cursor) if cursor else None, **criteria
+        )
+        return datasets, encode_cursor(next_values) if next_values else None, total
+
+
+class SearchIndexService(BaseService):
+    def __init__(self):
+        super().__init__(SearchTokenRepository())
+
+    def get_dataset_fields(self, dataset: DataSet) -> list:
+        ds_meta_data = dataset.ds_meta_data
+        fields = [
+            ("title", ds_meta_data.title),
+            ("description", ds_meta_data.description),
+            ("tags", ds_meta_data.tags),
+        ]
+        for author in ds_meta_data.authors:
+            fields += [("author", author.name), ("author", author.affiliation), ("orcid", author.orcid)]
+
+        for feature_model in dataset.feature_models:
+            fm_meta_data = feature_model.fm_meta_data
+            if fm_meta_data is None:
+                continue
+            fields += [
+                ("feature_model", fm_meta_data.uvl_filename),
+                ("feature_model", fm_meta_data.title),
+                ("description", fm_meta_data.description),
+                ("feature_model", fm_meta_data.publication_doi),
+                ("tags", fm_meta_data.tags),
+            ]
+            for author in fm_meta_data.authors:
+                fields += [("author", author.name), ("author", author.affiliation), ("orcid", author.orcid)]
+        return fields
+
+    def get_token_weights(self, dataset: DataSet) -> dict:
+        weights = {}
+        for field, text in self.get_dataset_fields(dataset):
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), SEARCH_FIELD_WEIGHTS[field])
+        return weights
+
+    def index_dataset(self, dataset: DataSet, commit: bool = True):
+        """
+        Replace the search tokens of a dataset. Called whenever the dataset is created or its metadata changes.
+        """
+        self.repository.replace_dataset_tokens(dataset.id, self.get_token_weights(dataset), commit=commit)
+
+    def reindex_all(self) -> int:
+        datasets = DataSet.query.all()
+        for dataset in datasets:
+            self.index_dataset(dataset)
+        return len(datasets)
+
 
 class ModelService:
     def get_all_models(self):
         return FeatureModel.query.all()
 
     def filter(self, name=''):
-        query = FeatureModel.query
+        query = FeatureModel.query.options(
+            selectinload(FeatureModel.data_set).selectinload(DataSet.ds_meta_data),
+            selectinload(FeatureModel.fm_meta_data),
+        )
         if name:
             query = query.join(FMMetaData).filter(FMMetaData.title.contains(name))
         return query.all()
@@ -1,8 +1,18 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
 import pytest
+from sqlalchemy import event
+
 from app import db
 from app.modules.conftest import login, logout
 from app.modules.auth.models import User
-from app.modules.dataset.models import DSMetaData, DSMetrics, DataSet, PublicationType
+from app.modules.dataset.models import Author, DSMetaData, DSMetrics, DataSet, PublicationType
+from app.modules.dataset.services import DSRatingService
+from app.modules.explore.services import ExploreService, SearchIndexService
+from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.models import Hubfile
 
 
 @pytest.fixture(scope="module")
@@ -141,3 +151,271 @@ def test_no_filter_results(test_client):
     assert len(json_data) == 0, "Nonexistent query returned unexpected results."
 
     logout(test_client)
+
+
+def test_filter_ranks_search_index_matches(test_client):
+    """
+    Test that the query is matched against the search index, normalised and ranked by relevance.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        described = DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(
+                title="Automotive product lines",
+                description="Models of a montaña bike shop.",
+                publication_type=PublicationType.REPORT,
+                dataset_doi="10.1234/described",
+                authors=[Author(name="Ana Pérez", orcid="0000-0002-1825-0097")],
+            )
+        )
+        titled = DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(
+                title="Montana models",
+                description="Feature models.",
+                publication_type=PublicationType.REPORT,
+                dataset_doi="10.1234/titled",
+            )
+        )
+        db.session.add_all([described, titled])
+        db.session.commit()
+        for dataset in [described, titled]:
+            SearchIndexService().index_dataset(dataset)
+
+    response = test_client.post('/explore', json={"query": "MONTAÑA"}, follow_redirects=True)
+    assert response.status_code == 200
+    titles = [dataset['title'] for dataset in response.get_json()]
+    assert titles == ["Montana models", "Automotive product lines"]
+
+    response = test_client.post('/explore', json={"query": "perez"}, follow_redirects=True)
+    assert [dataset['title'] for dataset in response.get_json()] == ["Automotive product lines"]
+
+    response = test_client.post('/explore', json={"query": "auto"}, follow_redirects=True)
+    assert [dataset['title'] for dataset in response.get_json()] == ["Automotive product lines"]
+
+
+def test_filter_matches_whole_orcids_and_dois(test_client):
+    """
+    Test that ORCIDs and DOIs are indexed whole, so an identifier does not match every other one sharing a part.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        datasets = [
+            DataSet(
+                user_id=user.id,
+                ds_meta_data=DSMetaData(
+                    title=title,
+                    description="Identified.",
+                    publication_type=PublicationType.REPORT,
+                    dataset_doi=f"10.1234/{title.lower()}",
+                    authors=[Author(name=f"{title} author", orcid=orcid)],
+                    tags=f"https://doi.org/10.5281/zenodo.{title.lower()}_v1",
+                )
+            )
+            for title, orcid in [("Identified", "0000-0001-2345-6789"), ("Unrelated", "0000-0003-1111-000X")]
+        ]
+        db.session.add_all(datasets)
+        db.session.commit()
+        for dataset in datasets:
+            SearchIndexService().index_dataset(dataset)
+
+    for query in ["0000-0001-2345-6789", "10.5281/zenodo.identified_v1", "10.5281/zenodo.identified_"]:
+        response = test_client.post('/explore', json={"query": query}, follow_redirects=True)
+        assert [dataset['title'] for dataset in response.get_json()] == ["Identified"], query
+
+    response = test_client.post('/explore', json={"query": "0000-0003-1111-000x"}, follow_redirects=True)
+    assert [dataset['title'] for dataset in response.get_json()] == ["Unrelated"]
+
+
+def test_filter_paginates_with_cursor(test_client):
+    """
+    Test that the results are paginated by keyset, without gaps or repetitions, for both sort orders.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        created_at = datetime(2024, 1, 1)
+        datasets = [
+            DataSet(
+                user_id=user.id,
+                created_at=created_at if i < 3 else created_at + timedelta(days=i),
+                ds_meta_data=DSMetaData(
+                    title=f"Paged dataset {i}",
+                    description="Paged.",
+                    publication_type=PublicationType.REPORT,
+                    dataset_doi=f"10.1234/paged{i}",
+                )
+            )
+            for i in range(5)
+        ]
+        db.session.add_all(datasets)
+        db.session.commit()
+        for dataset in datasets:
+            SearchIndexService().index_dataset(dataset)
+
+    for criteria in [{"sorting": "newest"}, {"sorting": "oldest"}, {"query": "paged dataset 3"}]:
+        with test_client.application.app_context():
+            expected = [dataset.id for dataset in ExploreService().filter(**criteria)]
+
+        ids, cursor = [], None
+        while True:
+            response = test_client.post('/explore', json={**criteria, "limit": 2, "cursor": cursor})
+            assert response.status_code == 200
+            assert int(response.headers['X-Total-Count']) == len(expected)
+            page = response.get_json()
+            assert len(page) <= 2
+            ids += [dataset['id'] for dataset in page]
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+
+        assert ids == expected
+
+    response = test_client.post('/explore', json={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+    # Well-formed JSON of the wrong shape, and a cursor of a search with a query reused without it
+    response = test_client.post('/explore', json={"query": "dataset", "limit": 1})
+    query_cursor = response.headers['X-Next-Cursor']
+    for cursor in [
+        base64.urlsafe_b64encode(json.dumps({"created_at": "2024-01-01", "id": 1}).encode()).decode(),
+        base64.urlsafe_b64encode(json.dumps(["2024-01-01", "1"]).encode()).decode(),
+        query_cursor,
+    ]:
+        response = test_client.post('/explore', json={"cursor": cursor})
+        assert response.status_code == 400, cursor
+
+
+def test_filter_serializes_with_bounded_queries(test_client):
+    """
+    Test that the number of queries of a results page does not grow with the number of datasets in it.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        for i in range(6):
+            dataset = DataSet(
+                user_id=user.id,
+                ds_meta_data=DSMetaData(
+                    title=f"Serialized dataset {i}",
+                    description="Serialized.",
+                    publication_type=PublicationType.REPORT,
+                    dataset_doi=f"10.1234/serialized{i}",
+                    authors=[Author(name=f"Author {i}")],
+                ),
+                feature_models=[FeatureModel(files=[
+                    Hubfile(name=f"model{i}.uvl", checksum="checksum", size=1024 * i)
+                ])],
+            )
+            db.session.add(dataset)
+            db.session.flush()
+            SearchIndexService().index_dataset(dataset, commit=False)
+            DSRatingService().add_or_update_rating(dataset.ds_meta_data_id, user.id, i % 5 + 1)
+        engine = db.engine
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = test_client.post('/explore', json={"query": "serialized", "limit": 2})
+        first_page_statements = len(statements)
+        statements.clear()
+        full_response = test_client.post('/explore', json={"query": "serialized", "limit": 6})
+        full_page_statements = len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 200 and full_response.status_code == 200
+    assert first_page_statements == full_page_statements
+
+    datasets = {dataset['title']: dataset for dataset in full_response.get_json()}
+    assert len(datasets) == 6
+    serialized = datasets["Serialized dataset 3"]
+    assert serialized['rating'] == 4
+    assert serialized['authors'] == [{'name': "Author 3", 'affiliation': None, 'orcid': None}]
+    assert serialized['files_count'] == 1
+    assert serialized['total_size_in_bytes'] == 3072
+    assert serialized['total_size_in_human_format'] == "3.0 KB"
+    assert serialized['files'][0]['name'] == "model3.uvl"
+
+
+def test_filter_sorts_by_rating(test_client):
+    """
+    Test that the results can be sorted by their stored average rating.
+    """
+    with test_client.application.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        datasets = [
+            DataSet(
+                user_id=user.id,
+                ds_meta_data=DSMetaData(
+                    title=f"Rated dataset {i}",
+                    description="Rated.",
+                    publication_type=PublicationType.REPORT,
+                    dataset_doi=f"10.1234/rated{i}",
+                )
+            )
+            for i in range(3)
+        ]
+        db.session.add_all(datasets)
+        db.session.commit()
+        for dataset, rating in zip(datasets, [2, 5, 3]):
+            SearchIndexService().index_dataset(dataset)
+            DSRatingService().add_or_update_rating(dataset.ds_meta_data_id, user.id, rating)
+
+    response = test_client.post('/explore', json={"query": "rated dataset", "sorting": "rating"})
+    assert response.status_code == 200
+    titles = [dataset['title'] for dataset in response.get_json() if dataset['title'].startswith("Rated")]
+    assert titles == ["Rated dataset 1", "Rated dataset 2", "Rated dataset 0"]
+
+
+def test_filter_paginates_across_tied_averages(test_client):
+    """
+    Test that datasets tied on an average that is not exact, such as 11/3, are neither skipped nor repeated when
+    the rating sort is paginated.
+    """
+    from sqlalchemy.dialects import mysql
+
+    # A single precision FLOAT is returned rounded by MySQL, so the cursor would not match the stored average
+    assert str(DSMetaData.__table__.c.rating.type.compile(dialect=mysql.dialect())) == "DOUBLE"
+
+    with test_client.application.app_context():
+        raters = [User(email=f"tied.rater{i}@example.com", password="password") for i in range(3)]
+        owner = User.query.filter_by(email='user@example.com').first()
+        datasets = [
+            DataSet(
+                user_id=owner.id,
+                ds_meta_data=DSMetaData(
+                    title=f"Tied dataset {i}",
+                    description="Tied.",
+                    publication_type=PublicationType.REPORT,
+                    dataset_doi=f"10.1234/tied{i}",
+                )
+            )
+            for i in range(5)
+        ]
+        db.session.add_all(raters + datasets)
+        db.session.commit()
+        for dataset in datasets:
+            SearchIndexService().index_dataset(dataset)
+            for rater, rating in zip(raters, [3, 4, 4]):
+                DSRatingService().add_or_update_rating(dataset.ds_meta_data_id, rater.id, rating)
+        expected = [dataset.id for dataset in ExploreService().filter(query="tied", sorting="rating")]
+
+    ids, cursor = [], None
+    while True:
+        response = test_client.post(
+            '/explore', json={"query": "tied", "sorting": "rating", "limit": 2, "cursor": cursor}
+        )
+        assert response.status_code == 200
+        page = response.get_json()
+        assert all(dataset['rating'] == 11 / 3 for dataset in page)
+        ids += [dataset['id'] for dataset in page]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+
+    assert len(expected) == 5
+    assert ids == expected
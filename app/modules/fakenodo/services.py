@@ -1,10 +1,12 @@
 import logging
 import os
+from typing import List
 
 from app.modules.dataset.models import DataSet
 from app.modules.fakenodo.models import Deposition
 from app.modules.fakenodo.repositories import DepositionRepository
 from app.modules.featuremodel.models import FeatureModel
+from app.modules.hubfile.services import calculate_file_digests
 
 from core.configuration.configuration import uploads_folder_name
 from dotenv import load_dotenv
@@ -86,19 +88,45 @@ class FakenodoService(BaseService):
             dict: The response in JSON format with the details of the uploaded file.
         """
         uvl_filename = feature_model.fm_meta_data.uvl_filename
-        user_id = current_user.id if user is None else user.id
-        file_path = os.path.join(uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}/", uvl_filename)
+
+        # The size and checksum were computed when the file was uploaded, the file is only read if they are missing
+        hubfile = next((file for file in feature_model.files if file.name == uvl_filename), None)
+        if hubfile is not None:
+            filesize, checksum = hubfile.size, hubfile.checksum
+        else:
+            user_id = current_user.id if user is None else user.id
+            file_path = os.path.join(
+                uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}/", uvl_filename
+            )
+            digests = calculate_file_digests(file_path)
+            filesize, checksum = digests.size, digests.md5
 
         response = {
             "id": deposition_id,
             "filename": uvl_filename,
-            "filesize": os.path.getsize(file_path),
-            "checksum": calculate_checksum(file_path),
+            "filesize": filesize,
+            "checksum": checksum,
             "message": "File uploaded successfully to fakenodo."
         }
 
         return response
 
+    def upload_files(self, dataset: DataSet, deposition_id: int, feature_models: List[FeatureModel],
+                     user=None) -> List[dict]:
+        """
+        Save the files of several feature models to a deposition in Fakenodo.
+
+        Args:
+            dataset (DataSet): The DataSet object the feature models belong to.
+            deposition_id (int): The ID of the deposition.
+            feature_models (List[FeatureModel]): The feature models whose files are saved.
+            user (User): The User object representing the file owner.
+
+        Returns:
+            List[dict]: The details of each uploaded file, in the order of the feature models.
+        """
+        return [self.upload_file(dataset, deposition_id, feature_model, user) for feature_model in feature_models]
+
     def publish_deposition(self, deposition_id: int) -> dict:
         """
         Publish a deposition in Fakenodo.
@@ -114,9 +142,9 @@ class FakenodoService(BaseService):
             raise Exception("Deposition not found")
 
         try:
-            deposition.doi = f"10.5281/fakenodo.{deposition_id}"
-            deposition.status = "published"
-            self.deposition_repository.update(deposition)
+            self.deposition_repository.update(
+                deposition_id, doi=f"10.5281/fakenodo.{deposition_id}", status="published"
+            )
 
             response = {
                 "id": deposition_id,
@@ -152,6 +180,31 @@ class FakenodoService(BaseService):
         }
         return response
 
+    def is_published(self, deposition: dict) -> bool:
+        """
+        Check whether a deposition has already been published in Fakenodo.
+
+        Args:
+            deposition (dict): The deposition as returned by get_deposition.
+
+        Returns:
+            bool: True if the deposition is published.
+        """
+        return deposition.get("status") == "published"
+
+    def get_uploaded_checksums(self, deposition: dict) -> dict:
+        """
+        Get the files already uploaded to a deposition. Fakenodo does not keep the files, so uploading them again
+        costs nothing and none is reported.
+
+        Args:
+            deposition (dict): The deposition as returned by get_deposition.
+
+        Returns:
+            dict: The MD5 of each uploaded file, keyed by its name.
+        """
+        return {}
+
     def get_doi(self, deposition_id: int) -> str:
         """
         Get the DOI of a deposition from Fakenodo.
@@ -163,12 +216,3 @@ class FakenodoService(BaseService):
             str: The DOI of the deposition.
         """
         return self.get_deposition(deposition_id).get("doi")
-
-
-def calculate_checksum(file_path):
-    import hashlib
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
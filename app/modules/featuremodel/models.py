@@ -1,3 +1,5 @@
+from enum import Enum
+
 from app import db
 from sqlalchemy import Enum as SQLAlchemyEnum
 
@@ -52,10 +54,37 @@ class FMMetaData(db.Model):
         return f'FMMetaData<{self.title}'
 
 
+class AnalysisStatus(Enum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
 class FMMetrics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    solver = db.Column(db.Text)
-    not_solver = db.Column(db.Text)
+    status = db.Column(SQLAlchemyEnum(AnalysisStatus), nullable=False, default=AnalysisStatus.PENDING)
+    status_updated_at = db.Column(db.DateTime)
+    checksum = db.Column(db.String(120))
+    core_features = db.Column(db.JSON)
+    dead_features = db.Column(db.JSON)
+    number_of_configurations = db.Column(db.BigInteger)
+    atomic_sets = db.Column(db.JSON)
+    max_depth = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    analyzed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'status': self.status.value,
+            'core_features': self.core_features,
+            'dead_features': self.dead_features,
+            'number_of_configurations': self.number_of_configurations,
+            'atomic_sets': self.atomic_sets,
+            'max_depth': self.max_depth,
+            'error': self.error,
+            'analyzed_at': self.analyzed_at.isoformat() if self.analyzed_at else None
+        }
 
     def __repr__(self):
-        return f'FMMetrics<solver={self.solver}, not_solver={self.not_solver}>'
+        return f'FMMetrics<{self.id}, {self.status}>'
@@ -1,7 +1,35 @@
-from flask import render_template
+from flask import jsonify, render_template
+from flask_login import login_required
+
 from app.modules.featuremodel import featuremodel_bp
+from app.modules.featuremodel.services import FeatureModelService
+
+feature_model_service = FeatureModelService()
 
 
 @featuremodel_bp.route('/featuremodel', methods=['GET'])
 def index():
     return render_template('featuremodel/index.html')
+
+
+@featuremodel_bp.route('/featuremodel/<int:feature_model_id>/metrics', methods=['GET'])
+def metrics(feature_model_id):
+    feature_model = feature_model_service.get_or_404(feature_model_id)
+    fm_metrics = feature_model_service.get_metrics(feature_model)
+    return jsonify({
+        'feature_model_id': feature_model.id,
+        'metrics': fm_metrics.to_dict() if fm_metrics else None
+    })
+
+
+@featuremodel_bp.route('/featuremodel/<int:feature_model_id>/analyze', methods=['POST'])
+@login_required
+def analyze(feature_model_id):
+    feature_model = feature_model_service.get_or_404(feature_model_id)
+    scheduled = feature_model_service.schedule_analysis([feature_model], force=False)
+    fm_metrics = feature_model_service.get_metrics(feature_model)
+    return jsonify({
+        'feature_model_id': feature_model.id,
+        'scheduled': bool(scheduled),
+        'metrics': fm_metrics.to_dict() if fm_metrics else None
+    }), 202
@@ -1,12 +1,38 @@
-from app.modules.featuremodel.repositories import FMMetaDataRepository, FeatureModelRepository
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from app.modules.dataset.services import MAX_NUMBER_OF_PRODUCTS, DataSetService
+from app.modules.featuremodel.models import AnalysisStatus, FMMetrics, FeatureModel
+from app.modules.featuremodel.repositories import FMMetaDataRepository, FMMetricsRepository, FeatureModelRepository
+from app.modules.flamapy.services import FlamapyService
 from app.modules.hubfile.services import HubfileService
+from app.modules.jobs.models import Job
+from app.modules.jobs.services import JobService, job_handler
 from core.services.BaseService import BaseService
 
+logger = logging.getLogger(__name__)
+
+# Seconds after which a pending or running analysis is considered abandoned (e.g. by a crashed worker)
+ANALYSIS_STALE_AFTER = int(os.getenv("FM_ANALYSIS_STALE_AFTER", 3600))
+
+ANALYZE_FEATURE_MODELS_JOB = "featuremodel.analyze"
+
+
+def is_stale(metrics: FMMetrics, now: datetime) -> bool:
+    updated_at = metrics.status_updated_at
+    if updated_at is None:
+        return True
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return updated_at < now - timedelta(seconds=ANALYSIS_STALE_AFTER)
+
 
 class FeatureModelService(BaseService):
     def __init__(self):
         super().__init__(FeatureModelRepository())
         self.hubfile_service = HubfileService()
+        self.fmmetrics_repository = FMMetricsRepository()
 
     def search_by_name(self, query):
         if not query:
@@ -22,6 +48,106 @@ class FeatureModelService(BaseService):
     def count_feature_models(self):
         return self.repository.count_feature_models()
 
+    def get_metrics(self, feature_model: FeatureModel) -> FMMetrics:
+        return feature_model.fm_meta_data.fm_metrics if feature_model.fm_meta_data else None
+
+    def schedule_analysis(self, feature_models: list, force: bool = True) -> list:
+        """
+        Mark the metrics of the given feature models as pending and queue a job that analyses them in the workers.
+
+        Without ``force``, models whose analysis is up to date with their UVL file, or queued or running since less
+        than FM_ANALYSIS_STALE_AFTER seconds ago, are skipped.
+
+        Returns:
+            list: The ids of the feature models that were scheduled.
+        """
+        scheduled = []
+        now = datetime.now(timezone.utc)
+        for feature_model in feature_models:
+            if not feature_model.files or not feature_model.fm_meta_data:
+                continue
+
+            metrics = feature_model.fm_meta_data.fm_metrics
+            if metrics is None:
+                metrics = self.fmmetrics_repository.create(commit=False)
+                feature_model.fm_meta_data.fm_metrics = metrics
+            elif not force and (
+                (metrics.status in (AnalysisStatus.PENDING, AnalysisStatus.RUNNING) and not is_stale(metrics, now))
+                or (metrics.status == AnalysisStatus.DONE and metrics.checksum == feature_model.files[0].checksum)
+            ):
+                continue
+
+            metrics.status = AnalysisStatus.PENDING
+            metrics.status_updated_at = now
+            scheduled.append(feature_model.id)
+
+        self.repository.session.commit()
+
+        if scheduled:
+            data_set = feature_models[0].data_set
+            JobService().enqueue(
+                ANALYZE_FEATURE_MODELS_JOB,
+                {"feature_model_ids": scheduled},
+                user_id=data_set.user_id if data_set else None,
+            )
+        return scheduled
+
+    def analyze(self, feature_model_ids: list):
+        """
+        Analyse the UVL files of the given feature models with the flamapy worker pool and store their metrics.
+
+        The number of configurations is shared with the product count store, so the number of products of the
+        datasets of the analysed models is filled in from the same counts.
+        """
+        jobs = []
+        datasets = {}
+        for feature_model_id in feature_model_ids:
+            feature_model = self.repository.get_by_id(feature_model_id)
+            metrics = self.get_metrics(feature_model) if feature_model else None
+            if metrics is None or not feature_model.files:
+                continue
+            hubfile = feature_model.files[0]
+            metrics.status = AnalysisStatus.RUNNING
+            metrics.status_updated_at = datetime.now(timezone.utc)
+            datasets[feature_model.data_set_id] = feature_model.data_set
+            jobs.append((metrics, hubfile.get_path(), hubfile.checksum))
+        self.repository.session.commit()
+
+        results = FlamapyService().analyze_uvl_files([(path, checksum) for _, path, checksum in jobs])
+
+        for metrics, path, checksum in jobs:
+            result = results[path]
+            metrics.checksum = checksum
+            metrics.analyzed_at = datetime.now(timezone.utc)
+            metrics.status_updated_at = metrics.analyzed_at
+            metrics.error = result["error"]
+            if result["error"]:
+                logger.error(f"Error analysing {path}: {result['error']}")
+                metrics.status = AnalysisStatus.FAILED
+                continue
+            metrics.core_features = result["core_features"]
+            metrics.dead_features = result["dead_features"]
+            number_of_configurations = result["number_of_configurations"]
+            if number_of_configurations is not None and number_of_configurations > MAX_NUMBER_OF_PRODUCTS:
+                number_of_configurations = None
+            metrics.number_of_configurations = number_of_configurations
+            metrics.atomic_sets = result["atomic_sets"]
+            metrics.max_depth = result["max_depth"]
+            metrics.status = AnalysisStatus.DONE
+        self.repository.session.commit()
+
+        dataset_service = DataSetService()
+        for dataset in datasets.values():
+            if dataset is not None:
+                dataset_service.update_number_of_products(dataset, compute_missing=False)
+
     class FMMetaDataService(BaseService):
         def __init__(self):
             super().__init__(FMMetaDataRepository())
+
+
+@job_handler(ANALYZE_FEATURE_MODELS_JOB)
+def analyze_feature_models(job: Job) -> dict:
+    feature_model_ids = job.payload["feature_model_ids"]
+    FeatureModelService().analyze(feature_model_ids)
+    return {"feature_model_ids": feature_model_ids}
@@ -1,5 +1,11 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
 import pytest
 
+from app.modules.featuremodel.models import AnalysisStatus, FMMetrics
+from app.modules.featuremodel.services import FeatureModelService
+
 
 @pytest.fixture(scope='module')
 def test_client(test_client):
@@ -22,3 +28,87 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_analyze_stores_metrics(test_client):
+    """
+    Checks that the analysis results are stored on FMMetrics and that failures are recorded as such.
+    """
+    service = FeatureModelService()
+    feature_models = {}
+    for feature_model_id, path in [(1, "ok.uvl"), (2, "broken.uvl")]:
+        hubfile = MagicMock(checksum=f"checksum{feature_model_id}")
+        hubfile.get_path.return_value = path
+        feature_models[feature_model_id] = MagicMock(
+            id=feature_model_id, files=[hubfile], fm_meta_data=MagicMock(fm_metrics=FMMetrics())
+        )
+
+    results = {
+        "ok.uvl": {
+            "core_features": ["Root"], "dead_features": [], "number_of_configurations": 2 ** 70,
+            "atomic_sets": [["Root"], ["A"]], "max_depth": 1, "error": None
+        },
+        "broken.uvl": {"error": "Parsing failed due to syntax errors."},
+    }
+
+    with test_client.application.app_context(), \
+            patch.object(service.repository, 'get_by_id', side_effect=feature_models.get), \
+            patch.object(service.repository, 'session'), \
+            patch('app.modules.featuremodel.services.FlamapyService.analyze_uvl_files', return_value=results), \
+            patch('app.modules.featuremodel.services.DataSetService.update_number_of_products') as update:
+        service.analyze([1, 2])
+
+    ok_metrics = feature_models[1].fm_meta_data.fm_metrics
+    assert ok_metrics.status == AnalysisStatus.DONE
+    assert ok_metrics.core_features == ["Root"]
+    assert ok_metrics.number_of_configurations is None
+    assert ok_metrics.checksum == "checksum1"
+    assert ok_metrics.status_updated_at == ok_metrics.analyzed_at
+    update.assert_any_call(feature_models[1].data_set, compute_missing=False)
+
+    broken_metrics = feature_models[2].fm_meta_data.fm_metrics
+    assert broken_metrics.status == AnalysisStatus.FAILED
+    assert broken_metrics.error == "Parsing failed due to syntax errors."
+
+
+def test_schedule_analysis_retries_stale_analyses(test_client):
+    """
+    Checks that without force a recent pending analysis is skipped while one abandoned by a crash is retried.
+    """
+    service = FeatureModelService()
+    now = datetime.now(timezone.utc)
+    feature_models = []
+    for feature_model_id, updated_at in [(1, now), (2, now - timedelta(days=1)), (3, None)]:
+        metrics = FMMetrics(status=AnalysisStatus.RUNNING, status_updated_at=updated_at)
+        feature_models.append(
+            MagicMock(id=feature_model_id, files=[MagicMock()], fm_meta_data=MagicMock(fm_metrics=metrics))
+        )
+
+    with test_client.application.app_context(), \
+            patch.object(service.repository, 'session'), \
+            patch('app.modules.featuremodel.services.JobService.enqueue') as enqueue:
+        scheduled = service.schedule_analysis(feature_models, force=False)
+
+    assert scheduled == [2, 3]
+    enqueue.assert_called_once_with(
+        "featuremodel.analyze", {"feature_model_ids": [2, 3]}, user_id=feature_models[0].data_set.user_id
+    )
+    assert feature_models[1].fm_meta_data.fm_metrics.status == AnalysisStatus.PENDING
+    assert feature_models[1].fm_meta_data.fm_metrics.status_updated_at > now - timedelta(minutes=1)
+
+
+def test_analysis_job_runs_in_the_workers(test_client):
+    """
+    Checks that the queued analysis is run by the job workers, which persist it and retry it if a worker dies.
+    """
+    from app.modules.jobs.models import Job, JobStatus
+    from app.modules.jobs.services import JobService
+
+    with test_client.application.app_context(), \
+            patch.object(FeatureModelService, 'analyze') as analyze:
+        job = JobService().enqueue("featuremodel.analyze", {"feature_model_ids": [4, 5]})
+        job_id = job.id
+        JobService().work(burst=True)
+        job = JobService().repository.get_by_id(job_id)
+        assert isinstance(job, Job) and job.status == JobStatus.DONE
+    analyze.assert_called_once_with([4, 5])
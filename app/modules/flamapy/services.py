@@ -1,7 +1,865 @@
-from app.modules.flamapy.repositories import FlamapyRepository
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from importlib.metadata import PackageNotFoundError, version
+from typing import Optional
+
+from antlr4 import CommonTokenStream, FileStream
+from antlr4.error.ErrorListener import ErrorListener
+from flamapy.metamodels.fm_metamodel.models import FeatureModel
+from flamapy.metamodels.fm_metamodel.operations import FMAtomicSets, FMMaxDepthTree
+from flamapy.metamodels.pysat_metamodel.operations import PySATCoreFeatures, PySATDeadFeatures
+from pysat.solvers import Solver
+from uvl.UVLCustomLexer import UVLCustomLexer
+from uvl.UVLPythonParser import UVLPythonParser
+from flamapy.metamodels.fm_metamodel.transformations import UVLReader, GlencoeWriter, SPLOTWriter
+from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat, DimacsWriter
+
+try:
+    import dd.cudd as _bdd
+except ImportError:
+    import dd.autoref as _bdd
+
+from app.modules.hubfile.models import Hubfile
+from app.modules.hubfile.repositories import HubfileRepository
+from app.modules.hubfile.services import calculate_file_digests
+from core.cache.file_cache import FileCache
+from core.configuration.configuration import cache_folder_name
 from core.services.BaseService import BaseService
 
+logger = logging.getLogger(__name__)
+
+
+CONVERSION_EXTENSIONS = {
+    "Glencoe": ".glencoe",
+    "SPLOT": ".splot",
+    "Dinamacs": ".dinamacs",
+}
+
+
+def get_flamapy_version() -> str:
+    try:
+        return version("flamapy-fw")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def get_conversion_workers() -> int:
+    return int(os.getenv("FLAMAPY_WORKERS", os.cpu_count() or 1))
+
+
+def get_conversion_timeout() -> int:
+    return int(os.getenv("FLAMAPY_TIMEOUT", 60))
+
+
+class InlineExecutor(Executor):
+    """
+    Executor that runs every call in the calling thread as soon as it is submitted.
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+def is_monkey_patched() -> bool:
+    """
+    Whether gevent has monkey-patched this process, as importing locust does.
+    """
+    monkey = sys.modules.get("gevent.monkey")
+    return bool(monkey and monkey.is_module_patched("threading"))
+
+
+def get_pool_context():
+    """
+    Start method of the flamapy worker processes.
+
+    The web and job processes run threads (lease heartbeats, background refreshes, the event buffer) and forking
+    them copies whatever locks those threads hold, so workers are forked from a forkserver that has only imported
+    this module, or spawned where there is no forkserver.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def process_pool(max_workers: int) -> Executor:
+    """
+    Pool of ``max_workers`` processes for flamapy operations.
+
+    Under gevent the management thread of a process pool is a greenlet that nothing wakes up, and waiting on its
+    futures raises LoopExit, so the calls run inline instead.
+    """
+    if is_monkey_patched():
+        return InlineExecutor()
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=get_pool_context())
+
+
+# Seconds a pool call may run past its own timeout before its worker is considered hung
+POOL_TIMEOUT_GRACE = int(os.getenv("FLAMAPY_TIMEOUT_GRACE", 10))
+
+
+def get_pool_result(executor: Executor, future: Future, timeout: int):
+    """
+    Wait for the result of a pool call that bounds itself with ``timeout`` seconds of SIGALRM.
+
+    The alarm cannot interrupt a long call into C code (a BDD operation, the SAT solver), so a call still running
+    ``POOL_TIMEOUT_GRACE`` seconds later is hung: the workers of ``executor`` are terminated, the calls still
+    pending fail with BrokenProcessPool and TimeoutError is raised for this one. Results are awaited in submission
+    order, so by then the call has had its turn at a worker.
+    """
+    try:
+        return future.result(timeout=timeout + POOL_TIMEOUT_GRACE)
+    except FutureTimeoutError:
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        raise TimeoutError(f"timed out after {timeout} seconds")
+
+
+class FeatureModelCache:
+    """
+    Parsed feature models keyed by UVL checksum.
+
+    Parsing UVL with the pure-Python ANTLR runtime dominates every flamapy operation, so parsed models are kept in
+    an in-process LRU of FM_CACHE_SIZE entries and, unless FM_DISK_CACHE_MAX_SIZE is 0, pickled to disk so other
+    processes (the conversion pool workers included) can load them without parsing. Cached models are shared and
+    must be treated as read-only.
+
+    Unpickling runs code, so every pickle is stored with an HMAC of its name and content under FM_CACHE_KEY (or
+    SECRET_KEY) and a pickle whose HMAC does not match is discarded unread. Without a key the disk cache is off.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, disk_cache: Optional[FileCache] = None,
+                 signing_key: Optional[bytes] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("FM_CACHE_SIZE", 64))
+        self._disk_cache = disk_cache
+        self._signing_key = signing_key
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def signing_key(self) -> Optional[bytes]:
+        if self._signing_key is None:
+            key = os.getenv("FM_CACHE_KEY") or os.getenv("SECRET_KEY")
+            self._signing_key = key.encode("utf-8") if key else b""
+        return self._signing_key or None
+
+    def sign(self, filename: str, data: bytes) -> bytes:
+        return hmac.new(self.signing_key, filename.encode("utf-8") + b"\0" + data, hashlib.sha256).digest()
+
+    @property
+    def disk_cache(self) -> Optional[FileCache]:
+        if self._disk_cache is None:
+            if not self.signing_key:
+                return None
+            max_size = int(os.getenv("FM_DISK_CACHE_MAX_SIZE", 256 * 1024 ** 2))
+            if not max_size:
+                return None
+            folder = os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "feature_models")
+            self._disk_cache = FileCache(folder, max_size)
+        return self._disk_cache
+
+    def filename(self, checksum: str) -> str:
+        return f"{checksum}-{get_flamapy_version()}.pickle"
+
+    def get(self, uvl_file_path: str, checksum: Optional[str] = None) -> FeatureModel:
+        """
+        Return the parsed feature model of ``uvl_file_path``, parsing it only if it is not cached yet.
+
+        Parse errors are raised as they come from flamapy and nothing is cached for them.
+        """
+        checksum = checksum or calculate_file_digests(uvl_file_path).md5
+
+        with self._lock:
+            if checksum in self._models:
+                self._models.move_to_end(checksum)
+                return self._models[checksum]
+
+        fm = self._load(checksum)
+        if fm is None:
+            fm = UVLReader(uvl_file_path).transform()
+            self._dump(checksum, fm)
+
+        with self._lock:
+            self._models[checksum] = fm
+            self._models.move_to_end(checksum)
+            while len(self._models) > self.max_entries:
+                self._models.popitem(last=False)
+        return fm
+
+    def contains(self, checksum: str) -> bool:
+        """
+        Whether the model with ``checksum`` was already parsed, by this process or another one.
+        """
+        with self._lock:
+            if checksum in self._models:
+                return True
+        return self._read(checksum) is not None
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def _read(self, checksum: str) -> Optional[bytes]:
+        """
+        The pickled model stored for ``checksum``, once its signature is checked.
+        """
+        disk_cache = self.disk_cache
+        if not disk_cache or not self.signing_key:
+            return None
+        filename = self.filename(checksum)
+        path = disk_cache.get(filename)
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as file:
+                signature, data = file.read(hashlib.sha256().digest_size), file.read()
+        except OSError:
+            return None
+        if not hmac.compare_digest(signature, self.sign(filename, data)):
+            logger.warning(f"Discarding cached feature model {path} with a wrong signature")
+            disk_cache.remove(filename)
+            return None
+        return data
+
+    def _load(self, checksum: str) -> Optional[FeatureModel]:
+        data = self._read(checksum)
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception as exc:
+            logger.warning(f"Discarding unreadable cached feature model {checksum}: {exc}")
+            self.disk_cache.remove(self.filename(checksum))
+            return None
+
+    def _dump(self, checksum: str, fm: FeatureModel):
+        disk_cache = self.disk_cache
+        if not disk_cache or not self.signing_key:
+            return
+        filename = self.filename(checksum)
+        try:
+            data = pickle.dumps(fm, protocol=pickle.HIGHEST_PROTOCOL)
+            disk_cache.put(filename, self.sign(filename, data) + data)
+        except Exception as exc:
+            logger.warning(f"Could not store the parsed feature model {checksum}: {exc}")
+
+
+feature_model_cache = FeatureModelCache()
+
+
+def get_count_timeout() -> int:
+    return int(os.getenv("FLAMAPY_COUNT_TIMEOUT", 60))
+
+
+def get_count_max_nodes() -> int:
+    return int(os.getenv("FLAMAPY_COUNT_MAX_NODES", 5_000_000))
+
+
+class CountBudgetExceeded(Exception):
+    pass
+
+
+def _count_with_bdd(clauses: list, variables: list, feature_variables: set, deadline: float, max_nodes: int) -> int:
+    bdd = _bdd.BDD()
+    bdd.declare(*(f"x{variable}" for variable in variables))
+
+    root = bdd.true
+    for clause in clauses:
+        if time.monotonic() > deadline:
+            raise CountBudgetExceeded("BDD construction ran out of time")
+        disjunction = bdd.false
+        for literal in clause:
+            node = bdd.var(f"x{abs(literal)}")
+            disjunction = disjunction | (~node if literal < 0 else node)
+        root = root & disjunction
+        if len(bdd) > max_nodes:
+            raise CountBudgetExceeded(f"BDD exceeded {max_nodes} nodes")
+
+    auxiliary = [f"x{variable}" for variable in variables if variable not in feature_variables]
+    if auxiliary:
+        root = bdd.exist(auxiliary, root)
+
+    # dd.cudd counts with doubles, so the exact count is computed with Python integers over the BDD nodes
+    levels = len(variables)
+
+    def level(node):
+        return levels if node == bdd.true or node == bdd.false else node.level
+
+    counts = {}
+
+    def count(node):
+        if node == bdd.true:
+            return 1
+        if node == bdd.false:
+            return 0
+        return counts[int(node)]
+
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        if node == bdd.true or node == bdd.false or int(node) in counts:
+            stack.pop()
+            continue
+        low, high = (~node.low, ~node.high) if node.negated else (node.low, node.high)
+        pending = [child for child in (low, high)
+                   if child != bdd.true and child != bdd.false and int(child) not in counts]
+        if pending:
+            stack.extend(pending)
+            continue
+        counts[int(node)] = (count(low) * 2 ** (level(low) - node.level - 1)
+                             + count(high) * 2 ** (level(high) - node.level - 1))
+        stack.pop()
+
+    # Quantified auxiliary variables are free in the root, so each one doubles the count
+    return count(root) * 2 ** level(root) // 2 ** len(auxiliary)
+
+
+def _count_with_sat(clauses: list, feature_variables: set, deadline: float) -> int:
+    count = 0
+    with Solver(name="glucose3", bootstrap_with=clauses) as solver:
+        while solver.solve():
+            if time.monotonic() > deadline:
+                raise CountBudgetExceeded("SAT enumeration ran out of time")
+            count += 1
+            solver.add_clause([-literal for literal in solver.get_model() if abs(literal) in feature_variables])
+    return count
+
+
+def count_configurations(fm: FeatureModel, timeout: int = None, max_nodes: int = None) -> Optional[int]:
+    """
+    Count the exact number of products (valid configurations) of a feature model.
+
+    The count is done by model counting on a BDD built from the CNF of the model. If the BDD grows past
+    ``max_nodes`` or cannot be built, the configurations are enumerated with a SAT solver instead. Both share
+    the ``timeout`` budget.
+
+    :param fm: Parsed feature model.
+    :param timeout: Maximum number of seconds (FLAMAPY_COUNT_TIMEOUT by default).
+    :param max_nodes: Maximum number of BDD nodes (FLAMAPY_COUNT_MAX_NODES by default).
+    :return: Number of products, or None if the budget was exceeded.
+    """
+    deadline = time.monotonic() + (timeout or get_count_timeout())
+    sat = FmToPysat(fm).transform()
+    clauses = sat.get_all_clauses().clauses
+    variables = sorted(set(sat.variables.values()) | {abs(literal) for clause in clauses for literal in clause})
+    feature_variables = set(sat.features)
+
+    try:
+        return _count_with_bdd(clauses, variables, feature_variables, deadline, max_nodes or get_count_max_nodes())
+    except CountBudgetExceeded as exc:
+        logger.warning(f"BDD product count aborted: {exc}")
+        if time.monotonic() > deadline:
+            return None
+    except Exception as exc:
+        logger.warning(f"BDD product count failed, falling back to SAT: {exc}")
+
+    try:
+        return _count_with_sat(clauses, feature_variables, deadline)
+    except CountBudgetExceeded as exc:
+        logger.warning(f"SAT product count aborted: {exc}")
+        return None
+
+
+def count_uvl_products(uvl_file_path: str, checksum: str = None, timeout: int = None) -> Optional[int]:
+    """
+    Count the products of a UVL file. It runs inside the counting pool workers, where besides the budget checked by
+    the counting itself, parsing and counting are bounded by ``timeout`` seconds of SIGALRM.
+    """
+    timeout = timeout or get_count_timeout()
+    try:
+        with _time_limit(timeout):
+            return count_configurations(feature_model_cache.get(uvl_file_path, checksum), timeout)
+    except Exception as exc:
+        logger.error(f"Error counting the products of {uvl_file_path}: {exc}")
+        return None
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError("timed out")
+
+
+@contextmanager
+def _time_limit(timeout: Optional[int]):
+    """
+    Raise TimeoutError after ``timeout`` seconds. SIGALRM only works in the main thread, which is where the pool
+    workers run; elsewhere the block runs unbounded.
+    """
+    use_alarm = timeout and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def convert_uvl(uvl_file_path: str, output_formats: list, output_dir: str, timeout: int = None,
+                checksum: str = None) -> dict:
+    """
+    Convert a UVL file to several formats (Glencoe, SPLOT, Dinamacs).
+
+    The UVL is parsed once and every format is written to ``output_dir``. A failing format does not prevent the
+    others from being written. This function runs inside the conversion pool workers, so the timeout is enforced
+    with SIGALRM when called from a main thread.
+
+    :param uvl_file_path: Path of the UVL file.
+    :param output_formats: Formats to convert to.
+    :param output_dir: Folder where the converted files are written.
+    :param timeout: Maximum number of seconds allowed for the whole file.
+    :param checksum: Checksum of the UVL file, used to look up its parsed model (computed when missing).
+    :return: Dictionary with the converted file paths under "files" and the error messages under "errors".
+    """
+    result = {"files": {}, "errors": {}}
+
+    try:
+        with _time_limit(timeout):
+            fm = feature_model_cache.get(uvl_file_path, checksum)
+            base_name = os.path.splitext(os.path.basename(uvl_file_path))[0]
+
+            for format_name in output_formats:
+                try:
+                    if format_name not in CONVERSION_EXTENSIONS:
+                        raise ValueError(f"Formato no soportado: {format_name}")
+                    output_file_path = os.path.join(output_dir, base_name + CONVERSION_EXTENSIONS[format_name])
+
+                    if format_name == "Glencoe":
+                        GlencoeWriter(output_file_path, fm).transform()
+                    elif format_name == "SPLOT":
+                        SPLOTWriter(output_file_path, fm).transform()
+                    elif format_name == "Dinamacs":
+                        sat = FmToPysat(fm).transform()
+                        DimacsWriter(output_file_path, sat).transform()
+
+                    result["files"][format_name] = output_file_path
+                except TimeoutError:
+                    raise
+                except Exception as exc:
+                    result["errors"][format_name] = str(exc)
+    except Exception as exc:
+        for format_name in output_formats:
+            if format_name not in result["files"]:
+                result["errors"][format_name] = str(exc) or exc.__class__.__name__
+
+    return result
+
+
+def get_validation_timeout() -> int:
+    return int(os.getenv("FLAMAPY_VALIDATION_TIMEOUT", 60))
+
+
+class UVLErrorListener(ErrorListener):
+    def __init__(self):
+        self.errors = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append(f"Line {line}:{column} - {msg}")
+
+
+def locate_uvl_errors(uvl_file_path: str) -> list:
+    """
+    Parse a UVL file with the UVL grammar and return its syntax errors with their line and column.
+    """
+    error_listener = UVLErrorListener()
+
+    lexer = UVLCustomLexer(FileStream(uvl_file_path, encoding="utf-8"))
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(error_listener)
+
+    parser = UVLPythonParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(error_listener)
+    parser.featureModel()
+
+    return error_listener.errors
+
+
+def validate_uvl(uvl_file_path: str, checksum: str = None, timeout: int = None) -> dict:
+    """
+    Check that flamapy can read a UVL file.
+
+    A valid model is parsed once and left in the feature model cache for its conversions and analyses. Only a
+    model that cannot be read is parsed again with the UVL grammar, to report where it is broken.
+
+    :param uvl_file_path: Path of the UVL file.
+    :param checksum: Checksum of the UVL file, used to look up its parsed model (computed when missing).
+    :param timeout: Maximum number of seconds for the validation (FLAMAPY_VALIDATION_TIMEOUT by default).
+    :return: Dictionary with whether the file is valid under "valid" and its error messages under "errors".
+    """
+    timeout = timeout or get_validation_timeout()
+    try:
+        with _time_limit(timeout):
+            try:
+                feature_model_cache.get(uvl_file_path, checksum)
+                return {"valid": True, "errors": []}
+            except TimeoutError:
+                raise
+            except Exception as exc:
+                read_error = str(exc) or exc.__class__.__name__
+            return {"valid": False, "errors": locate_uvl_errors(uvl_file_path) or [read_error]}
+    except Exception as exc:
+        return {"valid": False, "errors": [str(exc) or exc.__class__.__name__]}
+
+
+def get_analysis_timeout() -> int:
+    return int(os.getenv("FLAMAPY_ANALYSIS_TIMEOUT", 120))
+
+
+def analyze_uvl(uvl_file_path: str, checksum: str = None, timeout: int = None,
+                number_of_configurations: int = None) -> dict:
+    """
+    Analyse a UVL file: core features, dead features, number of configurations, atomic sets and maximum depth.
+
+    Runs inside the analysis pool workers, where the whole analysis is bounded by ``timeout`` seconds.
+
+    :param uvl_file_path: Path of the UVL file.
+    :param checksum: Checksum of the UVL file, used to look up its parsed model (computed when missing).
+    :param timeout: Maximum number of seconds for the whole analysis (FLAMAPY_ANALYSIS_TIMEOUT by default).
+    :param number_of_configurations: Number of configurations already known, counted when missing.
+    :return: Dictionary with the metrics, or with the error message under "error".
+    """
+    timeout = timeout or get_analysis_timeout()
+    try:
+        with _time_limit(timeout):
+            fm = feature_model_cache.get(uvl_file_path, checksum)
+            sat = FmToPysat(fm).transform()
+            return {
+                "core_features": sorted(PySATCoreFeatures().execute(sat).get_result()),
+                "dead_features": sorted(PySATDeadFeatures().execute(sat).get_result()),
+                "number_of_configurations": (
+                    number_of_configurations if number_of_configurations is not None
+                    else count_configurations(fm, timeout)
+                ),
+                "atomic_sets": sorted(
+                    sorted(feature.name for feature in atomic_set)
+                    for atomic_set in FMAtomicSets().execute(fm).get_result()
+                ),
+                "max_depth": FMMaxDepthTree().execute(fm).get_result(),
+                "error": None,
+            }
+    except Exception as exc:
+        return {"error": str(exc) or exc.__class__.__name__}
+
+
+class ConversionArtifactStore(FileCache):
+    """
+    On-disk store of converted feature models keyed by (UVL checksum, target format, flamapy version).
+
+    Conversions are deterministic, so an artifact is computed once, either on first use or eagerly when a dataset
+    is published, and served directly afterwards. The store is bounded by CONVERSION_CACHE_MAX_SIZE bytes.
+    """
+
+    def __init__(self, folder: Optional[str] = None, max_size: Optional[int] = None):
+        super().__init__(
+            folder or os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "conversions"),
+            max_size if max_size is not None else int(os.getenv("CONVERSION_CACHE_MAX_SIZE", 1024 ** 3)),
+        )
+        self.flamapy_version = get_flamapy_version()
+
+    def filename(self, checksum: str, format_name: str) -> str:
+        return f"{checksum}-{format_name.lower()}-{self.flamapy_version}{CONVERSION_EXTENSIONS[format_name]}"
+
+    def get_artifact(self, checksum: str, format_name: str) -> Optional[str]:
+        return self.get(self.filename(checksum, format_name))
+
+    def put_artifact(self, checksum: str, format_name: str, source_path: str) -> str:
+        return self.put_file(self.filename(checksum, format_name), source_path)
+
+
+class ProductCountStore(FileCache):
+    """
+    On-disk store of exact product counts keyed by (UVL checksum, flamapy version).
+    """
+
+    def __init__(self, folder: Optional[str] = None, max_size: Optional[int] = None):
+        super().__init__(
+            folder or os.path.join(os.getenv("WORKING_DIR", ""), cache_folder_name(), "product_counts"),
+            max_size if max_size is not None else int(os.getenv("PRODUCT_COUNT_CACHE_MAX_SIZE", 16 * 1024 ** 2)),
+        )
+        self.flamapy_version = get_flamapy_version()
+
+    def filename(self, checksum: str) -> str:
+        return f"{checksum}-{self.flamapy_version}.count"
+
+    def get_count(self, checksum: str) -> Optional[int]:
+        path = self.get(self.filename(checksum))
+        if not path:
+            return None
+        with open(path) as file:
+            return int(file.read())
+
+    def put_count(self, checksum: str, count: int):
+        self.put(self.filename(checksum), str(count).encode("utf-8"))
+
 
 class FlamapyService(BaseService):
     def __init__(self):
-        super().__init__(FlamapyRepository())
+        super().__init__(HubfileRepository())
+        self.artifact_store = ConversionArtifactStore()
+        self.product_count_store = ProductCountStore()
+
+    def get_feature_model(self, hubfile: Hubfile) -> FeatureModel:
+        return feature_model_cache.get(hubfile.get_path(), hubfile.checksum)
+
+    def get_conversion(self, hubfile: Hubfile, format_name: str) -> str:
+        """
+        Return the path of ``hubfile`` converted to ``format_name``, converting it only if it is not stored yet.
+        """
+        uvl_file_path = hubfile.get_path()
+        conversions = self.get_conversions([(uvl_file_path, hubfile.checksum)], [format_name], parallel=False)
+        result = conversions[uvl_file_path]
+        if format_name in result["errors"]:
+            raise ValueError(f"Error al convertir {hubfile.name} a {format_name}: {result['errors'][format_name]}")
+        return result["files"][format_name]
+
+    def get_conversions(self, uvl_files: list, output_formats: list, parallel: bool = True) -> dict:
+        """
+        Return the stored conversions of many UVL files, converting and storing the missing ones.
+
+        :param uvl_files: List of (UVL path, checksum) pairs.
+        :param output_formats: Formats to convert to (Glencoe, SPLOT, Dinamacs).
+        :param parallel: Whether missing conversions are spread across the process pool.
+        :return: Dictionary mapping every UVL path to its artifact paths ("files") and errors ("errors").
+        """
+        results = {}
+        missing = {}
+        for uvl_file_path, checksum in uvl_files:
+            results[uvl_file_path] = {"files": {}, "errors": {}}
+            for format_name in output_formats:
+                artifact = self.artifact_store.get_artifact(checksum, format_name)
+                if artifact:
+                    results[uvl_file_path]["files"][format_name] = artifact
+                else:
+                    missing.setdefault((uvl_file_path, checksum), []).append(format_name)
+
+        if not missing:
+            return results
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            if parallel:
+                missing_formats = sorted({format_name for formats in missing.values() for format_name in formats})
+                conversions = self.convert_uvl_files([path for path, _ in missing], missing_formats, output_dir)
+            else:
+                conversions = {
+                    path: convert_uvl(path, formats, output_dir, get_conversion_timeout(), checksum)
+                    for (path, checksum), formats in missing.items()
+                }
+
+            for (uvl_file_path, checksum), formats in missing.items():
+                conversion = conversions[uvl_file_path]
+                for format_name in formats:
+                    if format_name in conversion["files"]:
+                        results[uvl_file_path]["files"][format_name] = self.artifact_store.put_artifact(
+                            checksum, format_name, conversion["files"][format_name]
+                        )
+                    else:
+                        results[uvl_file_path]["errors"][format_name] = conversion["errors"].get(format_name)
+
+        return results
+
+    def convert_uvl_files(self, uvl_file_paths: list, output_formats: list, output_dir: str,
+                          max_workers: int = None, timeout: int = None) -> dict:
+        """
+        Convert many UVL files in parallel across a pool of processes.
+
+        Each file is written to its own subfolder of ``output_dir`` and gets its own timeout, so a slow or broken
+        model only affects its own result.
+
+        :param uvl_file_paths: Paths of the UVL files.
+        :param output_formats: Formats to convert to (Glencoe, SPLOT, Dinamacs).
+        :param output_dir: Folder where the converted files are written.
+        :param max_workers: Number of worker processes (FLAMAPY_WORKERS by default).
+        :param timeout: Maximum number of seconds per file (FLAMAPY_TIMEOUT by default).
+        :return: Dictionary mapping every UVL path to the result of ``convert_uvl``.
+        """
+        # A path given twice is converted once, its results would overwrite each other
+        uvl_file_paths = list(dict.fromkeys(uvl_file_paths))
+        if not uvl_file_paths:
+            return {}
+
+        max_workers = max_workers or get_conversion_workers()
+        timeout = timeout or get_conversion_timeout()
+        results = {}
+
+        with process_pool(min(max_workers, len(uvl_file_paths))) as executor:
+            futures = {}
+            for index, uvl_file_path in enumerate(uvl_file_paths):
+                file_output_dir = os.path.join(output_dir, str(index))
+                os.makedirs(file_output_dir, exist_ok=True)
+                futures[uvl_file_path] = executor.submit(
+                    convert_uvl, uvl_file_path, output_formats, file_output_dir, timeout
+                )
+
+            for uvl_file_path, future in futures.items():
+                try:
+                    results[uvl_file_path] = get_pool_result(executor, future, timeout)
+                except (BrokenProcessPool, TimeoutError) as exc:
+                    logger.error(f"Conversion worker died while converting {uvl_file_path}: {exc}")
+                    results[uvl_file_path] = {
+                        "files": {},
+                        "errors": {format_name: "conversion worker died" for format_name in output_formats},
+                    }
+
+        for uvl_file_path, result in results.items():
+            for format_name, error in result["errors"].items():
+                logger.error(f"Error al convertir {uvl_file_path} a {format_name}: {error}")
+
+        return results
+
+    def count_products(self, uvl_files: list, max_workers: int = None, timeout: int = None,
+                       compute_missing: bool = True) -> dict:
+        """
+        Count the products of many UVL files, reusing the counts already stored for their checksums.
+
+        Missing counts are computed across a pool of processes, so this should be called off the request thread.
+
+        :param uvl_files: List of (UVL path, checksum) pairs.
+        :param max_workers: Number of worker processes (FLAMAPY_WORKERS by default).
+        :param timeout: Maximum number of seconds per file (FLAMAPY_COUNT_TIMEOUT by default).
+        :param compute_missing: Whether counts that are not stored are computed or left as None.
+        :return: Dictionary mapping every UVL path to its number of products, or None if it could not be counted.
+        """
+        results = {}
+        missing = []
+        for uvl_file_path, checksum in uvl_files:
+            results[uvl_file_path] = self.product_count_store.get_count(checksum)
+            if results[uvl_file_path] is None:
+                missing.append((uvl_file_path, checksum))
+
+        if not missing or not compute_missing:
+            return results
+
+        max_workers = max_workers or get_conversion_workers()
+        timeout = timeout or get_count_timeout()
+        with process_pool(min(max_workers, len(missing))) as executor:
+            futures = {
+                (uvl_file_path, checksum): executor.submit(count_uvl_products, uvl_file_path, checksum, timeout)
+                for uvl_file_path, checksum in missing
+            }
+            for (uvl_file_path, checksum), future in futures.items():
+                try:
+                    results[uvl_file_path] = get_pool_result(executor, future, timeout)
+                except (BrokenProcessPool, TimeoutError) as exc:
+                    logger.error(f"Counting worker died while counting {uvl_file_path}: {exc}")
+                if results[uvl_file_path] is not None:
+                    self.product_count_store.put_count(checksum, results[uvl_file_path])
+
+        return results
+
+    def validate_uvl_files(self, uvl_files: list, max_workers: int = None, timeout: int = None) -> dict:
+        """
+        Validate many UVL files across a pool of processes, each with its own timeout.
+
+        Files whose model is already in the feature model cache were read before and are valid. The others are
+        always validated in worker processes, even a single one, so a model that hangs the parser or trips the
+        alarm never does it in a web worker.
+
+        :param uvl_files: List of (UVL path, checksum) pairs.
+        :param max_workers: Number of worker processes (FLAMAPY_WORKERS by default).
+        :param timeout: Maximum number of seconds per file (FLAMAPY_VALIDATION_TIMEOUT by default).
+        :return: Dictionary mapping every UVL path to the result of ``validate_uvl``.
+        """
+        results = {}
+        pending = []
+        for uvl_file_path, checksum in uvl_files:
+            if checksum and feature_model_cache.contains(checksum):
+                results[uvl_file_path] = {"valid": True, "errors": []}
+            else:
+                pending.append((uvl_file_path, checksum))
+        uvl_files = pending
+        if not uvl_files:
+            return results
+
+        timeout = timeout or get_validation_timeout()
+        max_workers = max_workers or get_conversion_workers()
+
+        with process_pool(min(max_workers, len(uvl_files))) as executor:
+            futures = {
+                uvl_file_path: executor.submit(validate_uvl, uvl_file_path, checksum, timeout)
+                for uvl_file_path, checksum in uvl_files
+            }
+            for uvl_file_path, future in futures.items():
+                try:
+                    results[uvl_file_path] = get_pool_result(executor, future, timeout)
+                except (BrokenProcessPool, TimeoutError) as exc:
+                    logger.error(f"Validation worker died while validating {uvl_file_path}: {exc}")
+                    results[uvl_file_path] = {"valid": False, "errors": ["validation worker died"]}
+
+        return results
+
+    def validate_hubfile(self, hubfile: Hubfile) -> dict:
+        """
+        Result of validating ``hubfile``, read from the file itself or, for files uploaded before uploads were
+        validated, computed once and stored.
+        """
+        if hubfile.valid is None:
+            uvl_file_path = hubfile.get_path()
+            result = self.validate_uvl_files([(uvl_file_path, hubfile.checksum)])[uvl_file_path]
+            hubfile.valid = result["valid"]
+            hubfile.errors = result["errors"]
+            self.repository.session.commit()
+        return {"valid": hubfile.valid, "errors": hubfile.errors or []}
+
+    def analyze_uvl_files(self, uvl_files: list, max_workers: int = None, timeout: int = None) -> dict:
+        """
+        Analyse many UVL files across a pool of processes, each with its own timeout.
+
+        The number of configurations is taken from the product count store when it was already counted, and the
+        counts computed by the analysis are stored there, so the products of a model are counted once.
+
+        :param uvl_files: List of (UVL path, checksum) pairs.
+        :param max_workers: Number of worker processes (FLAMAPY_WORKERS by default).
+        :param timeout: Maximum number of seconds per file (FLAMAPY_ANALYSIS_TIMEOUT by default).
+        :return: Dictionary mapping every UVL path to the result of ``analyze_uvl``.
+        """
+        if not uvl_files:
+            return {}
+
+        max_workers = max_workers or get_conversion_workers()
+        timeout = timeout or get_analysis_timeout()
+        results = {}
+        counts = {
+            uvl_file_path: self.product_count_store.get_count(checksum) if checksum else None
+            for uvl_file_path, checksum in uvl_files
+        }
+
+        with process_pool(min(max_workers, len(uvl_files))) as executor:
+            futures = {
+                uvl_file_path: executor.submit(analyze_uvl, uvl_file_path, checksum, timeout, counts[uvl_file_path])
+                for uvl_file_path, checksum in uvl_files
+            }
+            for uvl_file_path, future in futures.items():
+                try:
+                    results[uvl_file_path] = get_pool_result(executor, future, timeout)
+                except (BrokenProcessPool, TimeoutError) as exc:
+                    logger.error(f"Analysis worker died while analysing {uvl_file_path}: {exc}")
+                    results[uvl_file_path] = {"error": "analysis worker died"}
+
+        for uvl_file_path, checksum in uvl_files:
+            count = results[uvl_file_path].get("number_of_configurations")
+            if checksum and counts[uvl_file_path] is None and count is not None:
+                self.product_count_store.put_count(checksum, count)
+
+        return results
@@ -1,5 +1,30 @@
+import os
+import pickle
+import time
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
 import pytest
 
+from app.modules.flamapy.services import (
+    ConversionArtifactStore,
+    FeatureModelCache,
+    FlamapyService,
+    InlineExecutor,
+    ProductCountStore,
+    analyze_uvl,
+    convert_uvl,
+    count_configurations,
+    count_uvl_products,
+    feature_model_cache,
+    get_pool_result,
+    process_pool,
+    validate_uvl,
+)
+from core.cache.file_cache import FileCache
+
+UVL_EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'dataset', 'uvl_examples')
+
 
 @pytest.fixture(scope='module')
 def test_client(test_client):
@@ -22,3 +47,286 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_convert_uvl_files_in_parallel(tmp_path):
+    """
+    Converts several UVL files through the process pool and checks that a broken model only fails its own
+    conversions.
+    """
+    valid_uvl = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+    broken_uvl = tmp_path / "broken.uvl"
+    broken_uvl.write_text("features\n    Root\n        this is not uvl {{{\n")
+
+    results = FlamapyService().convert_uvl_files(
+        [valid_uvl, str(broken_uvl), valid_uvl], ["Glencoe", "SPLOT", "Dinamacs"], str(tmp_path), max_workers=2
+    )
+
+    assert list(results) == [valid_uvl, str(broken_uvl)]
+    assert results[valid_uvl]["errors"] == {}
+    for format_name in ["Glencoe", "SPLOT", "Dinamacs"]:
+        assert os.path.getsize(results[valid_uvl]["files"][format_name]) > 0
+
+    assert results[str(broken_uvl)]["files"] == {}
+    assert set(results[str(broken_uvl)]["errors"]) == {"Glencoe", "SPLOT", "Dinamacs"}
+
+
+def test_pools_run_inline_under_gevent(tmp_path):
+    """
+    Checks that a process monkey-patched by gevent converts without starting a process pool.
+    """
+    valid_uvl = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+
+    with patch('app.modules.flamapy.services.is_monkey_patched', return_value=True), \
+            patch('app.modules.flamapy.services.ProcessPoolExecutor') as executor, \
+            patch('app.modules.flamapy.services.InlineExecutor', wraps=InlineExecutor) as inline:
+        results = FlamapyService().convert_uvl_files([valid_uvl], ["SPLOT"], str(tmp_path))
+
+    executor.assert_not_called()
+    inline.assert_called_once()
+    assert os.path.getsize(results[valid_uvl]["files"]["SPLOT"]) > 0
+
+
+def test_convert_uvl_unsupported_format(tmp_path):
+    """
+    Checks that an unsupported format is reported as an error without affecting the other formats.
+    """
+    result = convert_uvl(os.path.join(UVL_EXAMPLES_DIR, "file1.uvl"), ["SPLOT", "Unknown"], str(tmp_path))
+
+    assert list(result["files"]) == ["SPLOT"]
+    assert list(result["errors"]) == ["Unknown"]
+
+
+def test_conversions_are_served_from_the_artifact_store(tmp_path):
+    """
+    Checks that a conversion is computed once, stored by checksum and served from the store afterwards.
+    """
+    uvl_file_path = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+    service = FlamapyService()
+    service.artifact_store = ConversionArtifactStore(folder=str(tmp_path / "conversions"), max_size=1024 ** 2)
+
+    first = service.get_conversions([(uvl_file_path, "abc123")], ["Glencoe", "SPLOT"], parallel=False)
+    glencoe_path = first[uvl_file_path]["files"]["Glencoe"]
+    assert first[uvl_file_path]["errors"] == {}
+    assert glencoe_path == service.artifact_store.get_artifact("abc123", "Glencoe")
+    assert os.path.basename(glencoe_path).startswith("abc123-glencoe-")
+
+    with patch('app.modules.flamapy.services.convert_uvl') as convert:
+        second = service.get_conversions([(uvl_file_path, "abc123")], ["Glencoe", "SPLOT"], parallel=False)
+
+    convert.assert_not_called()
+    assert second == first
+
+
+def test_feature_model_cache_parses_once(tmp_path):
+    """
+    Checks that a model is parsed once, served from memory afterwards and loaded from disk by a fresh cache.
+    """
+    uvl_file_path = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+    disk_cache = FileCache(str(tmp_path / "feature_models"), 1024 ** 2)
+    cache = FeatureModelCache(max_entries=1, disk_cache=disk_cache, signing_key=b"key")
+
+    fm = cache.get(uvl_file_path, "abc123")
+    assert cache.get(uvl_file_path, "abc123") is fm
+    assert disk_cache.filenames()
+
+    with patch('app.modules.flamapy.services.UVLReader') as reader:
+        other_cache = FeatureModelCache(max_entries=1, disk_cache=disk_cache, signing_key=b"key")
+        loaded = other_cache.get(uvl_file_path, "abc123")
+
+    reader.assert_not_called()
+    assert len(loaded.get_features()) == len(fm.get_features())
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ("touch exploited",))
+
+
+def test_feature_model_cache_rejects_unsigned_pickles(tmp_path):
+    """
+    Checks that a pickle written to the cache folder without the signing key is discarded without being loaded.
+    """
+    uvl_file_path = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+    disk_cache = FileCache(str(tmp_path / "feature_models"), 1024 ** 2)
+    cache = FeatureModelCache(disk_cache=disk_cache, signing_key=b"key")
+    filename = cache.filename("abc123")
+    exploit = pickle.dumps(Exploit())
+    disk_cache.put(filename, b"\0" * 32 + exploit)
+
+    with patch('os.system') as system:
+        assert not cache.contains("abc123")
+        disk_cache.put(filename, FeatureModelCache(signing_key=b"other").sign(filename, exploit) + exploit)
+        fm = cache.get(uvl_file_path, "abc123")
+
+    system.assert_not_called()
+    assert fm.root.name == "Chat"
+    # The model parsed instead is stored with a valid signature
+    assert cache.contains("abc123")
+
+
+COUNTING_UVL = """features
+    Root
+        mandatory
+            Base
+        optional
+            A
+            B
+            C
+        alternative
+            X
+            Y
+            Z
+        or
+            P
+            Q
+
+constraints
+    A => B
+    !(C & Z)
+"""
+
+
+def count_by_brute_force(fm):
+    from itertools import product
+
+    from flamapy.metamodels.pysat_metamodel.transformations import FmToPysat
+
+    sat = FmToPysat(fm).transform()
+    clauses = sat.get_all_clauses().clauses
+    variables = sorted(sat.features)
+    return sum(
+        all(any((literal > 0) == values[variables.index(abs(literal))] for literal in clause) for clause in clauses)
+        for values in product([False, True], repeat=len(variables))
+    )
+
+
+def test_count_configurations_with_bdd_and_sat(tmp_path):
+    """
+    Checks the exact product count, with constraints and nested groups, on the BDD and on the SAT fallback.
+    """
+    uvl_file_path = tmp_path / "counting.uvl"
+    uvl_file_path.write_text(COUNTING_UVL)
+    fm = feature_model_cache.get(str(uvl_file_path))
+
+    expected = count_by_brute_force(fm)
+    assert expected > 0
+    assert count_configurations(fm) == expected
+    assert count_configurations(fm, max_nodes=1) == expected
+
+
+def test_count_products_uses_stored_counts(tmp_path):
+    """
+    Checks that product counts are stored by checksum and not computed again.
+    """
+    uvl_file_path = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+    service = FlamapyService()
+    service.product_count_store = ProductCountStore(folder=str(tmp_path / "counts"), max_size=1024)
+
+    assert service.count_products([(uvl_file_path, "abc123")], max_workers=1) == {uvl_file_path: 24}
+
+    with patch('app.modules.flamapy.services.process_pool') as executor:
+        assert service.count_products([(uvl_file_path, "abc123")]) == {uvl_file_path: 24}
+    executor.assert_not_called()
+
+
+def test_analysis_shares_product_counts(tmp_path):
+    """
+    Checks that the analysis stores the counts it computes and reuses the ones already stored.
+    """
+    uvl_file_path = os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")
+    service = FlamapyService()
+    service.product_count_store = ProductCountStore(folder=str(tmp_path / "counts"), max_size=1024)
+
+    results = service.analyze_uvl_files([(uvl_file_path, "abc123")], max_workers=1)
+    assert results[uvl_file_path]["number_of_configurations"] == 24
+    assert service.count_products([(uvl_file_path, "abc123")], compute_missing=False) == {uvl_file_path: 24}
+
+    service.product_count_store.put_count("abc123", 7)
+    with patch('app.modules.flamapy.services.count_configurations') as count:
+        results = service.analyze_uvl_files([(uvl_file_path, "abc123")], max_workers=1)
+    assert results[uvl_file_path]["number_of_configurations"] == 7
+    count.assert_not_called()
+
+
+def test_count_uvl_products_is_bounded_by_an_alarm():
+    """
+    Checks that a count that does not check its own budget is still stopped after the timeout.
+    """
+    start = time.monotonic()
+    with patch('app.modules.flamapy.services.count_configurations', side_effect=lambda fm, timeout: time.sleep(30)):
+        assert count_uvl_products(os.path.join(UVL_EXAMPLES_DIR, "file1.uvl"), timeout=1) is None
+    assert time.monotonic() - start < 10
+
+
+def test_hung_pool_call_terminates_the_pool():
+    """
+    Checks that a pool call that outlives its timeout kills the workers instead of blocking its caller.
+    """
+    start = time.monotonic()
+    with patch('app.modules.flamapy.services.POOL_TIMEOUT_GRACE', 0):
+        with process_pool(2) as executor:
+            hung = executor.submit(time.sleep, 60)
+            pending = executor.submit(time.sleep, 60)
+            with pytest.raises(TimeoutError):
+                get_pool_result(executor, hung, 1)
+            with pytest.raises(BrokenProcessPool):
+                pending.result(timeout=30)
+    assert time.monotonic() - start < 30
+
+
+def test_analyze_uvl(tmp_path):
+    """
+    Checks the metrics computed for a valid model and the error reported for a broken one.
+    """
+    result = analyze_uvl(os.path.join(UVL_EXAMPLES_DIR, "file1.uvl"))
+
+    assert result["error"] is None
+    assert result["core_features"] == ["Chat", "Connection", "Messages"]
+    assert result["dead_features"] == []
+    assert result["number_of_configurations"] == 24
+    assert ["Chat", "Connection", "Messages"] in result["atomic_sets"]
+    assert result["max_depth"] == 2
+
+    broken_uvl = tmp_path / "broken.uvl"
+    broken_uvl.write_text("features\n    Root\n        this is not uvl {{{\n")
+    assert analyze_uvl(str(broken_uvl))["error"]
+
+
+def test_validate_uvl_reports_syntax_errors(tmp_path):
+    broken = tmp_path / "broken.uvl"
+    broken.write_text("features\n    Root\n        optional\n            \"Unterminated\n")
+
+    assert validate_uvl(os.path.join(UVL_EXAMPLES_DIR, "file1.uvl")) == {"valid": True, "errors": []}
+    result = validate_uvl(str(broken))
+    assert result["valid"] is False
+    assert result["errors"]
+
+
+def test_validate_uvl_files_skips_models_already_read(tmp_path):
+    uvl_file_path = os.path.join(UVL_EXAMPLES_DIR, "file2.uvl")
+    cache = FeatureModelCache(disk_cache=FileCache(str(tmp_path), 1024 ** 2), signing_key=b"key")
+    with patch('app.modules.flamapy.services.feature_model_cache', cache):
+        cache.get(uvl_file_path, "checksum")
+        with patch('app.modules.flamapy.services.process_pool') as executor, \
+                patch('app.modules.flamapy.services.validate_uvl') as validate:
+            results = FlamapyService().validate_uvl_files([(uvl_file_path, "checksum"), (uvl_file_path, "checksum")])
+
+    assert results == {uvl_file_path: {"valid": True, "errors": []}}
+    executor.assert_not_called()
+    validate.assert_not_called()
+
+
+def test_single_upload_is_validated_in_the_pool(tmp_path):
+    """
+    Checks that even one file is validated by a worker process and not by the calling web worker.
+    """
+    broken = tmp_path / "broken.uvl"
+    broken.write_text("features\n    Root\n        optional\n            \"Unterminated\n")
+
+    with patch('app.modules.flamapy.services.process_pool', wraps=process_pool) as pool:
+        results = FlamapyService().validate_uvl_files([(str(broken), None)])
+
+    pool.assert_called_once_with(1)
+    assert results[str(broken)]["valid"] is False
+    assert results[str(broken)]["errors"]
@@ -10,7 +10,11 @@ class Hubfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     checksum = db.Column(db.String(120), nullable=False)
+    sha256 = db.Column(db.String(64))
     size = db.Column(db.Integer, nullable=False)
+    # Result of reading the UVL when it was uploaded, None for files that were never checked
+    valid = db.Column(db.Boolean)
+    errors = db.Column(db.JSON)
     feature_model_id = db.Column(db.Integer, db.ForeignKey('feature_model.id'), nullable=False)
 
     def get_formatted_size(self):
@@ -1,13 +1,8 @@
-from datetime import datetime, timezone
 import os
 import uuid
 from flask import current_app, jsonify, make_response, request, send_from_directory
-from flask_login import current_user
 from app.modules.hubfile import hubfile_bp
-from app.modules.hubfile.models import HubfileDownloadRecord, HubfileViewRecord
-from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService
-
-from app import db
+from app.modules.hubfile.services import HubfileDownloadRecordService, HubfileService, HubfileViewRecordService
 
 
 @hubfile_bp.route("/file/download/<int:file_id>", methods=["GET"])
@@ -24,21 +19,8 @@ def download_file(file_id):
     if not user_cookie:
         user_cookie = str(uuid.uuid4())
 
-    # Check if the download record already exists for this cookie
-    existing_record = HubfileDownloadRecord.query.filter_by(
-        user_id=current_user.id if current_user.is_authenticated else None,
-        file_id=file_id,
-        download_cookie=user_cookie
-    ).first()
-
-    if not existing_record:
-        # Record the download in your database
-        HubfileDownloadRecordService().create(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            file_id=file_id,
-            download_date=datetime.now(timezone.utc),
-            download_cookie=user_cookie,
-        )
+    # Record the download, written in the background and only once per user and cookie
+    HubfileDownloadRecordService().record_download(file_id, user_cookie)
 
     # Save the cookie to the user's browser
     resp = make_response(
@@ -67,23 +49,8 @@ def view_file(file_id):
             if not user_cookie:
                 user_cookie = str(uuid.uuid4())
 
-            # Check if the view record already exists for this cookie
-            existing_record = HubfileViewRecord.query.filter_by(
-                user_id=current_user.id if current_user.is_authenticated else None,
-                file_id=file_id,
-                view_cookie=user_cookie
-            ).first()
-
-            if not existing_record:
-                # Register file view
-                new_view_record = HubfileViewRecord(
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    file_id=file_id,
-                    view_date=datetime.now(),
-                    view_cookie=user_cookie
-                )
-                db.session.add(new_view_record)
-                db.session.commit()
+            # Register file view, written in the background and only once per user and cookie
+            HubfileViewRecordService().record_view(file_id, user_cookie)
 
             # Prepare response
             response = jsonify({'success': True, 'content': content})
@@ -1,4 +1,6 @@
+import hashlib
 import os
+from typing import NamedTuple
 from app.modules.auth.models import User
 from app.modules.dataset.models import DataSet
 from app.modules.hubfile.models import Hubfile
@@ -9,6 +11,31 @@ from app.modules.hubfile.repositories import (
 )
 from core.services.BaseService import BaseService
 
+FILE_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileDigests(NamedTuple):
+    size: int
+    md5: str
+    sha256: str
+
+
+def calculate_file_digests(file_path: str) -> FileDigests:
+    """
+    Compute the size, MD5 and SHA-256 of a file in a single streaming pass.
+
+    The MD5 is what Hubfile.checksum stores and what Zenodo reports, the SHA-256 is kept for integrity checks.
+    """
+    size = 0
+    hash_md5 = hashlib.md5()
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(FILE_HASH_CHUNK_SIZE), b""):
+            size += len(chunk)
+            hash_md5.update(chunk)
+            hash_sha256.update(chunk)
+    return FileDigests(size, hash_md5.hexdigest(), hash_sha256.hexdigest())
+
 
 class HubfileService(BaseService):
     def __init__(self):
@@ -47,3 +74,14 @@ class HubfileService(BaseService):
 class HubfileDownloadRecordService(BaseService):
     def __init__(self):
         super().__init__(HubfileDownloadRecordRepository())
+
+    def record_download(self, file_id: int, user_cookie: str):
+        self.repository.record_download(file_id, user_cookie)
+
+
+class HubfileViewRecordService(BaseService):
+    def __init__(self):
+        super().__init__(HubfileViewRecordRepository())
+
+    def record_view(self, file_id: int, user_cookie: str):
+        self.repository.record_view(file_id, user_cookie)
@@ -1,5 +1,9 @@
+import hashlib
+
 import pytest
 
+from app.modules.hubfile.services import FILE_HASH_CHUNK_SIZE, calculate_file_digests
+
 
 @pytest.fixture(scope='module')
 def test_client(test_client):
@@ -22,3 +26,18 @@ def test_sample_assertion(test_client):
     """
     greeting = "Hello, World!"
     assert greeting == "Hello, World!", "The greeting does not coincide with 'Hello, World!'"
+
+
+def test_calculate_file_digests(tmp_path):
+    """
+    Checks that size, MD5 and SHA-256 are computed in one pass over a file larger than the read buffer.
+    """
+    content = b"features\n    Root\n" * (FILE_HASH_CHUNK_SIZE // 8)
+    file_path = tmp_path / "large.uvl"
+    file_path.write_bytes(content)
+
+    digests = calculate_file_digests(str(file_path))
+
+    assert digests.size == len(content)
+    assert digests.md5 == hashlib.md5(content).hexdigest()
+    assert digests.sha256 == hashlib.sha256(content).hexdigest()
@@ -0,0 +1,3 @@
+from core.blueprints.base_blueprint import BaseBlueprint
+
+jobs_bp = BaseBlueprint('jobs', __name__, template_folder='templates')
@@ -0,0 +1,23 @@
+// Poll the jobs that have not finished yet and update their row
+const JOB_POLL_INTERVAL = 3000;
+
+function pollJob(row) {
+    fetch(row.dataset.url)
+        .then(response => response.json())
+        .then(job => {
+            row.dataset.status = job.status;
+            row.querySelector('.job-status').textContent = job.status;
+            row.querySelector('.job-attempts').textContent = `${job.attempts} / ${job.max_attempts}`;
+            row.querySelector('.job-error').textContent = job.error || '';
+            if (job.status === 'queued' || job.status === 'running') {
+                setTimeout(() => pollJob(row), JOB_POLL_INTERVAL);
+            }
+        })
+        .catch(error => console.error('Error polling job:', error));
+}
+
+document.querySelectorAll('.job-row').forEach(row => {
+    if (row.dataset.status === 'queued' || row.dataset.status === 'running') {
+        setTimeout(() => pollJob(row), JOB_POLL_INTERVAL);
+    }
+});
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, or_
+
+from app.modules.jobs.models import Job, JobStatus
+from core.repositories.BaseRepository import BaseRepository
+
+
+class JobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(Job)
+
+    @staticmethod
+    def abandoned(now: datetime, lease: int):
+        return and_(Job.status == JobStatus.RUNNING, Job.locked_at < now - timedelta(seconds=lease))
+
+    @classmethod
+    def claimable(cls, now: datetime, lease: int):
+        return or_(
+            and_(Job.status == JobStatus.QUEUED, Job.run_after <= now),
+            and_(cls.abandoned(now, lease), Job.attempts < Job.max_attempts),
+        )
+
+    def fail_abandoned(self, now: datetime, lease: int) -> int:
+        """
+        Mark as failed the abandoned jobs that already used their last attempt, which are no longer claimable.
+        """
+        failed = (
+            self.session.query(Job)
+            .filter(self.abandoned(now, lease), Job.attempts >= Job.max_attempts)
+            .update(
+                {
+                    Job.status: JobStatus.FAILED,
+                    Job.error: "The worker running the last attempt stopped sending heartbeats",
+                    Job.locked_by: None,
+                    Job.finished_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        self.session.commit()
+        return failed
+
+    def claim(self, worker_id: str, lease: int, batch_size: int = 10) -> Optional[Job]:
+        """
+        Take the oldest job that is due, or whose worker stopped sending heartbeats, and mark it as running.
+
+        The job is claimed with a conditional UPDATE, so when several workers race for it only one of them
+        updates the row and the others move on to the next candidate.
+        """
+        now = datetime.now(timezone.utc)
+        self.fail_abandoned(now, lease)
+        candidates = (
+            self.session.query(Job.id)
+            .filter(self.claimable(now, lease))
+            .order_by(Job.run_after, Job.id)
+            .limit(batch_size)
+            .all()
+        )
+        for (job_id,) in candidates:
+            claimed = (
+                self.session.query(Job)
+                .filter(Job.id == job_id, self.claimable(now, lease))
+                .update(
+                    {
+                        Job.status: JobStatus.RUNNING,
+                        Job.locked_by: worker_id,
+                        Job.locked_at: now,
+                        Job.started_at: now,
+                        Job.attempts: Job.attempts + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            self.session.commit()
+            if claimed:
+                return self.get_by_id(job_id)
+        return None
+
+    def release(self, job_id: int, worker_id: str, values: dict) -> bool:
+        """
+        Store the outcome of a job, only if ``worker_id`` still holds its lease.
+
+        Returns:
+            bool: False when the lease expired and the job was claimed by another worker, which owns it now.
+        """
+        updated = (
+            self.session.query(Job)
+            .filter(Job.id == job_id, Job.locked_by == worker_id)
+            .update({**values, Job.locked_by: None}, synchronize_session=False)
+        )
+        self.session.commit()
+        return bool(updated)
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        updated = (
+            self.session.query(Job)
+            .filter(Job.id == job_id, Job.status == JobStatus.RUNNING, Job.locked_by == worker_id)
+            .update({Job.locked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+        )
+        self.session.commit()
+        return bool(updated)
+
+    def get_user_job(self, job_id: int, user_id: int) -> Optional[Job]:
+        return self.model.query.filter_by(id=job_id, user_id=user_id).first()
+
+    def get_user_jobs(self, user_id: int, limit: int = 50) -> list:
+        return self.model.query.filter_by(user_id=user_id).order_by(Job.id.desc()).limit(limit).all()
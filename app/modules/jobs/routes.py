@@ -0,0 +1,22 @@
+from flask import abort, jsonify, render_template
+from flask_login import current_user, login_required
+
+from app.modules.jobs import jobs_bp
+from app.modules.jobs.services import JobService
+
+job_service = JobService()
+
+
+@jobs_bp.route('/jobs', methods=['GET'])
+@login_required
+def index():
+    return render_template('jobs/index.html', jobs=job_service.get_user_jobs(current_user.id))
+
+
+@jobs_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = job_service.get_user_job(job_id, current_user.id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
@@ -0,0 +1,243 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from flask import current_app
+
+from app.modules.jobs.models import Job, JobStatus
+from app.modules.jobs.repositories import JobRepository
+from core.services.BaseService import BaseService
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+# Seconds before the first retry of a failed job, doubled on each further attempt and capped at one hour
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", 30))
+JOB_MAX_RETRY_DELAY = 3600
+# Seconds without a heartbeat after which a running job is considered abandoned and claimed again
+JOB_LEASE = int(os.getenv("JOB_LEASE", 300))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+
+# Handler of each kind of job. A handler receives the job and returns the JSON result stored with it.
+JOB_HANDLERS = {}
+
+
+# Tasks the workers also run every ``interval`` seconds, such as the statistics rollups, by name
+PERIODIC_TASKS = {}
+
+
+def job_handler(kind: str):
+    def register(handler: Callable[[Job], Optional[dict]]):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def periodic_task(name: str, interval: int):
+    """
+    Register a task that every worker runs at most once per ``interval`` seconds. A non-positive interval disables
+    it. Several workers may run the same task at once, so tasks must be safe to run concurrently.
+    """
+    def register(task: Callable[[], None]):
+        if interval > 0:
+            PERIODIC_TASKS[name] = (task, interval)
+        return task
+    return register
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobService(BaseService):
+    _embedded_lock = threading.Lock()
+    _embedded_running = False
+    _embedded_pending = False
+
+    def __init__(self):
+        super().__init__(JobRepository())
+
+    def enqueue(self, kind: str, payload: dict, user_id: int = None, max_attempts: int = None) -> Job:
+        """
+        Store a job for the workers. It is committed before returning, so its id can be handed to the client.
+
+        With ``JOBS_EMBEDDED_WORKER`` the job is also run by a thread of this process, for development setups
+        without a ``rosemary jobs:work`` process.
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"No handler registered for jobs of kind {kind}")
+        job = self.repository.create(
+            kind=kind,
+            payload=payload,
+            user_id=user_id,
+            max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        )
+        if current_app.config.get("JOBS_EMBEDDED_WORKER"):
+            self.work_in_background()
+        return job
+
+    def get_user_job(self, job_id: int, user_id: int) -> Optional[Job]:
+        return self.repository.get_user_job(job_id, user_id)
+
+    def get_user_jobs(self, user_id: int) -> list:
+        return self.repository.get_user_jobs(user_id)
+
+    def checkpoint(self, job: Job, **progress):
+        """
+        Record the steps a handler has completed. A retried job reads them from ``job.progress`` to resume.
+        """
+        job.progress = {**(job.progress or {}), **progress}
+        job.locked_at = datetime.now(timezone.utc)
+        self.repository.session.commit()
+
+    def run_next(self, worker_id: str) -> Optional[Job]:
+        """
+        Claim one job and run it.
+
+        Returns:
+            Job: The job that was run, or None if no job was due.
+        """
+        job = self.repository.claim(worker_id, JOB_LEASE)
+        if job is None:
+            return None
+        self.run(job, worker_id)
+        return job
+
+    def run(self, job: Job, worker_id: str):
+        handler = JOB_HANDLERS.get(job.kind)
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_worker,
+            args=(current_app._get_current_object(), job.id, worker_id, stop_heartbeat),
+            daemon=True,
+        )
+        heartbeat.start()
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for jobs of kind {job.kind}")
+            logger.info(f"Running {job} (attempt {job.attempts} of {job.max_attempts})")
+            result = handler(job)
+        except Exception as exc:
+            logger.exception(f"Exception while running {job}: {exc}")
+            self.repository.session.rollback()
+            self.fail(job, worker_id, str(exc))
+        else:
+            self.release(job, worker_id, {
+                Job.status: JobStatus.DONE,
+                Job.result: result,
+                Job.error: None,
+                Job.finished_at: datetime.now(timezone.utc),
+            })
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+    def fail(self, job: Job, worker_id: str, error: str):
+        now = datetime.now(timezone.utc)
+        if job.attempts < job.max_attempts:
+            delay = min(JOB_RETRY_DELAY * 2 ** (job.attempts - 1), JOB_MAX_RETRY_DELAY)
+            values = {Job.status: JobStatus.QUEUED, Job.run_after: now + timedelta(seconds=delay)}
+        else:
+            values = {Job.status: JobStatus.FAILED, Job.finished_at: now}
+        self.release(job, worker_id, {**values, Job.error: error})
+
+    def release(self, job: Job, worker_id: str, values: dict) -> bool:
+        """
+        Store the outcome of a job unless its lease was lost meanwhile, in which case the outcome is dropped
+        because the worker that claimed the job again owns it.
+        """
+        job_id = job.id
+        if self.repository.release(job_id, worker_id, values):
+            return True
+        logger.warning(f"Lease of job {job_id} was lost while {worker_id} was running it, its outcome is dropped")
+        return False
+
+    def work(self, worker_id: str = None, burst: bool = False, poll_interval: float = None,
+             stop: threading.Event = None) -> int:
+        """
+        Run jobs until ``stop`` is set, waiting ``poll_interval`` seconds whenever the queue is empty.
+
+        With ``burst`` the loop ends as soon as no job is due.
+
+        Returns:
+            int: The number of jobs run.
+        """
+        worker_id = worker_id or new_worker_id()
+        poll_interval = JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        stop = stop or threading.Event()
+        processed = 0
+        last_runs = {}
+        while not stop.is_set():
+            self.run_periodic_tasks(last_runs)
+            try:
+                job = self.run_next(worker_id)
+            except Exception as exc:
+                logger.exception(f"Exception while claiming a job: {exc}")
+                self.repository.session.rollback()
+                job = None
+            if job is not None:
+                processed += 1
+                continue
+            if burst:
+                break
+            stop.wait(poll_interval)
+        return processed
+
+    def run_periodic_tasks(self, last_runs: dict):
+        """
+        Run the periodic tasks that are due, given the monotonic time each one last ran in this worker.
+        """
+        for name, (task, interval) in PERIODIC_TASKS.items():
+            now = time.monotonic()
+            if name in last_runs and now - last_runs[name] < interval:
+                continue
+            last_runs[name] = now
+            try:
+                task()
+            except Exception as exc:
+                logger.exception(f"Exception in the periodic task {name}: {exc}")
+                self.repository.session.rollback()
+
+    def work_in_background(self):
+        """
+        Run the queued jobs in a daemon thread of this process.
+
+        Calls made while the thread is running make it look for jobs once more before it stops.
+        """
+        cls = type(self)
+        with cls._embedded_lock:
+            if cls._embedded_running:
+                cls._embedded_pending = True
+                return
+            cls._embedded_running = True
+
+        app = current_app._get_current_object()
+        threading.Thread(target=self._embedded_worker, args=(app,), daemon=True).start()
+
+    def _embedded_worker(self, app):
+        cls = type(self)
+        while True:
+            with app.app_context():
+                try:
+                    self.work(burst=True)
+                except Exception as exc:
+                    logger.exception(f"Exception in the embedded job worker: {exc}")
+            with cls._embedded_lock:
+                if not cls._embedded_pending:
+                    cls._embedded_running = False
+                    return
+                cls._embedded_pending = False
+
+    @staticmethod
+    def _heartbeat_worker(app, job_id: int, worker_id: str, stop: threading.Event):
+        while not stop.wait(max(JOB_LEASE / 3, 1)):
+            with app.app_context():
+                try:
+                    JobRepository().heartbeat(job_id, worker_id)
+                except Exception as exc:
+                    logger.exception(f"Exception while renewing the lease of job {job_id}: {exc}")
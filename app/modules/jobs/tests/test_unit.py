@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.conftest import login, logout
+from app.modules.jobs.models import Job, JobStatus
+from app.modules.jobs.services import JOB_LEASE, JobService, job_handler
+
+calls = []
+
+
+@job_handler("test.echo")
+def echo(job):
+    calls.append(job.payload)
+    if job.payload.get("fail_until", 0) >= job.attempts:
+        raise RuntimeError(f"Attempt {job.attempts} failed")
+    JobService().checkpoint(job, step="echoed")
+    return {"echo": job.payload["message"]}
+
+
+@pytest.fixture(scope='module')
+def test_client(test_client):
+    """
+    Extends the test_client fixture to add additional specific data for module testing.
+    """
+    with test_client.application.app_context():
+        other_user = User(email='other@example.com', password='test1234')
+        db.session.add(other_user)
+        db.session.commit()
+
+    yield test_client
+
+
+def make_due(job_id):
+    job = db.session.get(Job, job_id)
+    job.run_after = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_job_is_retried_until_it_succeeds(test_client):
+    with test_client.application.app_context():
+        service = JobService()
+        job = service.enqueue("test.echo", {"message": "hello", "fail_until": 1}, max_attempts=3)
+        job_id = job.id
+
+        assert service.run_next("worker-1").id == job_id
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.QUEUED
+        assert job.attempts == 1
+        assert job.error == "Attempt 1 failed"
+        # The retry waits for its backoff
+        assert service.run_next("worker-1") is None
+
+        make_due(job_id)
+        service.run_next("worker-1")
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.DONE
+        assert job.attempts == 2
+        assert job.result == {"echo": "hello"}
+        assert job.progress == {"step": "echoed"}
+        assert job.error is None
+
+
+def test_job_fails_after_its_last_attempt(test_client):
+    with test_client.application.app_context():
+        service = JobService()
+        job_id = service.enqueue("test.echo", {"message": "never", "fail_until": 5}, max_attempts=2).id
+
+        service.run_next("worker-1")
+        make_due(job_id)
+        service.run_next("worker-1")
+
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 2
+        assert job.finished_at is not None
+        assert service.work(burst=True) == 0
+
+
+def test_abandoned_job_is_claimed_again(test_client):
+    with test_client.application.app_context():
+        service = JobService()
+        job_id = service.enqueue("test.echo", {"message": "resumed"}).id
+
+        claimed = service.repository.claim("worker-1", JOB_LEASE)
+        assert claimed.id == job_id
+        # Another worker cannot take a job whose lease is still valid
+        assert service.repository.claim("worker-2", JOB_LEASE) is None
+
+        claimed.locked_at = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE + 1)
+        db.session.commit()
+        assert service.work(worker_id="worker-2", burst=True) == 1
+
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.DONE
+        assert job.attempts == 2
+
+
+def test_abandoned_last_attempt_is_failed_instead_of_claimed(test_client):
+    with test_client.application.app_context():
+        service = JobService()
+        job_id = service.enqueue("test.echo", {"message": "crashed"}, max_attempts=1).id
+
+        claimed = service.repository.claim("worker-1", JOB_LEASE)
+        claimed.locked_at = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE + 1)
+        db.session.commit()
+        assert service.work(worker_id="worker-2", burst=True) == 0
+
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 1
+        assert job.locked_by is None
+        assert job.finished_at is not None
+
+
+def test_outcome_of_a_lost_lease_is_dropped(test_client):
+    with test_client.application.app_context():
+        service = JobService()
+        job_id = service.enqueue("test.echo", {"message": "stolen"}).id
+
+        claimed = service.repository.claim("worker-1", JOB_LEASE)
+        claimed.locked_at = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE + 1)
+        db.session.commit()
+        assert service.repository.claim("worker-2", JOB_LEASE).id == job_id
+
+        service.run(db.session.get(Job, job_id), "worker-1")
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.RUNNING
+        assert job.locked_by == "worker-2"
+
+        service.run(job, "worker-2")
+        job = db.session.get(Job, job_id)
+        assert job.status == JobStatus.DONE
+        assert job.locked_by is None
+
+
+def test_job_status_is_only_shown_to_its_owner(test_client):
+    with test_client.application.app_context():
+        user_id = User.query.filter_by(email='test@example.com').first().id
+        job_id = JobService().enqueue("test.echo", {"message": "mine"}, user_id=user_id).id
+
+    login(test_client, 'test@example.com', 'test1234')
+    response = test_client.get(f'/jobs/{job_id}')
+    assert response.status_code == 200
+    assert response.json['status'] == 'queued'
+    assert f'#{job_id}' in test_client.get('/jobs').data.decode()
+    logout(test_client)
+
+    login(test_client, 'other@example.com', 'test1234')
+    assert test_client.get(f'/jobs/{job_id}').status_code == 404
+    logout(test_client)
+
+
+def test_enqueue_rejects_unknown_kinds(test_client):
+    with test_client.application.app_context():
+        with pytest.raises(ValueError):
+            JobService().enqueue("test.unknown", {})
@@ -0,0 +1,53 @@
+import os
+
+from app.modules.dashboard.services import StatsRollupService, stats_cache
+from app.modules.dataset.repositories import DataSetRepository
+from app.modules.featuremodel.repositories import FeatureModelRepository
+from core.services.BaseService import BaseService
+
+# Seconds the statistics and latest datasets of the main page are served from the cache
+PUBLIC_INDEX_CACHE_TTL = int(os.getenv('PUBLIC_INDEX_CACHE_TTL', 60))
+PUBLIC_INDEX_CACHE_KEY = 'public_index'
+
+
+class PublicService(BaseService):
+    def __init__(self):
+        super().__init__(DataSetRepository())
+
+    def get_index_data(self) -> dict:
+        """
+        Statistics and latest datasets of the main page, computed at most once per ``PUBLIC_INDEX_CACHE_TTL`` seconds
+        for every worker process.
+        """
+        return stats_cache.get_or_compute(PUBLIC_INDEX_CACHE_KEY, PUBLIC_INDEX_CACHE_TTL, self.compute_index_data)
+
+    def compute_index_data(self) -> dict:
+        # The daily statistics are rolled up by the job workers
+        stats_service = StatsRollupService()
+
+        return {
+            "datasets": [self.serialize_latest_dataset(dataset) for dataset in self.repository.latest_synchronized()],
+            "datasets_counter": self.repository.count_synchronized_datasets(),
+            "feature_models_counter": FeatureModelRepository().count_feature_models(),
+            "total_dataset_downloads": stats_service.total_dataset_downloads(),
+            "total_feature_model_downloads": stats_service.total_file_downloads(),
+            "total_dataset_views": stats_service.total_dataset_views(),
+            "total_feature_model_views": stats_service.total_file_views(),
+        }
+
+    @staticmethod
+    def serialize_latest_dataset(dataset) -> dict:
+        return {
+            "id": dataset.id,
+            "title": dataset.ds_meta_data.title,
+            "description": dataset.ds_meta_data.description,
+            "publication_type": dataset.get_cleaned_publication_type(),
+            "created_at": dataset.created_at.strftime('%B %d, %Y at %I:%M %p'),
+            "url": dataset.get_uvlhub_doi(),
+            "authors": [author.to_dict() for author in dataset.ds_meta_data.authors],
+            "tags": [tag.strip() for tag in dataset.ds_meta_data.tags.split(',')] if dataset.ds_meta_data.tags else [],
+            "total_size_in_human_format": dataset.get_file_total_size_for_human(),
+        }
+
+    def invalidate_index_data(self):
+        stats_cache.invalidate(PUBLIC_INDEX_CACHE_KEY)
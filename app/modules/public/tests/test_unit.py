@@ -0,0 +1,70 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import db
+from app.modules.auth.models import User
+from app.modules.dataset.models import DSMetaData, DataSet, PublicationType
+from app.modules.public.services import PublicService, stats_cache
+from core.cache.json_cache import JsonCache
+
+
+@pytest.fixture(scope="module")
+def test_client(test_client, tmp_path_factory):
+    """
+    Extends the test_client fixture with a synchronized dataset and a cache folder of its own.
+    """
+    with test_client.application.app_context():
+        user = User(email='user@example.com', password='test1234')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(DataSet(
+            user_id=user.id,
+            ds_meta_data=DSMetaData(
+                title="Published dataset",
+                description="Published.",
+                publication_type=PublicationType.REPORT,
+                dataset_doi="10.1234/published",
+                tags="uvl, models",
+            )
+        ))
+        db.session.commit()
+
+    with patch.object(stats_cache, 'folder', str(tmp_path_factory.mktemp("stats"))):
+        yield test_client
+
+
+def test_index_is_served_from_the_cache(test_client):
+    PublicService().invalidate_index_data()
+
+    response = test_client.get('/')
+    assert response.status_code == 200
+    assert b'Published dataset' in response.data
+    assert b'1 datasets' in response.data
+
+    with patch.object(PublicService, 'compute_index_data') as mock_compute:
+        response = test_client.get('/')
+        assert response.status_code == 200
+        assert b'Published dataset' in response.data
+        mock_compute.assert_not_called()
+
+
+def test_index_is_recomputed_after_invalidation(test_client):
+    with test_client.application.app_context():
+        PublicService().get_index_data()
+        PublicService().invalidate_index_data()
+        with patch.object(PublicService, 'compute_index_data', return_value={"datasets_counter": 7}) as mock_compute:
+            assert PublicService().get_index_data() == {"datasets_counter": 7}
+            mock_compute.assert_called_once()
+
+
+def test_json_cache_expires_after_ttl(tmp_path):
+    cache = JsonCache(str(tmp_path), 1024)
+    assert cache.get_or_compute("stats", 60, lambda: {"total": 1}) == {"total": 1}
+    assert cache.get_or_compute("stats", 60, lambda: {"total": 2}) == {"total": 1}
+
+    stale = time.time() - 120
+    os.utime(cache.path(cache.filename("stats")), (stale, stale))
+    assert cache.get_or_compute("stats", 60, lambda: {"total": 2}) == {"total": 2}
@@ -1,6 +1,12 @@
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+from urllib.parse import quote
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.modules.dataset.models import DataSet
 from app.modules.featuremodel.models import FeatureModel
@@ -18,6 +24,61 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Statuses after which Zenodo is asked again, once the backoff has elapsed
+ZENODO_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def get_upload_workers() -> int:
+    return int(os.getenv("ZENODO_UPLOAD_WORKERS", 4))
+
+
+def get_request_timeout() -> int:
+    return int(os.getenv("ZENODO_TIMEOUT", 60))
+
+
+class ZenodoRetry(Retry):
+    """
+    Retry policy of the Zenodo session.
+
+    Idempotent requests are retried on 429 and 5xx. A POST is only retried on 429: Zenodo rejects it
+    before doing anything, while after a 5xx the deposition may already exist.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == "POST" and status_code == 429:
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    Create an HTTP session that reuses its connections and retries with exponential backoff.
+
+    Args:
+        pool_size (int): Number of connections kept open per host, one per upload worker.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = ZenodoRetry(
+        total=int(os.getenv("ZENODO_MAX_RETRIES", 5)),
+        backoff_factor=float(os.getenv("ZENODO_RETRY_BACKOFF", 0.5)),
+        status_forcelist=ZENODO_RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ZenodoUpload(NamedTuple):
+    filename: str
+    path: str
+    checksum: Optional[str]
+
 
 class ZenodoService(BaseService):
 
@@ -44,6 +105,9 @@ class ZenodoService(BaseService):
         self.ZENODO_API_URL = self.get_zenodo_url()
         self.headers = {"Content-Type": "application/json"}
         self.params = {"access_token": self.ZENODO_ACCESS_TOKEN}
+        self.upload_workers = get_upload_workers()
+        self.timeout = get_request_timeout()
+        self.session = create_session(self.upload_workers)
 
     def test_connection(self) -> bool:
         """
@@ -52,7 +116,9 @@ class ZenodoService(BaseService):
         Returns:
             bool: True if the connection is successful, False otherwise.
         """
-        response = requests.get(self.ZENODO_API_URL, params=self.params, headers=self.headers)
+        response = self.session.get(
+            self.ZENODO_API_URL, params=self.params, headers=self.headers, timeout=self.timeout
+        )
         return response.status_code == 200
 
     def test_full_connection(self) -> Response:
@@ -84,7 +150,9 @@ class ZenodoService(BaseService):
             }
         }
 
-        response = requests.post(self.ZENODO_API_URL, json=data, params=self.params, headers=self.headers)
+        response = self.session.post(
+            self.ZENODO_API_URL, json=data, params=self.params, headers=self.headers, timeout=self.timeout
+        )
 
         if response.status_code != 201:
             return jsonify(
@@ -96,26 +164,22 @@ class ZenodoService(BaseService):
 
         deposition_id = response.json()["id"]
 
-        # Step 2: Upload an empty file to the deposition
-        data = {"name": "test_file.txt"}
-        files = {"file": open(file_path, "rb")}
-        publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files)
-        files["file"].close()  # Close the file after uploading
-
-        logger.info(f"Publish URL: {publish_url}")
-        logger.info(f"Params: {self.params}")
-        logger.info(f"Data: {data}")
-        logger.info(f"Files: {files}")
+        # Step 2: Upload the test file to the deposition
+        bucket_url = response.json().get("links", {}).get("bucket")
+        response = self.put_file(bucket_url, ZenodoUpload("test_file.txt", file_path, None))
+
+        logger.info(f"Bucket URL: {bucket_url}")
         logger.info(f"Response Status Code: {response.status_code}")
         logger.info(f"Response Content: {response.content}")
 
-        if response.status_code != 201:
+        if response.status_code not in (200, 201):
             messages.append(f"Failed to upload test file to Zenodo. Response code: {response.status_code}")
             success = False
 
         # Step 3: Delete the deposition
-        response = requests.delete(f"{self.ZENODO_API_URL}/{deposition_id}", params=self.params)
+        response = self.session.delete(
+            f"{self.ZENODO_API_URL}/{deposition_id}", params=self.params, timeout=self.timeout
+        )
 
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -129,7 +193,9 @@ class ZenodoService(BaseService):
         Returns:
             dict: The response in JSON format with the depositions.
         """
-        response = requests.get(self.ZENODO_API_URL, params=self.params, headers=self.headers)
+        response = self.session.get(
+            self.ZENODO_API_URL, params=self.params, headers=self.headers, timeout=self.timeout
+        )
         if response.status_code != 200:
             raise Exception("Failed to get depositions")
         return response.json()
@@ -174,7 +240,9 @@ class ZenodoService(BaseService):
 
         data = {"metadata": metadata}
 
-        response = requests.post(self.ZENODO_API_URL, params=self.params, json=data, headers=self.headers)
+        response = self.session.post(
+            self.ZENODO_API_URL, params=self.params, json=data, headers=self.headers, timeout=self.timeout
+        )
         if response.status_code != 201:
             error_message = f"Failed to create deposition. Error details: {response.json()}"
             raise Exception(error_message)
@@ -192,18 +260,89 @@ class ZenodoService(BaseService):
         Returns:
             dict: The response in JSON format with the details of the uploaded file.
         """
-        uvl_filename = feature_model.fm_meta_data.uvl_filename
-        data = {"name": uvl_filename}
+        return self.upload_files(dataset, deposition_id, [feature_model], user)[0]
+
+    def upload_files(self, dataset: DataSet, deposition_id: int, feature_models: List[FeatureModel],
+                     user=None) -> List[dict]:
+        """
+        Upload the files of several feature models to a deposition in Zenodo, at most ``ZENODO_UPLOAD_WORKERS``
+        at a time.
+
+        The files are streamed from disk to the bucket of the deposition. The first failed upload cancels the ones
+        that have not started yet.
+
+        Args:
+            dataset (DataSet): The DataSet object the feature models belong to.
+            deposition_id (int): The ID of the deposition in Zenodo.
+            feature_models (List[FeatureModel]): The feature models whose files are uploaded.
+            user (User): The User object representing the file owner.
+
+        Returns:
+            List[dict]: The details of each uploaded file, in the order of the feature models.
+        """
+        # The database is only read from this thread, the workers only talk to Zenodo
         user_id = current_user.id if user is None else user.id
-        file_path = os.path.join(uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}/", uvl_filename)
-        files = {"file": open(file_path, "rb")}
+        folder = os.path.join(uploads_folder_name(), f"user_{str(user_id)}", f"dataset_{dataset.id}")
+        uploads = []
+        for feature_model in feature_models:
+            uvl_filename = feature_model.fm_meta_data.uvl_filename
+            hubfile = next((file for file in feature_model.files if file.name == uvl_filename), None)
+            uploads.append(ZenodoUpload(
+                uvl_filename, os.path.join(folder, uvl_filename), hubfile.checksum if hubfile else None
+            ))
+        if not uploads:
+            return []
+
+        bucket_url = self.get_bucket_url(deposition_id)
+        if len(uploads) == 1:
+            return [self.send_file(bucket_url, uploads[0])]
+
+        executor = ThreadPoolExecutor(max_workers=min(self.upload_workers, len(uploads)))
+        try:
+            futures = [executor.submit(self.send_file, bucket_url, upload) for upload in uploads]
+            return [future.result() for future in futures]
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def get_bucket_url(self, deposition_id: int) -> str:
+        """
+        Get the URL of the bucket where the files of a deposition are uploaded.
 
-        publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/files"
-        response = requests.post(publish_url, params=self.params, data=data, files=files)
-        if response.status_code != 201:
-            error_message = f"Failed to upload files. Error details: {response.json()}"
+        Args:
+            deposition_id (int): The ID of the deposition in Zenodo.
+
+        Returns:
+            str: The URL of the bucket.
+        """
+        bucket_url = self.get_deposition(deposition_id).get("links", {}).get("bucket")
+        if not bucket_url:
+            raise Exception(f"Deposition {deposition_id} has no bucket to upload files")
+        return bucket_url
+
+    def put_file(self, bucket_url: str, upload: ZenodoUpload) -> requests.Response:
+        # The open file is sent as the body, so it is streamed in blocks instead of being read into memory.
+        # urllib3 rewinds it when a retry sends the request again.
+        with open(upload.path, "rb") as file:
+            return self.session.put(
+                f"{bucket_url}/{quote(upload.filename)}",
+                data=file,
+                params=self.params,
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=self.timeout,
+            )
+
+    def send_file(self, bucket_url: str, upload: ZenodoUpload) -> dict:
+        response = self.put_file(bucket_url, upload)
+        if response.status_code not in (200, 201):
+            error_message = f"Failed to upload {upload.filename}. Error details: {response.text}"
             raise Exception(error_message)
-        return response.json()
+
+        # Zenodo reports the MD5 of what it received, compare it with the one stored at upload time
+        uploaded_file = response.json()
+        remote_checksum = str(uploaded_file.get("checksum") or "").removeprefix("md5:")
+        if upload.checksum and remote_checksum and remote_checksum != upload.checksum:
+            raise Exception(f"Checksum mismatch uploading {upload.filename} to Zenodo")
+        return uploaded_file
 
     def publish_deposition(self, deposition_id: int) -> dict:
         """
@@ -216,7 +355,7 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the published deposition.
         """
         publish_url = f"{self.ZENODO_API_URL}/{deposition_id}/actions/publish"
-        response = requests.post(publish_url, params=self.params, headers=self.headers)
+        response = self.session.post(publish_url, params=self.params, headers=self.headers, timeout=self.timeout)
         if response.status_code != 202:
             raise Exception("Failed to publish deposition")
         return response.json()
@@ -232,11 +371,38 @@ class ZenodoService(BaseService):
             dict: The response in JSON format with the details of the deposition.
         """
         deposition_url = f"{self.ZENODO_API_URL}/{deposition_id}"
-        response = requests.get(deposition_url, params=self.params, headers=self.headers)
+        response = self.session.get(deposition_url, params=self.params, headers=self.headers, timeout=self.timeout)
         if response.status_code != 200:
             raise Exception("Failed to get deposition")
         return response.json()
 
+    def is_published(self, deposition: dict) -> bool:
+        """
+        Check whether a deposition has already been published.
+
+        Args:
+            deposition (dict): The deposition as returned by get_deposition.
+
+        Returns:
+            bool: True if the deposition was submitted.
+        """
+        return bool(deposition.get("submitted"))
+
+    def get_uploaded_checksums(self, deposition: dict) -> dict:
+        """
+        Get the files already uploaded to a deposition.
+
+        Args:
+            deposition (dict): The deposition as returned by get_deposition.
+
+        Returns:
+            dict: The MD5 of each uploaded file, keyed by its name.
+        """
+        return {
+            file["filename"]: str(file.get("checksum") or "").removeprefix("md5:")
+            for file in deposition.get("files", [])
+        }
+
     def get_doi(self, deposition_id: int) -> str:
         """
         Get the DOI of a deposition from Zenodo.
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import unquote
+from unittest.mock import patch
+
+import pytest
+
+from app.modules.zenodo.services import ZenodoService
+
+
+class StandInZenodo(ThreadingHTTPServer):
+    """
+    Local stand-in for the Zenodo deposition API. Every file upload fails once with a 503 before it is accepted.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInZenodoHandler)
+        self.base_url = f"http://127.0.0.1:{self.server_port}"
+        self.requests = []
+        self.files = {}
+        self.active_uploads = 0
+        self.max_active_uploads = 0
+        self.deposition_status = 201
+        self.lock = threading.Lock()
+
+
+class StandInZenodoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=None):
+        content = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def deposition(self):
+        return {"id": 1, "conceptrecid": "1", "links": {"bucket": f"{self.server.base_url}/api/files/bucket-1"}}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0]
+        self.server.requests.append(("POST", path))
+        if path.endswith("/actions/publish"):
+            self.reply(202, {"id": 1, "doi": "10.5281/zenodo.1"})
+        else:
+            self.reply(self.server.deposition_status, self.deposition())
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path.split("?")[0]))
+        self.reply(200, self.deposition())
+
+    def do_PUT(self):
+        content = self.rfile.read(int(self.headers["Content-Length"]))
+        filename = unquote(self.path.split("?")[0].rsplit("/", 1)[-1])
+        with self.server.lock:
+            self.server.requests.append(("PUT", filename))
+            attempts = sum(1 for method, name in self.server.requests if (method, name) == ("PUT", filename))
+            if attempts == 1:
+                self.reply(503)
+                return
+            self.server.active_uploads += 1
+            self.server.max_active_uploads = max(self.server.max_active_uploads, self.server.active_uploads)
+        time.sleep(0.2)
+        with self.server.lock:
+            self.server.active_uploads -= 1
+            self.server.files[filename] = content
+        self.reply(201, {"key": filename, "size": len(content), "checksum": f"md5:{hashlib.md5(content).hexdigest()}"})
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    server = StandInZenodo()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("ZENODO_API_URL", f"{server.base_url}/api/deposit/depositions")
+    monkeypatch.setenv("ZENODO_RETRY_BACKOFF", "0")
+    monkeypatch.setenv("ZENODO_UPLOAD_WORKERS", "3")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_feature_models(tmp_path, count):
+    folder = tmp_path / "user_3" / "dataset_7"
+    folder.mkdir(parents=True)
+    feature_models = []
+    for index in range(count):
+        uvl_filename = f"model {index}.uvl"
+        content = f"features\n    Root{index}\n".encode()
+        (folder / uvl_filename).write_bytes(content)
+        hubfile = SimpleNamespace(name=uvl_filename, checksum=hashlib.md5(content).hexdigest())
+        feature_models.append(
+            SimpleNamespace(fm_meta_data=SimpleNamespace(uvl_filename=uvl_filename), files=[hubfile])
+        )
+    return feature_models
+
+
+def test_upload_files_in_parallel_with_retries(stand_in, tmp_path):
+    feature_models = make_feature_models(tmp_path, 6)
+    service = ZenodoService()
+
+    with patch("app.modules.zenodo.services.uploads_folder_name", return_value=str(tmp_path)):
+        results = service.upload_files(SimpleNamespace(id=7), 1, feature_models, user=SimpleNamespace(id=3))
+
+    assert [result["key"] for result in results] == [f"model {index}.uvl" for index in range(6)]
+    for index in range(6):
+        assert stand_in.files[f"model {index}.uvl"] == f"features\n    Root{index}\n".encode()
+    # Every file was sent again after the 503, and several were in flight at the same time
+    assert sum(1 for method, _ in stand_in.requests if method == "PUT") == 12
+    assert 1 < stand_in.max_active_uploads <= 3
+    # The bucket is looked up once for the whole dataset
+    assert stand_in.requests.count(("GET", "/api/deposit/depositions/1")) == 1
+
+
+def test_upload_files_rejects_checksum_mismatch(stand_in, tmp_path):
+    feature_models = make_feature_models(tmp_path, 2)
+    feature_models[1].files[0].checksum = "0" * 32
+
+    with patch("app.modules.zenodo.services.uploads_folder_name", return_value=str(tmp_path)):
+        with pytest.raises(Exception, match="Checksum mismatch uploading model 1.uvl"):
+            ZenodoService().upload_files(SimpleNamespace(id=7), 1, feature_models, user=SimpleNamespace(id=3))
+
+
+def test_deposition_creation_is_not_retried_after_server_error(stand_in):
+    stand_in.deposition_status = 500
+    service = ZenodoService()
+    dataset = SimpleNamespace(ds_meta_data=SimpleNamespace(
+        title="Dataset", description="Description", authors=[], tags="",
+        publication_type=SimpleNamespace(value="none"),
+    ))
+
+    with pytest.raises(Exception, match="Failed to create deposition"):
+        service.create_new_deposition(dataset)
+    assert stand_in.requests == [("POST", "/api/deposit/depositions")]
+
+    # The publication is still reached over the same session
+    assert service.publish_deposition(1)["doi"] == "10.5281/zenodo.1"
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+# Seconds after which a temporary file left by an interrupted write is removed
+STALE_PART_AGE = 24 * 3600
+
+
+class FileCache:
+    """
+    Folder of cached files bounded by size.
+
+    Files are published atomically, reads refresh their modification time, and the least recently used files are
+    evicted once the total size of the folder exceeds ``max_size`` bytes. Files published or read in the last
+    ``min_age`` seconds are never evicted, so a path handed out by ``get`` or ``put`` can still be sent or streamed
+    afterwards, at the cost of the folder briefly growing beyond ``max_size``.
+    """
+
+    def __init__(self, folder: str, max_size: int, min_age: Optional[int] = None):
+        self.folder = folder
+        self.max_size = max_size
+        self.min_age = min_age if min_age is not None else int(os.getenv("FILE_CACHE_MIN_AGE", 3600))
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.folder, filename)
+
+    def get(self, filename: str) -> Optional[str]:
+        path = self.path(filename)
+        try:
+            # Touching the file keeps it at the end of the LRU order
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def create_temp(self) -> tuple:
+        os.makedirs(self.folder, exist_ok=True)
+        return tempfile.mkstemp(dir=self.folder, suffix=".part")
+
+    def publish(self, temp_path: str, filename: str) -> str:
+        path = self.path(filename)
+        os.replace(temp_path, path)
+        self.evict(keep=filename)
+        return path
+
+    def put(self, filename: str, data: bytes) -> str:
+        fd, temp_path = self.create_temp()
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            return self.publish(temp_path, filename)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def put_file(self, filename: str, source_path: str) -> str:
+        fd, temp_path = self.create_temp()
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            return self.publish(temp_path, filename)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def remove(self, filename: str):
+        try:
+            os.remove(self.path(filename))
+        except FileNotFoundError:
+            pass
+
+    def filenames(self) -> list:
+        if not os.path.isdir(self.folder):
+            return []
+        return [
+            filename for filename in os.listdir(self.folder)
+            if not filename.endswith(".part") and os.path.isfile(self.path(filename))
+        ]
+
+    def evict(self, keep: Optional[str] = None):
+        self.remove_stale_parts()
+
+        entries = []
+        for filename in self.filenames():
+            try:
+                stat = os.stat(self.path(filename))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        total_size = sum(size for _, size, _ in entries)
+        recent = time.time() - self.min_age
+        for mtime, size, filename in sorted(entries):
+            if total_size <= self.max_size or mtime > recent:
+                break
+            if filename == keep:
+                continue
+            self.remove(filename)
+            total_size -= size
+
+    def remove_stale_parts(self):
+        if not os.path.isdir(self.folder):
+            return
+        stale = time.time() - STALE_PART_AGE
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(".part"):
+                continue
+            try:
+                if os.stat(self.path(filename)).st_mtime < stale:
+                    os.remove(self.path(filename))
+            except FileNotFoundError:
+                pass
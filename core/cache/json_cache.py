@@ -0,0 +1,46 @@
+import json
+import os
+import time
+from typing import Callable
+
+from core.cache.file_cache import FileCache
+
+
+class JsonCache(FileCache):
+    """
+    Small JSON documents cached in a folder, so every worker process shares them, each fresh for a time to live.
+
+    A document older than its time to live is recomputed by the first process that asks for it, and removing it
+    makes the next read recompute it.
+    """
+
+    def filename(self, key: str) -> str:
+        return f"{key}.json"
+
+    def get_json(self, key: str, ttl: float):
+        path = self.path(self.filename(key))
+        try:
+            if time.time() - os.stat(path).st_mtime > ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put_json(self, key: str, value):
+        self.put(self.filename(key), json.dumps(value, default=str).encode("utf-8"))
+
+    def get_or_compute(self, key: str, ttl: float, compute: Callable):
+        """
+        Return the cached document, or compute, store and return it when it is missing or stale.
+
+        The computed value must be JSON serialisable, it is returned as stored so cached and fresh reads match.
+        """
+        value = self.get_json(key, ttl)
+        if value is None:
+            value = json.loads(json.dumps(compute(), default=str))
+            self.put_json(key, value)
+        return value
+
+    def invalidate(self, key: str):
+        self.remove(self.filename(key))
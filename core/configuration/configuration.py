@@ -11,6 +11,10 @@ def uploads_folder_name():
     return os.getenv('UPLOADS_DIR', "uploads")
 
 
+def cache_folder_name():
+    return os.getenv('CACHE_DIR', "cache")
+
+
 def get_app_version():
     version_file_path = os.path.join(os.getenv('WORKING_DIR', ''), '.version')
     try:
@@ -0,0 +1,166 @@
+import atexit
+import logging
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """
+    Write-behind buffer for tracking records such as views and downloads.
+
+    Records are queued in memory and written by a background thread every ``EVENT_BUFFER_FLUSH_INTERVAL`` seconds,
+    or as soon as ``EVENT_BUFFER_MAX_SIZE`` records are queued, with one bulk INSERT and transaction per table. A
+    record whose unique key matches a queued or stored record is dropped. With an interval of 0 every record is
+    written immediately.
+
+    When the database is unavailable (an ``OperationalError``) the records are queued again for the next flush, up
+    to ``EVENT_BUFFER_MAX_RETRIES`` times. When a table batch fails for any other reason its records are written
+    one by one, so only the records that cannot be written are dropped.
+
+    The unique key is a tuple of column names whose last column must be selective (a cookie), stored records are
+    looked up by that column only.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._events = []
+        self._app = None
+        self._worker = None
+        self._pid = os.getpid()
+
+    def record(self, model, unique: tuple, **values):
+        app = current_app._get_current_object()
+        if self._pid != os.getpid():
+            # Forked worker process, the queue and the thread belong to the parent
+            self._reset()
+
+        with self._lock:
+            self._app = app
+            self._events.append((model, unique, values, 0))
+            queued = len(self._events)
+
+        if app.config.get('EVENT_BUFFER_FLUSH_INTERVAL', 5) <= 0:
+            self.flush()
+            return
+
+        self._start_worker()
+        if queued >= app.config.get('EVENT_BUFFER_MAX_SIZE', 500):
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def flush(self) -> int:
+        """
+        Write the queued records in the current application context.
+
+        Returns:
+            int: The number of records inserted.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+
+        # Duplicates inside the batch keep the first record, with the number of failed flushes it went through
+        batches = {}
+        for model, unique, values, attempts in events:
+            key = tuple(values.get(column) for column in unique)
+            batches.setdefault((model, unique), {}).setdefault(key, (values, attempts))
+
+        inserted = 0
+        for (model, unique), records in batches.items():
+            try:
+                inserted += self._insert(model, unique, records)
+            except OperationalError as exc:
+                db.session.rollback()
+                logger.warning(f"Database unavailable while writing {len(records)} {model.__tablename__} records, "
+                               f"they are queued again: {exc}")
+                self._requeue(model, unique, list(records.values()))
+            except Exception as exc:
+                db.session.rollback()
+                logger.warning(f"Exception while writing {len(records)} {model.__tablename__} records, writing them "
+                               f"one by one: {exc}")
+                inserted += self._insert_one_by_one(model, unique, records)
+        return inserted
+
+    def _insert(self, model, unique: tuple, records: dict) -> int:
+        stored = self._get_stored_keys(model, unique, {key[-1] for key in records})
+        rows = [values for key, (values, _) in records.items() if key not in stored]
+        if rows:
+            db.session.execute(insert(model), rows)
+        db.session.commit()
+        return len(rows)
+
+    def _insert_one_by_one(self, model, unique: tuple, records: dict) -> int:
+        inserted = 0
+        for key, record in records.items():
+            try:
+                inserted += self._insert(model, unique, {key: record})
+            except OperationalError:
+                db.session.rollback()
+                self._requeue(model, unique, [record])
+            except Exception as exc:
+                db.session.rollback()
+                logger.error(f"Dropping a {model.__tablename__} record that cannot be written, {record[0]}: {exc}")
+        return inserted
+
+    def _requeue(self, model, unique: tuple, records: list):
+        max_retries = current_app.config.get('EVENT_BUFFER_MAX_RETRIES', 5)
+        retried = [(model, unique, values, attempts + 1) for values, attempts in records if attempts < max_retries]
+        if len(retried) < len(records):
+            logger.error(f"Dropping {len(records) - len(retried)} {model.__tablename__} records after "
+                         f"{max_retries} failed flushes")
+        with self._lock:
+            self._events[:0] = retried
+
+    @staticmethod
+    def _get_stored_keys(model, unique: tuple, selective_values: set) -> set:
+        columns = [getattr(model, column) for column in unique]
+        rows = db.session.query(*columns).filter(columns[-1].in_(selective_values))
+        return {tuple(row) for row in rows}
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self._worker is None:
+                atexit.register(self._flush_at_exit)
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            interval = self._app.config.get('EVENT_BUFFER_FLUSH_INTERVAL', 5)
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            self._flush_in_context()
+
+    def _flush_in_context(self):
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as exc:
+            logger.exception(f"Exception while flushing the tracking records: {exc}")
+
+    def _flush_at_exit(self):
+        if self._pid == os.getpid():
+            self._flush_in_context()
+
+
+event_buffer = EventBuffer()
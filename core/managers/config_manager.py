@@ -33,6 +33,15 @@ class Config:
     TIMEZONE = 'Europe/Madrid'
     TEMPLATES_AUTO_RELOAD = True
     UPLOAD_FOLDER = 'uploads'
+    # Views and downloads are written in batches, every interval seconds or once max size records are queued
+    EVENT_BUFFER_FLUSH_INTERVAL = float(os.getenv('EVENT_BUFFER_FLUSH_INTERVAL', 5))
+    EVENT_BUFFER_MAX_SIZE = int(os.getenv('EVENT_BUFFER_MAX_SIZE', 500))
+    EVENT_BUFFER_MAX_RETRIES = int(os.getenv('EVENT_BUFFER_MAX_RETRIES', 5))
+    # Background jobs are run by `rosemary jobs:work`, the embedded worker also runs them in a thread of the web app
+    # so development setups need no worker process
+    JOBS_EMBEDDED_WORKER = os.getenv(
+        'JOBS_EMBEDDED_WORKER', str(os.getenv('FLASK_ENV', 'development') == 'development')
+    ) == 'True'
 
 
 class DevelopmentConfig(Config):
@@ -49,6 +58,8 @@ class TestingConfig(Config):
         f"{os.getenv('MARIADB_TEST_DATABASE', 'default_db')}"
     )
     WTF_CSRF_ENABLED = False
+    EVENT_BUFFER_FLUSH_INTERVAL = 0
+    JOBS_EMBEDDED_WORKER = False
 
 
 class ProductionConfig(Config):
@@ -19,6 +19,18 @@ class BaseRepository(Generic[T]):
             self.session.flush()
         return instance
 
+    def create_many(self, rows: List[dict], commit: bool = True) -> List[T]:
+        """
+        Create one instance per row with a single flush, so the rows are sent as one batched INSERT.
+        """
+        instances: List[T] = [self.model(**kwargs) for kwargs in rows]
+        self.session.add_all(instances)
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+        return instances
+
     def get_by_id(self, id: int) -> Optional[T]:
         instance: Optional[T] = self.model.query.get(id)
         return instance
@@ -63,5 +63,12 @@ else
     flask db upgrade
 fi
 
+# Add the view and download records that are not in the daily statistics yet. The job workers keep them up to
+# date afterwards; on the first deploy with the rollup tables this backfills every record.
+rosemary stats:rollup
+
+# Rebuild the explore search index, so datasets created before it existed or indexed by an older tokenizer are found
+rosemary search:reindex
+
 # Start the Flask application with specified host and port, enabling reload and debug mode
 exec flask run --host=0.0.0.0 --port=5000 --reload --debug
@@ -54,6 +54,14 @@ else
     flask db upgrade
 fi
 
+# Add the view and download records that are not in the daily statistics yet. The job workers keep them up to
+# date afterwards; on the first deploy with the rollup tables this backfills every record.
+python -m rosemary stats:rollup
+
+# Rebuild the explore search index, so datasets created before it existed or indexed by an older tokenizer are found
+python -m rosemary search:reindex
+
 # Start the application using Gunicorn, binding it to port 5000
-# Set the logging level to info and the timeout to 3600 seconds
-exec gunicorn --bind 0.0.0.0:5000 app:app --log-level info --timeout 3600
+# Set the logging level to info and the timeout to 120 seconds, long tasks such as publishing a dataset
+# run in the job workers instead of the request
+exec gunicorn --bind 0.0.0.0:5000 app:app --log-level info --timeout 120
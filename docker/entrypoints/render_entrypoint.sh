@@ -60,6 +60,17 @@ else
   echo "Users already exist. Skipping seed command."
 fi
 
+# Add the view and download records that are not in the daily statistics yet. The job workers keep them up to
+# date afterwards; on the first deploy with the rollup tables this backfills every record.
+rosemary stats:rollup
+
+# Rebuild the explore search index, so datasets created before it existed or indexed by an older tokenizer are found
+rosemary search:reindex
+
 # Start the application using Gunicorn, binding it to port 80
-# Set the logging level to info and the timeout to 3600 seconds
-exec gunicorn --bind 0.0.0.0:80 app:app --log-level info --timeout 3600
+# Render runs a single container, so the job worker is started next to the web application
+rosemary jobs:work &
+
+# Set the logging level to info and the timeout to 120 seconds, long tasks such as publishing a dataset
+# run in the job workers instead of the request
+exec gunicorn --bind 0.0.0.0:80 app:app --log-level info --timeout 120
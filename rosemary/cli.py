@@ -5,6 +5,9 @@ from rosemary.commands.locust import locust, stop
 from rosemary.commands.compose_env import compose_env
 from rosemary.commands.route_list import route_list
 from rosemary.commands.db_seed import db_seed
+from rosemary.commands.search_reindex import search_reindex
+from rosemary.commands.stats_rollup import stats_rollup
+from rosemary.commands.jobs_work import jobs_work
 from rosemary.commands.clear_cache import clear_cache
 from rosemary.commands.db_console import db_console
 from rosemary.commands.db_migrate import db_migrate
@@ -52,6 +55,9 @@ cli.add_command(db_reset)
 cli.add_command(db_migrate)
 cli.add_command(db_console)
 cli.add_command(db_seed)
+cli.add_command(search_reindex)
+cli.add_command(stats_rollup)
+cli.add_command(jobs_work)
 cli.add_command(route_list)
 cli.add_command(compose_env)
 cli.add_command(locust)
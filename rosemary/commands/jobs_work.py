@@ -0,0 +1,41 @@
+import signal
+import threading
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.modules.jobs.services import JOB_POLL_INTERVAL, JobService, new_worker_id
+
+
+@click.command('jobs:work', help="Runs the background jobs queued in the database, such as dataset publications.")
+@click.option('--workers', type=int, default=1, help="Number of jobs run at the same time.")
+@click.option('--interval', type=float, default=JOB_POLL_INTERVAL, help="Seconds between polls of an empty queue.")
+@click.option('--burst', is_flag=True, help="Stops once no job is due instead of waiting for new ones.")
+@with_appcontext
+def jobs_work(workers, interval, burst):
+    app = current_app._get_current_object()
+    stop = threading.Event()
+    processed = []
+
+    def stop_workers(signum, frame):
+        click.echo(click.style("Stopping, the running jobs are finished first...", fg='yellow'))
+        stop.set()
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    def work(worker_id):
+        with app.app_context():
+            processed.append(JobService().work(worker_id=worker_id, burst=burst, poll_interval=interval, stop=stop))
+
+    click.echo(click.style(f"Starting {workers} job workers...", fg='yellow'))
+    threads = [threading.Thread(target=work, args=(new_worker_id(),)) for _ in range(max(workers, 1))]
+    for thread in threads:
+        thread.start()
+    # Joined with a timeout so the main thread keeps receiving the signals
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+    click.echo(click.style(f"Job workers stopped after running {sum(processed)} jobs.", fg='green'))
@@ -0,0 +1,16 @@
+import click
+from flask.cli import with_appcontext
+
+from app.modules.explore.services import SearchIndexService
+
+
+@click.command('search:reindex', help="Rebuilds the explore search index from the datasets in the database.")
+@with_appcontext
+def search_reindex():
+    click.echo(click.style("Rebuilding the search index...", fg='yellow'))
+    try:
+        indexed = SearchIndexService().reindex_all()
+    except Exception as e:
+        click.echo(click.style(f"Error rebuilding the search index: {e}", fg='red'))
+        return
+    click.echo(click.style(f"Search index rebuilt for {indexed} datasets.", fg='green'))
@@ -0,0 +1,38 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+
+from app.modules.dashboard.services import StatsRollupService
+
+
+@click.command('stats:rollup', help="Adds the new view and download records to the daily statistics.")
+@click.option('--backfill', is_flag=True, help="Rebuilds the daily statistics from every record.")
+@click.option('--interval', type=int, default=0, help="Keeps running, rolling up every INTERVAL seconds.")
+@with_appcontext
+def stats_rollup(backfill, interval):
+    service = StatsRollupService()
+
+    if backfill:
+        click.echo(click.style("Rebuilding the daily statistics...", fg='yellow'))
+        try:
+            rolled_up = service.backfill()
+        except Exception as e:
+            click.echo(click.style(f"Error rebuilding the daily statistics: {e}", fg='red'))
+            return
+        click.echo(click.style(f"Daily statistics rebuilt from {rolled_up} records.", fg='green'))
+        if not interval:
+            return
+        time.sleep(interval)
+
+    while True:
+        try:
+            rolled_up = service.rollup()
+            click.echo(click.style(f"Rolled up {rolled_up} new records.", fg='green'))
+        except Exception as e:
+            click.echo(click.style(f"Error rolling up the daily statistics: {e}", fg='red'))
+            if not interval:
+                return
+        if not interval:
+            return
+        time.sleep(interval)